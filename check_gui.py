@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+''' Offscreen smoke test of the GUI (no display needed)
+
+    Run it from the repository root: python check_gui.py
+    The MainWindow is built on the offscreen Qt platform. The scope pages are opened (their MplWidgets are created when a
+    page is first shown, see SetupMainWindow.setup_scope()), and a few frames are drawn on the blitting scope of page 3
+    from a worker thread, like EmyFunctions.runPyBasedSimulation() does. Variables are pushed to the console before and
+    after the console window is first shown (ConsoleWindow keeps them until the console is started). The check fails if a
+    step raises or does not have the expected effect.
+'''
+import os, sys, math, threading
+import numpy as np
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen') # (before Qt is imported)
+import main
+
+def check_gui(app):
+    ''' Return the list of failures (empty if the GUI passes). '''
+    failures = []
+    window = main.MainWindow()
+    try:
+        # scope pages
+        if window.ui.MplWidget_ACMPlot is not None or window.ui.MplWidget_ACMPlot2 is not None:
+            failures.append('the scopes are created before their pages are shown')
+        for page, name in ((window.ui.load_pages.page_3, 'MplWidget_ACMPlot'), (window.ui.load_pages.page_4, 'MplWidget_ACMPlot2')):
+            main.MainFunctions.set_page(window, page)
+            app.processEvents()
+            if getattr(window.ui, name) is None:
+                failures.append(f'{name} is not created when its page is shown')
+        failures += check_scope(app, window.ui.MplWidget_ACMPlot)
+
+        # console
+        window.console_push_variable({'pushed_before_shown': 1})
+        if window.console_window.ConsoleWidget_ACMPlot is not None:
+            failures.append('the console is started before its window is shown')
+        window.console_window.show()
+        app.processEvents()
+        window.console_push_variable({'pushed_after_shown': 2})
+        app.processEvents()
+        user_ns = window.console_window.ConsoleWidget_ACMPlot.kernel_manager.kernel.shell.user_ns
+        for name, value in (('pushed_before_shown', 1), ('pushed_after_shown', 2)):
+            if user_ns.get(name) != value:
+                failures.append(f'{name} is not in the console')
+    finally:
+        window.threadpool.waitForDone() # (the JIT warm-up started by the window)
+        window.console_window.close()
+        window.close()
+    return failures
+
+def check_scope(app, scope, number_of_frames=20):
+    ''' Draw number_of_frames of two moving lines on scope (an MplWidget with bool_blit=True) from a worker thread. '''
+    failures = []
+    lines = []
+    for i in range(2):
+        ax = scope.canvas.figure.add_subplot(2, 1, 1+i)
+        lines += ax.plot([], [], label=f'line {i}')
+        ax.legend(loc='upper left')
+    scope.setAnimatedArtists(lines)
+    def draw_frames():
+        for frame in range(number_of_frames):
+            t = np.linspace(frame, frame+1, 100) * 1e-2
+            for line in lines:
+                line.set_data(t, np.sin(2*np.pi*10*t))
+                scope.setYLimits(line.axes, -1.0, 1.0)
+            scope.setTimeWindow(lines[0].axes, t[-1], 5e-2)
+            for line in lines[1:]:
+                line.axes.set_xlim(lines[0].axes.get_xlim())
+            scope.drawFrame()
+    worker = threading.Thread(target=draw_frames)
+    worker.start()
+    while worker.is_alive():
+        app.processEvents() # (the blits are queued to this thread)
+        worker.join(0.01)
+    app.processEvents()
+    if scope.backgrounds is None:
+        failures.append('the scope has not cached the backgrounds of its axes')
+    frame_rate = scope.getFrameRate()
+    if not math.isfinite(frame_rate) or frame_rate <= 0:
+        failures.append(f'the frame rate of the scope is {frame_rate}')
+    return failures
+
+if __name__ == '__main__':
+    app = main.QApplication(sys.argv)
+    failures = check_gui(app)
+    for failure in failures:
+        print('FAIL:', failure)
+    if not failures:
+        print('GUI smoke test passed.')
+    sys.exit(1 if failures else 0)
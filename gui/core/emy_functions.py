@@ -1,21 +1,27 @@
 # 常用库
 
 from concurrent.futures import thread
-from pylab import np, mpl, plt
+import numpy as np
+import matplotlib as mpl
+import matplotlib.style # pyplot is imported by the simulation loops (for plt.pause), not at start-up
 from collections import OrderedDict as OD
 from dataclasses import dataclass
-import matplotlib.animation as animation
-import json, re, copy, pkg_resources
+import json, re, copy
 import traceback
-import pandas as pd
 
 # from gui.core.json_settings import Settings
     # import simulation.tutorials as acmsimpy2
     # import simulation.tutorials_ep2_full_dynamics as acmsimpy # note the slip error with Rreq=-1 exists here
     # import simulation.tutorials_ep3_svpwm as acmsimpy
     # import simulation.tutorials_ep4_batch_generating_figures as acmsimpy
-import simulation.tutorials_ep8_SFOC_Dynamic as acmsimpy
-import simulation.tuner as tuner
+acmsimpy = tuner = None # see import_simulation()
+
+def import_simulation():
+    ''' Import the simulation (numba) on first use rather than at start-up, so that the window shows up first.
+        It is called by the worker threads as well; the import system makes the concurrent calls wait for one import. '''
+    global acmsimpy, tuner
+    import simulation.tutorials_ep8_SFOC_Dynamic as acmsimpy
+    import simulation.tuner as tuner
 
 # 后端
 # use cairo only for acmsimpy | use cairo for acmsimc will slow down plotting
@@ -119,11 +125,16 @@ class THE_CONSOLE:
         # self.pause_time = 0.0
         # self.NUMBER_OF_SAMPLE_TO_SHOW = int(self.NUMBER_OF_TIME_SLICE_TO_SHOW * self.TIME_SLICE * self.SAMPLING_RATE) # old
         self.NUMBER_OF_SAMPLE_TO_SHOW = int(self.NUMBER_OF_TIME_SLICE_TO_SHOW * self.TIME_SLICE * self.SAMPLING_RATE * self.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD) # new
+        # recording mode (the plot receives one sample per WATCH_DECIMATION machine steps)
+        self.WATCH_MODE, self.WATCH_DECIMATION = acmsimpy.get_watch_settings(self.d_user_input_motor_dict)
+        self.WATCH_TS = self.MACHINE_TS * self.WATCH_DECIMATION
+        self.NUMBER_OF_SAMPLE_TO_SHOW = self.NUMBER_OF_SAMPLE_TO_SHOW // self.WATCH_DECIMATION
 
 # FUNCTIONS
 class EmyFunctions(object):
 
     def prepare_canvas_on_page_3(mainWindowObject):
+        import_simulation()
 
         """ Read user input dict and user specified scope dict from GUI """
         try:
@@ -137,22 +148,8 @@ class EmyFunctions(object):
                 f.write(the_cmd)
             numba__scope_dict = eval(the_cmd[the_cmd.find('OD'):])
 
-            # Add white space between operators and variable names (which is needed for decoding for simple math operations)
-            # print('BEFORE', numba__scope_dict)
-            for key, expressions in numba__scope_dict.items():
-                corrected_expressions = []
-                for ind, expression in enumerate(expressions):
-                    index = expression.find('+')
-                    if index != -1: expression = expression[:index] + ' + ' + expression[index+1:]
-                    index = expression.find('-')
-                    if index != -1: expression = expression[:index] + ' - ' + expression[index+1:]
-                    index = expression.find('*')
-                    if index != -1: expression = expression[:index] + ' * ' + expression[index+1:]
-                    index = expression.find('/')
-                    if index != -1: expression = expression[:index] + ' / ' + expression[index+1:]
-                    corrected_expressions.append(expression)
-                numba__scope_dict[key] = corrected_expressions
-            # print('AFTER', numba__scope_dict)
+            # parse and validate the expressions now, so that a typo falls back to the default dict below instead of failing the simulation
+            acmsimpy.compile_scope_dict(numba__scope_dict)
 
         except Exception as err:
             print('-------------------')
@@ -231,7 +228,9 @@ class EmyFunctions(object):
                                 label=name,
                                 alpha=0.7) # zorder
                 line.ax = ax
-                line.ydata = np.array(0)
+                line.xdata = np.zeros(CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW) # sliding window buffers (see update_line_data)
+                line.ydata = np.zeros(CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW)
+                line.number_of_samples = 0
                 line.MIN = -1e-10
                 line.MAX =  1e-10
                 numba__line_dict[ylabel].append(line)
@@ -242,30 +241,41 @@ class EmyFunctions(object):
 
         numba__axes[-1].set_xlabel('Time [s]')
         # time_text = first_ax.text(0.02, 0.95, '', transform=first_ax.transAxes)
+        mainWindowObject.ui.MplWidget_ACMPlot.setAnimatedArtists([line for lines in numba__line_dict.values() for line in lines])
 
         mainWindowObject.CONSOLE = CONSOLE
         mainWindowObject.numba__line_dict = numba__line_dict
         mainWindowObject.first_ax = first_ax
 
+    # Compile the kernels before the user starts the first simulation
+    def warmUpPyBasedSimulation(mainWindowObject, progress_callback=None):
+        ''' Simulate one control period of the user input dict loaded at start-up (on a worker thread), so that runPyBasedSimulation
+            finds the kernels compiled. The compilation takes a while on every launch, as the kernels with jitclass arguments are not cached on disk. '''
+        try:
+            import_simulation()
+            the_cmd = mainWindowObject.STRING_USER_INPUT_MOTOR_DICT
+            d_user_input_motor_dict = eval(the_cmd[the_cmd.find('{'):])
+            the_cmd = mainWindowObject.STRING_SCOPE_DICT
+            numba__scope_dict = eval(the_cmd[the_cmd.find('OD'):])
+            return acmsimpy.warm_up(d_user_input_motor_dict, numba__scope_dict, tuner=tuner)
+        except Exception as err:
+            return f'JIT warm-up skipped ({err!r}), the kernels will be compiled with the first slice.' # a broken input is reported by runPyBasedSimulation
+
     # Run real time simulation with ACMSymPy
     ''' Python-Numba-based Simulation '''
     # @Slot()
     # @decorator_status(status='Configuring') # this will not be updated until this function is done
     def runPyBasedSimulation(mainWindowObject, progress_callback=None):
+        import matplotlib.pyplot as plt
 
         """ Initialization """
         EmyFunctions.prepare_canvas_on_page_3(mainWindowObject)
         CONSOLE = mainWindowObject.CONSOLE
 
         """ Simulation Globals """
-        try:
-            CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY = \
-                mainWindowObject.CTRL, mainWindowObject.ACM, mainWindowObject.reg_id, mainWindowObject.reg_iq, mainWindowObject.reg_speed, mainWindowObject.reg_dispX, mainWindowObject.reg_dispY \
-                    = acmsimpy.Simulation_Benchmark(CONSOLE.d_user_input_motor_dict, tuner=tuner, bool_start_simulation=False).get_global_objects()
-        except:
-            CTRL, ACM, reg_id, reg_iq, reg_speed = \
-                mainWindowObject.CTRL, mainWindowObject.ACM, mainWindowObject.reg_id, mainWindowObject.reg_iq, mainWindowObject.reg_speed \
-                    = acmsimpy.Simulation_Benchmark(CONSOLE.d_user_input_motor_dict, tuner=tuner, bool_start_simulation=False).get_global_objects()
+        CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = \
+            mainWindowObject.CTRL, mainWindowObject.ACM, mainWindowObject.reg_id, mainWindowObject.reg_iq, mainWindowObject.reg_speed, mainWindowObject.reg_dispX, mainWindowObject.reg_dispY, mainWindowObject.svgen1 \
+                = acmsimpy.Simulation_Benchmark(CONSOLE.d_user_input_motor_dict, tuner=tuner, bool_start_simulation=False).get_global_objects()
 
         """ Simulation Globals Access from Console """
         if mainWindowObject.console_window is not None:
@@ -275,10 +285,20 @@ class EmyFunctions(object):
             mainWindowObject.console_push_variable({'reg_id':reg_id})
             mainWindowObject.console_push_variable({'reg_iq':reg_iq})
             mainWindowObject.console_push_variable({'reg_speed':reg_speed})
+            mainWindowObject.console_push_variable({'svgen1':svgen1})
+
+        # sample-accurate commands of the user input dict (CONSOLE.user_controller_commands is only applied between slices)
+        timeline = acmsimpy.get_command_timeline(CONSOLE.d_user_input_motor_dict)
+
+        # live commands from the console, applied within one control period, e.g., mailbox.write('CTRL.cmd_rpm', 500)
+        mailbox = mainWindowObject.mailbox = acmsimpy.Command_Mailbox()
+        if mainWindowObject.console_window is not None:
+            mainWindowObject.console_push_variable({'mailbox':mailbox})
 
         """ Visualization of Realtime Simulation """
         print('\tJIT compile with numba...')
         ii = 0
+        end_time = 0.0
         while ii<1000:
             ii += 1
 
@@ -296,32 +316,36 @@ class EmyFunctions(object):
                 reg_id=reg_id,
                 reg_iq=reg_iq,
                 reg_speed=reg_speed,
+                svgen1=svgen1,
+                timeline=timeline,
+                mailbox=mailbox.array,
+                watch_mode=CONSOLE.WATCH_MODE,
+                watch_decimation=CONSOLE.WATCH_DECIMATION,
             )
-            end_time = machine_times[-1] 
             # progress_callback.emit([t0, numba__waveforms_dict, end_time])
 
             """ update matplotlib artist """
-            for key, waveforms_data in numba__waveforms_dict.items():
-                ymin, ymax = None, None
-                for line, ydata in zip(mainWindowObject.numba__line_dict[key], waveforms_data):
-                    # print(key, line, ydata[0:3], mainWindowObject.numba__line_dict[key], len(waveforms_data))
-                    local_ymin, local_ymax = EmyFunctions.update_line_data(CONSOLE, end_time, line, ydata)
-                    if ymin is None: ymin=local_ymin; ymax=local_ymax
-                    ymin = local_ymin if local_ymin < ymin else ymin
-                    ymax = local_ymax if local_ymax > ymax else ymax
-                # 完事了只对一个ax做一次
-                if ymin != ymax:
-                    min_scale = 1.05 if ymin<0 else 0.95
-                    max_scale = 1.05 if ymax>0 else 0.95
-                    line.ax.set_ylim([ymin*min_scale, ymax*max_scale]) # this .ax is manually assigned when line object is created.
+            if len(machine_times) > 0: # (a slice shorter than WATCH_DECIMATION machine steps records nothing, keep the previous end_time)
+                end_time = machine_times[-1]
+                for key, waveforms_data in numba__waveforms_dict.items():
+                    ymin, ymax = None, None
+                    for line, ydata in zip(mainWindowObject.numba__line_dict[key], waveforms_data):
+                        # print(key, line, ydata[0:3], mainWindowObject.numba__line_dict[key], len(waveforms_data))
+                        local_ymin, local_ymax = EmyFunctions.update_line_data(CONSOLE, machine_times, line, ydata)
+                        if ymin is None: ymin=local_ymin; ymax=local_ymax
+                        ymin = local_ymin if local_ymin < ymin else ymin
+                        ymax = local_ymax if local_ymax > ymax else ymax
+                    # 完事了只对一个ax做一次
+                    if ymin != ymax:
+                        mainWindowObject.ui.MplWidget_ACMPlot.setYLimits(line.ax, ymin, ymax) # this .ax is manually assigned when line object is created.
 
             # time_text.set_text('time = %.1f' % end_time)
 
-            mainWindowObject.first_ax.set_xlim([end_time-CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW*CONSOLE.MACHINE_TS, end_time])
+            mainWindowObject.ui.MplWidget_ACMPlot.setTimeWindow(mainWindowObject.first_ax, end_time, CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW*CONSOLE.WATCH_TS)
             # first_ax.set_xticklabels(np.arange(0, int(round(end_time)), int(round(end_time))*0.1)) #, fontdict=font)
-            # return line01, line02, time_text # for using blit=True but blit does not update xticks and yticks
 
-            mainWindowObject.ui.MplWidget_ACMPlot.canvas.draw()
+            # only the lines are redrawn unless the limits have changed (see MplWidget.drawFrame)
+            mainWindowObject.ui.MplWidget_ACMPlot.drawFrame()
             # mainWindowObject.ui.MplWidget_ACMPlot.canvas.flush_events() # flush any pending GUI events, re-painting the screen if needed
 
             progress_callback.emit(t0)
@@ -338,6 +362,7 @@ class EmyFunctions(object):
         return 'Simulation is done.' # the result to print
 
     def runPyBasedSimulationParallel(mainWindowObject, thread_index, extra_execution_codes, progress_callback=None):
+        import matplotlib.pyplot as plt
 
         """ Initialization is moved to MainWindow.btn_clicked() """
         CONSOLE = mainWindowObject.CONSOLE # Note this is the shared CONSOLE object
@@ -360,6 +385,7 @@ class EmyFunctions(object):
         mainWindowObject.reg_id    = reg_id    = acmsimpy.The_PI_Regulator(6.39955, 6.39955*237.845*CTRL.CL_TS, 400)
         mainWindowObject.reg_iq    = reg_iq    = acmsimpy.The_PI_Regulator(6.39955, 6.39955*237.845*CTRL.CL_TS, 400)
         mainWindowObject.reg_speed = reg_speed = acmsimpy.The_PI_Regulator(0.0380362, 0.0380362*30.5565*CTRL.VL_TS, 1*1.414*ACM.IN)
+        svgen1 = acmsimpy.SVgen_Object(ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD, CTRL.DC_BUS_VOLTAGE, acmsimpy.INVERTER_MODEL_TICK) # per thread, kept across slices
 
         """ Execute extra codes for each thread here"""
         exec(extra_execution_codes)
@@ -372,11 +398,13 @@ class EmyFunctions(object):
         mainWindowObject.console_push_variable({f'reg_id{thread_index:d}':reg_id})
         mainWindowObject.console_push_variable({f'reg_iq{thread_index:d}':reg_iq})
         mainWindowObject.console_push_variable({f'reg_speed{thread_index:d}':reg_speed})
+        mainWindowObject.console_push_variable({f'svgen1{thread_index:d}':svgen1})
 
         """ Visualization of Realtime Simulation """
         print('\tJIT compile with numba...')
         print(acmsimpy._Watch_Mapping)
         ii = 0
+        end_time = 0.0
         while ii<1000:
             ii += 1
 
@@ -392,26 +420,30 @@ class EmyFunctions(object):
                 reg_id=reg_id,
                 reg_iq=reg_iq,
                 reg_speed=reg_speed,
+                svgen1=svgen1,
+                watch_mode=CONSOLE.WATCH_MODE,
+                watch_decimation=CONSOLE.WATCH_DECIMATION,
             )
-            end_time = machine_times[-1] # print('\tend_time:', end_time)
             # progress_callback.emit([t0, numba__waveforms_dict, end_time])
 
             """ update matplotlib artist """
-            for key, waveforms_data in numba__waveforms_dict.items():
-                ymin, ymax = None, None
-                if True:
-                    line, ydata = mainWindowObject.numba__line_dict[key][thread_index], waveforms_data[0]
-                    # debug print
-                    # print(thread_index, key, line, ydata[0:3], mainWindowObject.numba__line_dict[key], len(waveforms_data))
-                    local_ymin, local_ymax = EmyFunctions.update_line_data(CONSOLE, end_time, line, ydata)
-                    if ymin is None: ymin=local_ymin; ymax=local_ymax
-                    ymin = local_ymin if local_ymin < ymin else ymin
-                    ymax = local_ymax if local_ymax > ymax else ymax
-                # 完事了只对一个ax做一次
-                if ymin != ymax:
-                    min_scale = 1.05 if ymin<0 else 0.95
-                    max_scale = 1.05 if ymax>0 else 0.95
-                    line.ax.set_ylim([ymin*min_scale, ymax*max_scale]) # this .ax is manually assigned when line object is created.
+            if len(machine_times) > 0: # (a slice shorter than WATCH_DECIMATION machine steps records nothing, keep the previous end_time)
+                end_time = machine_times[-1] # print('\tend_time:', end_time)
+                for key, waveforms_data in numba__waveforms_dict.items():
+                    ymin, ymax = None, None
+                    if True:
+                        line, ydata = mainWindowObject.numba__line_dict[key][thread_index], waveforms_data[0]
+                        # debug print
+                        # print(thread_index, key, line, ydata[0:3], mainWindowObject.numba__line_dict[key], len(waveforms_data))
+                        local_ymin, local_ymax = EmyFunctions.update_line_data(CONSOLE, machine_times, line, ydata)
+                        if ymin is None: ymin=local_ymin; ymax=local_ymax
+                        ymin = local_ymin if local_ymin < ymin else ymin
+                        ymax = local_ymax if local_ymax > ymax else ymax
+                    # 完事了只对一个ax做一次
+                    if ymin != ymax:
+                        min_scale = 1.05 if ymin<0 else 0.95
+                        max_scale = 1.05 if ymax>0 else 0.95
+                        line.ax.set_ylim([ymin*min_scale, ymax*max_scale]) # this .ax is manually assigned when line object is created.
 
             # time_text.set_text('time = %.1f' % end_time)
 
@@ -440,7 +472,7 @@ class EmyFunctions(object):
                 mainWindowObject.first_ax.set_xlim([end_time-CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW*CONSOLE.CL_TS, end_time])
                 # first_ax.set_xticklabels(np.arange(0, int(round(end_time)), int(round(end_time))*0.1)) #, fontdict=font)
                 # return line01, line02, time_text # for using blit=True but blit does not update xticks and yticks
-                mainWindowObject.ui.MplWidget_ACMPlot2.canvas.draw()
+                mainWindowObject.ui.MplWidget_ACMPlot2.drawFrame()
                 # mainWindowObject.ui.MplWidget_ACMPlot2.canvas.flush_events() # flush any pending GUI events, re-painting the screen if needed
                 progress_callback.emit(t0)
             else:
@@ -452,6 +484,7 @@ class EmyFunctions(object):
         return 'Simulation (parallel) is done.' # the result to print
 
     def prepare_canvas_on_page_4(mainWindowObject, number_of_threads):
+        import_simulation()
 
         """ Read scope dict from GUI """
         try:
@@ -521,7 +554,9 @@ class EmyFunctions(object):
                                 label=waveform_name+str(jj), 
                                 alpha=0.7) # zorder
                 line.ax = ax
-                line.ydata = np.array(0)
+                line.xdata = np.zeros(CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW) # sliding window buffers (see update_line_data)
+                line.ydata = np.zeros(CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW)
+                line.number_of_samples = 0
                 line.MIN = -1e-10
                 line.MAX =  1e-10
                 numba__line_dict[ylabel].append(line)
@@ -539,16 +574,25 @@ class EmyFunctions(object):
 
 
     @staticmethod
-    def update_line_data(CONSOLE, end_time, line, ydata):
-        line.ydata = np.append(line.ydata, ydata)
-        line.ydata = line.ydata[-CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW:]
-        line.MIN = min(line.ydata) if min(line.ydata) < line.MIN else line.MIN
-        line.MAX = max(line.ydata) if max(line.ydata) > line.MAX else line.MAX
-
-        xdata = np.arange(end_time*CONSOLE.SAMPLING_RATE*CONSOLE.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD-len(line.ydata),
-                          end_time*CONSOLE.SAMPLING_RATE*CONSOLE.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD, 1) * CONSOLE.MACHINE_TS # 整数代替浮点数，精度高否则会出现xdata长3001，ydata长3000的问题。
-        # print('update line data:', len(xdata), len(line.ydata), -CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW)
-        line.set_data(xdata, line.ydata)
+    def update_line_data(CONSOLE, machine_times, line, ydata):
+        # shift the new slice into the fixed-size window buffers (machine_times comes from an integer step counter, so its length always matches ydata)
+        N = len(line.ydata)
+        n = len(ydata)
+        if n >= N:
+            line.xdata[:] = machine_times[-N:]
+            line.ydata[:] = ydata[-N:]
+        else:
+            line.xdata[:N-n] = line.xdata[n:]
+            line.ydata[:N-n] = line.ydata[n:]
+            line.xdata[N-n:] = machine_times
+            line.ydata[N-n:] = ydata
+        line.number_of_samples = min(line.number_of_samples + n, N)
+        if n > 0:
+            line.MIN = ydata.min() if ydata.min() < line.MIN else line.MIN
+            line.MAX = ydata.max() if ydata.max() > line.MAX else line.MAX
+
+        # print('update line data:', line.number_of_samples, -CONSOLE.NUMBER_OF_SAMPLE_TO_SHOW)
+        line.set_data(line.xdata[N-line.number_of_samples:], line.ydata[N-line.number_of_samples:])
 
         # this is slower as we set ylim for each line rather than each axis
         # if line.MIN != line.MAX:
@@ -1,6 +1,7 @@
 
 # IMPORT PACKAGES AND MODULES
 # ///////////////////////////////////////////////////////////////
+import threading
 from gui.core.functions import Functions
 from gui.core.emy_functions import EmyFunctions
 
@@ -40,7 +41,12 @@ class ConsoleWindow(QMainWindow):
         self.l3 = QLabel("None")
         b = QPushButton("DANGER!")
         b.pressed.connect(self.oh_no)
-        self.ConsoleWidget_ACMPlot = ConsoleWidget()
+
+        # The qtconsole and its in-process kernel are started when the window is shown for the first time (see showEvent),
+        # the variables pushed before that are kept in pending_vars
+        self.ConsoleWidget_ACMPlot = None
+        self.pending_vars = dict()
+        self.pending_vars_lock = threading.Lock() # (the simulation workers push from their threads)
 
         # Controller Commands (User Input)
         themes = Themes()
@@ -96,9 +102,8 @@ def user_controller_commands(t, ACM, CTRL, reg_id=None, reg_iq=None, reg_speed=N
         layout2.addWidget(self.l3)
         layout2.addWidget(b)
 
-        layout = QVBoxLayout()
+        layout = self.console_layout = QVBoxLayout()
         layout.addLayout(layout2)
-        layout.addWidget(self.ConsoleWidget_ACMPlot)
         layout.addWidget(self.plainTextEdit_ControllerCommands)
 
         w = QWidget()
@@ -107,5 +112,25 @@ def user_controller_commands(t, ACM, CTRL, reg_id=None, reg_iq=None, reg_speed=N
 
         # self.show()
 
+    def showEvent(self, event):
+        if self.ConsoleWidget_ACMPlot is None:
+            from gui.widgets.py_consolewidget import ConsoleWidget
+            with self.pending_vars_lock:
+                self.ConsoleWidget_ACMPlot = ConsoleWidget()
+                self.ConsoleWidget_ACMPlot.push_vars(self.pending_vars)
+                self.pending_vars = dict()
+            self.console_layout.insertWidget(1, self.ConsoleWidget_ACMPlot)
+        super(ConsoleWindow, self).showEvent(event)
+
+    def push_vars(self, variableDict):
+        """
+        Push the variables to the console, or keep them until it is started
+        """
+        with self.pending_vars_lock:
+            if self.ConsoleWidget_ACMPlot is None:
+                self.pending_vars.update(variableDict)
+                return
+        self.ConsoleWidget_ACMPlot.push_vars(variableDict)
+
     def oh_no(self):
         print('Console button is clicked.')
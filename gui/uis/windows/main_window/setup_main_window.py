@@ -21,7 +21,7 @@ from . functions_main_window import *
 import sys
 import os
 # import simulation.tutorials as acmsimpy
-import simulation.tutorials_ep4_batch_generating_figures as acmsimpy
+from simulation.watch_mapping import _Unit_Watch_Mapping # (the simulation itself is imported on first use, see EmyFunctions)
 
 # IMPORT QT CORE
 # ///////////////////////////////////////////////////////////////
@@ -331,7 +331,7 @@ class SetupMainWindow:
 
         # Scope Dict (Reference)
         self.plainTextEdit_NumbaScopeDict_2 = PyTextEdit(
-            text = '_Watch_Mapping = ' + '\n'.join(str(acmsimpy._Unit_Watch_Mapping).split()),
+            text = '_Watch_Mapping = ' + '\n'.join(str(_Unit_Watch_Mapping).split()),
             # place_holder_text = STRING_WATCH_MAPPING,
             radius = 8,
             border_size = 2,
@@ -647,11 +647,13 @@ class SetupMainWindow:
         self.ui.title_label_time = QLabel("Elapsed: 0 s")
         self.ui.title_bar_layout.addWidget(self.ui.title_label_time)
 
-        self.ui.MplWidget_ACMPlot = MplWidget()
-        self.ui.load_pages.scrollAreaWigetContents_verticalLayout.addWidget(self.ui.MplWidget_ACMPlot)
+        self.ui.title_label_frame_rate = QLabel("FPS: 0.0")
+        self.ui.title_bar_layout.addWidget(self.ui.title_label_frame_rate)
 
-        self.ui.MplWidget_ACMPlot.toolbar.setStyleSheet("background-color: #9AA5B1;")
-        self.ui.title_bar_layout.addWidget(self.ui.MplWidget_ACMPlot.toolbar)
+        # The scopes of page 3 and page 4 are built when their page is shown for the first time (see setup_scope)
+        self.ui.MplWidget_ACMPlot = None
+        self.ui.MplWidget_ACMPlot2 = None
+        self.ui.load_pages.pages.currentChanged.connect(lambda index: SetupMainWindow.setup_scope(self, self.ui.load_pages.pages.widget(index)))
 
         # ACMPlot画图区域的白边颜色改为#272822！
         css = '''
@@ -669,13 +671,6 @@ class SetupMainWindow:
         '''
         self.ui.load_pages.scrollArea_ACMSimPyScope2.setStyleSheet(css)
 
-        # PAGE 4 - Scope for ACMSimPy (Multiple instances)
-        self.ui.MplWidget_ACMPlot2 = MplWidget()
-        self.ui.load_pages.scrollAreaWidgetContents_verticalLayout_page4.addWidget(self.ui.MplWidget_ACMPlot2)
-
-        self.ui.MplWidget_ACMPlot2.toolbar.setStyleSheet("background-color: #208211;")
-        self.ui.title_bar_layout.addWidget(self.ui.MplWidget_ACMPlot2.toolbar)
-
 
         # RIGHT COLUMN
         # ///////////////////////////////////////////////////////////////
@@ -720,6 +715,27 @@ class SetupMainWindow:
         # END - EXAMPLE CUSTOM WIDGETS
         # ///////////////////////////////////////////////////////////////
 
+    # SETUP SCOPES OF PAGE 3 AND PAGE 4
+    # Build the matplotlib scope of a page when it is shown for the first time
+    # (the simulation workers find it built, as the buttons show the page before starting them)
+    # ///////////////////////////////////////////////////////////////
+    def setup_scope(self, page):
+        # PAGE 3 - Scope for ACMSimPy
+        if page is self.ui.load_pages.page_3 and self.ui.MplWidget_ACMPlot is None:
+            self.ui.MplWidget_ACMPlot = MplWidget(bool_blit=True)
+            self.ui.load_pages.scrollAreaWigetContents_verticalLayout.addWidget(self.ui.MplWidget_ACMPlot)
+
+            self.ui.MplWidget_ACMPlot.toolbar.setStyleSheet("background-color: #9AA5B1;")
+            self.ui.title_bar_layout.addWidget(self.ui.MplWidget_ACMPlot.toolbar)
+
+        # PAGE 4 - Scope for ACMSimPy (Multiple instances)
+        if page is self.ui.load_pages.page_4 and self.ui.MplWidget_ACMPlot2 is None:
+            self.ui.MplWidget_ACMPlot2 = MplWidget()
+            self.ui.load_pages.scrollAreaWidgetContents_verticalLayout_page4.addWidget(self.ui.MplWidget_ACMPlot2)
+
+            self.ui.MplWidget_ACMPlot2.toolbar.setStyleSheet("background-color: #208211;")
+            self.ui.title_bar_layout.addWidget(self.ui.MplWidget_ACMPlot2.toolbar)
+
     # RESIZE GRIPS AND CHANGE POSITION
     # Resize or change position when window is resized
     # ///////////////////////////////////////////////////////////////
@@ -76,7 +76,7 @@ from . py_mplwidget import MplWidget
 
 # py_consolewidget
 # ///////////////////////////////////////////////////////////////
-from . py_consolewidget import ConsoleWidget
+# from . py_consolewidget import ConsoleWidget # imports qtconsole, so ConsoleWindow imports it when the console is first opened
 
 # py_qcodeeditor
 # ///////////////////////////////////////////////////////////////
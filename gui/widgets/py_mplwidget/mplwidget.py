@@ -6,7 +6,7 @@
 
 # IMPORT PACKAGES AND MODULES
 # ///////////////////////////////////////////////////////////////
-import sys
+import sys, time, collections
 
 # IMPORT QT CORE
 # ///////////////////////////////////////////////////////////////
@@ -16,7 +16,7 @@ from matplotlib.backends.backend_qt5agg import FigureCanvas
 from matplotlib.backends.backend_qt5agg import (NavigationToolbar2QT as NavigationToolbar)
 from matplotlib.figure import Figure
 
-from pylab import mpl
+import matplotlib as mpl
 # mpl.rcParams["figure.autolayout"] = True # equivalent to tight_layout=True
 # mpl.rcParams['figure.constrained_layout.use'] = True
 
@@ -29,7 +29,16 @@ from pylab import mpl
 
 class MplWidget(QWidget):
 
-    def __init__(self, parent=None):
+    # 局部重绘 (blit) 的坐标轴滞环: the y limits get RESCALE_HEADROOM of the data span on both sides, and are rescaled only when
+    # the data leave them or span less than RESCALE_SHRINK of them; the time axis jumps ahead by TIME_HEADROOM of its window.
+    RESCALE_HEADROOM = 0.1
+    RESCALE_SHRINK = 0.5
+    TIME_HEADROOM = 0.25
+    FRAME_RATE_WINDOW = 2.0 # [s]
+
+    blitRequested = Signal() # (drawFrame() is called by the simulation worker, the widget is repainted in the GUI thread)
+
+    def __init__(self, parent=None, bool_blit=False):
 
         QWidget.__init__(self, parent)
 
@@ -98,5 +107,79 @@ class MplWidget(QWidget):
                 pass
         self.canvas.mpl_connect('key_press_event', on_press)
 
+        # 局部重绘 (blit): drawFrame() restores the cached background of each axes and draws only the lines on it,
+        # the whole figure is drawn again only when the axis limits have changed (or Qt redraws it, e.g., after a resize)
+        self.bool_blit = bool_blit
+        self.animated_artists = []
+        self.backgrounds = None
+        self.bool_limits_changed = True
+        self.canvas.mpl_connect('draw_event', self.onDraw)
+        self.blitRequested.connect(self.blitAxes)
+
+        # 帧率
+        self.frame_times = collections.deque(maxlen=1000)
+
     def setMinimumSizeByNumberOfSubplots(self, number_of_subplot, height=200):
         self.setMinimumSize(QSize(500, number_of_subplot*height))
+
+    def setAnimatedArtists(self, artists):
+        ''' The lines that drawFrame() redraws (call it after the axes and their legends are created). '''
+        self.animated_artists = list(artists) + [ax.get_legend() for ax in self.canvas.figure.axes if ax.get_legend() is not None] # (the legends stay on top)
+        for artist in self.animated_artists:
+            artist.set_animated(self.bool_blit) # (excluded from the full draw, i.e., from the backgrounds)
+        self.backgrounds = None
+        self.bool_limits_changed = True
+
+    def setYLimits(self, ax, ymin, ymax):
+        if not self.bool_blit:
+            min_scale = 1.05 if ymin<0 else 0.95
+            max_scale = 1.05 if ymax>0 else 0.95
+            ax.set_ylim([ymin*min_scale, ymax*max_scale])
+            return
+        bottom, top = ax.get_ylim()
+        if ymin < bottom or ymax > top or ymax - ymin < self.RESCALE_SHRINK * (top - bottom):
+            headroom = self.RESCALE_HEADROOM * (ymax - ymin)
+            ax.set_ylim([ymin - headroom, ymax + headroom])
+            self.bool_limits_changed = True
+
+    def setTimeWindow(self, ax, end_time, window):
+        ''' Show the last window [s] of the waveforms up to end_time. '''
+        if not self.bool_blit:
+            ax.set_xlim([end_time - window, end_time])
+            return
+        left, right = ax.get_xlim()
+        if end_time > right or end_time - window < left or right - left > (1 + 2*self.TIME_HEADROOM) * window:
+            ax.set_xlim([end_time - window, end_time + self.TIME_HEADROOM * window])
+            self.bool_limits_changed = True
+
+    def drawFrame(self):
+        ''' Draw the figure (call it once per slice) and count the frame. '''
+        if not self.bool_blit or self.bool_limits_changed or self.backgrounds is None:
+            self.bool_limits_changed = False
+            self.canvas.draw() # the backgrounds are cached in onDraw
+        else:
+            for ax, background in zip(self.canvas.figure.axes, self.backgrounds):
+                self.canvas.restore_region(background)
+            self.drawAnimatedArtists()
+            self.blitRequested.emit()
+        self.frame_times.append(time.perf_counter())
+
+    def onDraw(self, event):
+        if not self.bool_blit or len(self.animated_artists) == 0:
+            return
+        self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax in self.canvas.figure.axes]
+        self.drawAnimatedArtists()
+
+    def blitAxes(self):
+        ''' Repaint only the region of each axes from the agg buffer. '''
+        for ax in self.canvas.figure.axes:
+            self.canvas.blit(ax.bbox)
+
+    def drawAnimatedArtists(self):
+        for artist in self.animated_artists:
+            artist.axes.draw_artist(artist)
+
+    def getFrameRate(self):
+        ''' Frames drawn per second in the last FRAME_RATE_WINDOW seconds. '''
+        now = time.perf_counter()
+        return sum(1 for t in list(self.frame_times) if now - t < self.FRAME_RATE_WINDOW) / self.FRAME_RATE_WINDOW
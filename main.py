@@ -140,6 +140,11 @@ class MainWindow(QMainWindow):
         self.threadpool = QThreadPool()
         print("Multithreading with maximum %d threads" % self.threadpool.maxThreadCount())
 
+        # Compile the simulation kernels in the background as soon as the window opens
+        worker = Worker(EmyFunctions.warmUpPyBasedSimulation, self)
+        worker.signals.result.connect(self.worker_print_output)
+        self.threadpool.start(worker)
+
         # Get timer running
         self.counter = 0
         self.timer = QTimer()
@@ -377,9 +382,13 @@ class MainWindow(QMainWindow):
         self.counter += 1
         self.ui.title_label_counter.setText("Counter: %d" % self.counter)
 
+        # sustained frame rate of the scope on page 3 or 4, whichever is drawing
+        frame_rate = max([scope.getFrameRate() for scope in (self.ui.MplWidget_ACMPlot, self.ui.MplWidget_ACMPlot2) if scope is not None], default=0.0)
+        self.ui.title_label_frame_rate.setText(f'FPS: {frame_rate:.1f}')
+
     # 把变量推到 qtconsole 中去
     def console_push_variable(self, d):
-        self.console_window.ConsoleWidget_ACMPlot.push_vars(d)
+        self.console_window.push_vars(d) # (kept until the console window is first opened)
 
     # Worker (thread) Callback Functions
     # ///////////////////////////////////////////////////////////////
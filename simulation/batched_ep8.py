@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+''' Batched engine for tutorials_ep8_SFOC_Dynamic.py
+
+    N motor/controller instances are stored as struct-of-arrays (one row per instance) and
+    simulated by one compiled call that runs the instances in parallel on every core.
+
+    Scope: the FOC branch of DSP() with encoder speed feedback, the tustin_pid() regulators and
+    an ideal (zero-order-hold) inverter, i.e., the same as ACMSimPyIncremental with
+    CTRL.bool_use_FOC_or_SFOC == True, CTRL.index_separate_speed_estimation == 0 and
+    MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD < 20. Commands are written into the state arrays by
+    the caller between calls (the hard-coded command sequence of ACMSimPyIncremental is not used).
+
+    Example (1000-point speed KP sweep):
+        batch = Batched_Simulation.from_d(d, N=1000)
+        batch.rp[:, REG_SPEED, RP_KP] = np.linspace(0.1, 2.0, 1000)
+        batch.cs[:, CS_CMD_RPM] = 50
+        machine_times, watch_data = batch.run(TIME=1.0) # watch_data.shape = (N, len(BATCH_WATCH_NAMES), samples)
+'''
+import numpy as np
+from numba import njit, prange
+import tutorials_ep8_SFOC_Dynamic as acmsimpy
+
+############################################# STRUCT-OF-ARRAYS LAYOUT
+# machine parameters (mp)
+MP_R, MP_LD, MP_LQ, MP_RREQ, MP_NPP, MP_JS, MP_TLOAD = range(7)
+NUMBER_OF_MACHINE_PARAMETERS = 7
+# machine states (mx), same as ACM.x
+MX_THETA_D_MECH, MX_OMEGA_R_MECH, MX_KA, MX_ID, MX_IQ = range(5)
+NUMBER_OF_MACHINE_STATES = 5
+# machine variables that persist between machine steps (mo)
+MO_KA, MO_OMEGA_SLIP, MO_TEM, MO_UDQ0, MO_UDQ1 = range(5)
+NUMBER_OF_MACHINE_OUTPUTS = 5
+# controller parameters (cp)
+CP_NPP, CP_LD, CP_LQ, CP_KE, CP_RREQ, CP_BOOL_DECOUPLING, CP_BOOL_SPEED_LOOP, CP_BOOL_ZERO_ID, CP_IN = range(9)
+NUMBER_OF_CONTROLLER_PARAMETERS = 9
+# controller states and commands (cs)
+(CS_VL_COUNTER, CS_THETA_D, CS_OMEGA_R_ELEC, CS_OMEGA_SYN, CS_OMEGA_SLIP, CS_COST, CS_SINT,
+ CS_IDQ0, CS_IDQ1, CS_KA, CS_TEM, CS_CMD_RPM, CS_CMD_KA, CS_CMD_IDQ0, CS_CMD_IDQ1,
+ CS_CMD_UDQ0, CS_CMD_UDQ1, CS_CMD_UAB0, CS_CMD_UAB1) = range(19)
+NUMBER_OF_CONTROLLER_STATES = 19
+# regulators (rp and rs have the shape of (N, NUMBER_OF_REGULATORS, *))
+REG_ID, REG_IQ, REG_SPEED = range(3)
+NUMBER_OF_REGULATORS = 3
+RP_KP, RP_KI, RP_KD, RP_TAU, RP_OUTLIMIT, RP_INTLIMIT, RP_T = range(7)
+NUMBER_OF_REGULATOR_PARAMETERS = 7
+RS_INTEGRATOR, RS_PREVERROR, RS_DIFFERENTIATOR, RS_PREVMEASUREMENT, RS_OUT = range(5)
+NUMBER_OF_REGULATOR_STATES = 5
+
+# recorded channels (the names and units follow _Unit_Watch_Mapping)
+BATCH_WATCH_NAMES = [
+    'ACM.theta_d',
+    'ACM.omega_r_mech',
+    'ACM.KA',
+    'ACM.iD',
+    'ACM.iQ',
+    'ACM.Tem',
+    'ACM.TLoad',
+    'ACM.udq[0]',
+    'ACM.udq[1]',
+    'CTRL.idq[0]',
+    'CTRL.idq[1]',
+    'CTRL.omega_r_mech',
+    'CTRL.cmd_rpm',
+    'CTRL.cmd_idq[0]',
+    'CTRL.cmd_idq[1]',
+    'CTRL.cmd_udq[0]',
+    'CTRL.cmd_udq[1]',
+]
+
+############################################# KERNELS
+# (only arrays and scalars are passed, so the kernels are cached on disk and a warm start skips the compilation)
+@njit(nogil=True, cache=True)
+def batched_machine_dynamics(x0, x1, x2, x3, x4, mp, mo, n, CLARKE_TRANS_TORQUE_GAIN=1.5):
+    # the same as DYNAMICS_MACHINE (note ACM.KA of the last machine step is used for the back emf)
+    npp = mp[n, MP_NPP]
+    if x2 == 0.0:
+        omega_slip = 0.0
+    else:
+        omega_slip = mp[n, MP_RREQ] * x4 / x2
+    omega_syn = x1*npp + omega_slip
+
+    if mp[n, MP_RREQ] > 0:
+        f2 = mp[n, MP_RREQ]*x3 - mp[n, MP_RREQ] / (mp[n, MP_LD] - mp[n, MP_LQ]) * x2
+        f3 = (mo[n, MO_UDQ0] - mp[n, MP_R]*x3 + omega_syn*mp[n, MP_LQ]*x4 - f2) / mp[n, MP_LQ]
+    else:
+        f3 = (mo[n, MO_UDQ0] - mp[n, MP_R]*x3 + omega_syn*mp[n, MP_LQ]*x4) / mp[n, MP_LD]
+        f2 = (mp[n, MP_LD] - mp[n, MP_LQ]) * f3 + 0.0
+    f4 = (mo[n, MO_UDQ1] - mp[n, MP_R]*x4 - omega_syn*mp[n, MP_LQ]*x3 - omega_syn*mo[n, MO_KA]) / mp[n, MP_LQ]
+
+    Tem = CLARKE_TRANS_TORQUE_GAIN * npp * x2 * x4
+    f0 = x1 + omega_slip / npp
+    f1 = (Tem - mp[n, MP_TLOAD]) / mp[n, MP_JS]
+    return f0, f1, f2, f3, f4, omega_slip, Tem
+
+@njit(nogil=True, cache=True)
+def batched_RK4_MACHINE(mp, mx, mo, n, hs):
+    x0, x1, x2, x3, x4 = mx[n, 0], mx[n, 1], mx[n, 2], mx[n, 3], mx[n, 4]
+    # incrementals at 4 stages (same order of floating point operations as RK4_MACHINE)
+    f0, f1, f2, f3, f4, _, _ = batched_machine_dynamics(x0, x1, x2, x3, x4, mp, mo, n) # @t
+    a0, a1, a2, a3, a4 = f0*hs, f1*hs, f2*hs, f3*hs, f4*hs
+    f0, f1, f2, f3, f4, _, _ = batched_machine_dynamics(x0 + a0*0.5, x1 + a1*0.5, x2 + a2*0.5, x3 + a3*0.5, x4 + a4*0.5, mp, mo, n) # @t+hs/2
+    b0, b1, b2, b3, b4 = f0*hs, f1*hs, f2*hs, f3*hs, f4*hs
+    f0, f1, f2, f3, f4, _, _ = batched_machine_dynamics(x0 + b0*0.5, x1 + b1*0.5, x2 + b2*0.5, x3 + b3*0.5, x4 + b4*0.5, mp, mo, n) # @t+hs/2
+    c0, c1, c2, c3, c4 = f0*hs, f1*hs, f2*hs, f3*hs, f4*hs
+    f0, f1, f2, f3, f4, omega_slip, Tem = batched_machine_dynamics(x0 + c0, x1 + c1, x2 + c2, x3 + c3, x4 + c4, mp, mo, n) # @t+hs
+    d0, d1, d2, d3, d4 = f0*hs, f1*hs, f2*hs, f3*hs, f4*hs
+    mx[n, 0] = x0 + (a0 + 2*(b0 + c0) + d0)/6.0
+    mx[n, 1] = x1 + (a1 + 2*(b1 + c1) + d1)/6.0
+    mx[n, 2] = x2 + (a2 + 2*(b2 + c2) + d2)/6.0
+    mx[n, 3] = x3 + (a3 + 2*(b3 + c3) + d3)/6.0
+    mx[n, 4] = x4 + (a4 + 2*(b4 + c4) + d4)/6.0
+    mo[n, MO_OMEGA_SLIP] = omega_slip
+    mo[n, MO_TEM] = Tem
+
+@njit(nogil=True, cache=True)
+def batched_tustin_pid(rp, rs, n, r, setpoint, measurement):
+    # the same as tustin_pid
+    error = setpoint - measurement
+    proportional = rp[n, r, RP_KP] * error
+    integrator = rs[n, r, RS_INTEGRATOR] + 0.5 * rp[n, r, RP_KI] * rp[n, r, RP_T] * (error + rs[n, r, RS_PREVERROR])
+    if integrator  >  rp[n, r, RP_INTLIMIT]:
+        integrator =  rp[n, r, RP_INTLIMIT]
+    elif integrator< -rp[n, r, RP_INTLIMIT]:
+        integrator = -rp[n, r, RP_INTLIMIT]
+    differentiator = -(2.0 * rp[n, r, RP_KD] * (measurement - rs[n, r, RS_PREVMEASUREMENT]) \
+                     + (2.0 * rp[n, r, RP_TAU] - rp[n, r, RP_T]) * rs[n, r, RS_DIFFERENTIATOR]) \
+                     / (2.0 * rp[n, r, RP_TAU] + rp[n, r, RP_T])
+    Out = proportional + integrator + differentiator
+    if Out  >  rp[n, r, RP_OUTLIMIT]:
+        Out =  rp[n, r, RP_OUTLIMIT]
+    elif Out< -rp[n, r, RP_OUTLIMIT]:
+        Out = -rp[n, r, RP_OUTLIMIT]
+    rs[n, r, RS_INTEGRATOR] = integrator
+    rs[n, r, RS_DIFFERENTIATOR] = differentiator
+    rs[n, r, RS_PREVERROR] = error
+    rs[n, r, RS_PREVMEASUREMENT] = measurement
+    rs[n, r, RS_OUT] = Out
+    return Out
+
+@njit(nogil=True, cache=True)
+def batched_FOC(cp, cs, rp, rs, n, iAlfa, iBeta, theta_d, omega_r_elec, omega_syn, velocity_loop_ceiling):
+    # the same as DSP() followed by FOC() with encoder feedback
+    cs[n, CS_THETA_D] = theta_d
+    cs[n, CS_OMEGA_R_ELEC] = omega_r_elec
+    cs[n, CS_OMEGA_SYN] = omega_syn
+    cs[n, CS_OMEGA_SLIP] = omega_syn
+
+    cosT = np.cos(theta_d)
+    sinT = np.sin(theta_d)
+    cs[n, CS_COST] = cosT
+    cs[n, CS_SINT] = sinT
+    cs[n, CS_IDQ0] = iAlfa * cosT + iBeta * sinT
+    cs[n, CS_IDQ1] = iAlfa *-sinT + iBeta * cosT
+
+    cs[n, CS_KA] = (cp[n, CP_LD] - cp[n, CP_LQ]) * cs[n, CS_IDQ0] + cp[n, CP_KE]
+    cs[n, CS_TEM] = 1.5 * cp[n, CP_NPP] * cs[n, CS_IDQ1] * cs[n, CS_KA]
+
+    # Speed regulation
+    cs[n, CS_VL_COUNTER] += 1
+    if cs[n, CS_VL_COUNTER] >= velocity_loop_ceiling:
+        cs[n, CS_VL_COUNTER] = 0
+        batched_tustin_pid(rp, rs, n, REG_SPEED, cs[n, CS_CMD_RPM] / 60 * 2*np.pi * cp[n, CP_NPP], omega_r_elec)
+    if cp[n, CP_BOOL_SPEED_LOOP] != 0:
+        cs[n, CS_CMD_IDQ1] = rs[n, REG_SPEED, RS_OUT]
+
+    # slip and syn frequencies
+    if cp[n, CP_RREQ] > 0: # IM
+        cs[n, CS_CMD_IDQ0] = cs[n, CS_CMD_KA] / (cp[n, CP_LD] - cp[n, CP_LQ])
+        cs[n, CS_OMEGA_SLIP] = cp[n, CP_RREQ] * cs[n, CS_CMD_IDQ1] / cs[n, CS_KA]
+    else:
+        cs[n, CS_OMEGA_SLIP] = 0.0
+        if cp[n, CP_BOOL_ZERO_ID] != 0:
+            cs[n, CS_CMD_IDQ0] = 0.0
+        else:
+            # Field weakening control (simple)
+            speed_rpm = cs[n, CS_OMEGA_R_ELEC]*60/(2*np.pi*cp[n, CP_NPP])
+            MAX_DEMAG_CURRENT = 60
+            if speed_rpm < 450:
+                cs[n, CS_CMD_IDQ0] = 0
+            elif speed_rpm < 1000:
+                cs[n, CS_CMD_IDQ0] = (speed_rpm - 450) / (1000 - 450) * -MAX_DEMAG_CURRENT
+            else:
+                cs[n, CS_CMD_IDQ0] = -MAX_DEMAG_CURRENT
+            if cp[n, CP_IN]*1.414 > cs[n, CS_CMD_IDQ0]:
+                rp[n, REG_SPEED, RP_OUTLIMIT] = np.sqrt((cp[n, CP_IN]*1.414)**2 - cs[n, CS_CMD_IDQ0]**2)
+    cs[n, CS_OMEGA_SYN] = cs[n, CS_OMEGA_R_ELEC] + cs[n, CS_OMEGA_SLIP]
+
+    # current regulation
+    cs[n, CS_CMD_UDQ0] = batched_tustin_pid(rp, rs, n, REG_ID, cs[n, CS_CMD_IDQ0], cs[n, CS_IDQ0])
+    cs[n, CS_CMD_UDQ1] = batched_tustin_pid(rp, rs, n, REG_IQ, cs[n, CS_CMD_IDQ1], cs[n, CS_IDQ1])
+
+    # Decoupling between two axes of current loop controller
+    if cp[n, CP_BOOL_DECOUPLING] != 0:
+        cs[n, CS_CMD_UDQ0] += -cs[n, CS_OMEGA_SYN] * cp[n, CP_LQ] * cs[n, CS_CMD_IDQ1]
+        cs[n, CS_CMD_UDQ1] +=  cs[n, CS_OMEGA_SYN] * (cs[n, CS_KA] + cp[n, CP_LQ] * cs[n, CS_CMD_IDQ0])
+        limit = rp[n, REG_IQ, RP_OUTLIMIT]
+        for k in (CS_CMD_UDQ0, CS_CMD_UDQ1):
+            if cs[n, k]   >  limit:
+                cs[n, k]  =  limit
+            elif cs[n, k] < -limit:
+                cs[n, k]  = -limit
+
+    # Inverse Park transformation
+    cs[n, CS_CMD_UAB0] = cs[n, CS_CMD_UDQ0] * cosT + cs[n, CS_CMD_UDQ1] *-sinT
+    cs[n, CS_CMD_UAB1] = cs[n, CS_CMD_UDQ0] * sinT + cs[n, CS_CMD_UDQ1] * cosT
+
+@njit(nogil=True, cache=True)
+def batched_watch_signal(index, mp, mx, mo, cs, n):
+    # the index follows BATCH_WATCH_NAMES
+    npp = mp[n, MP_NPP]
+    if   index ==  0: return divmod(mx[n, MX_THETA_D_MECH]*npp, 2*np.pi)[1]
+    elif index ==  1: return mx[n, MX_OMEGA_R_MECH] / (2*np.pi) * 60
+    elif index ==  2: return mx[n, MX_KA]
+    elif index ==  3: return mx[n, MX_ID]
+    elif index ==  4: return mx[n, MX_IQ]
+    elif index ==  5: return mo[n, MO_TEM]
+    elif index ==  6: return mp[n, MP_TLOAD]
+    elif index ==  7: return mo[n, MO_UDQ0]
+    elif index ==  8: return mo[n, MO_UDQ1]
+    elif index ==  9: return cs[n, CS_IDQ0]
+    elif index == 10: return cs[n, CS_IDQ1]
+    elif index == 11: return cs[n, CS_OMEGA_R_ELEC] / (2*np.pi*npp) * 60
+    elif index == 12: return cs[n, CS_CMD_RPM]
+    elif index == 13: return cs[n, CS_CMD_IDQ0]
+    elif index == 14: return cs[n, CS_CMD_IDQ1]
+    elif index == 15: return cs[n, CS_CMD_UDQ0]
+    elif index == 16: return cs[n, CS_CMD_UDQ1]
+    return 0.0
+
+@njit(nogil=True, parallel=True, cache=True)
+def batched_kernel(step0, number_of_steps, MACHINE_TS, controller_down_sampling_ceiling, velocity_loop_ceiling, watch_decimation,
+                   mp, mx, mo, cp, cs, rp, rs, out_data):
+    ''' Simulate all N instances (rows) for number_of_steps machine steps starting from the global step index step0.
+        The instances are independent, so each core runs its own instances through the whole time span. '''
+    N = mx.shape[0]
+    number_of_watch_channels = out_data.shape[1]
+    for n in prange(N):
+        npp = mp[n, MP_NPP]
+        watch_index = 0
+        for ii in range(number_of_steps):
+
+            """ Machine Simulation @ MACHINE_TS """
+            batched_RK4_MACHINE(mp, mx, mo, n, MACHINE_TS)
+            mo[n, MO_KA] = mx[n, MX_KA]
+            theta_d      = mx[n, MX_THETA_D_MECH] * npp
+            omega_r_elec = mx[n, MX_OMEGA_R_MECH] * npp
+            omega_syn    = omega_r_elec + mo[n, MO_OMEGA_SLIP]
+            cosT = np.cos(theta_d)
+            sinT = np.sin(theta_d)
+            iAlfa = mx[n, MX_ID] * cosT + mx[n, MX_IQ] *-sinT
+            iBeta = mx[n, MX_ID] * sinT + mx[n, MX_IQ] * cosT
+
+            """ DSP @ CL_TS """
+            if (step0 + ii) % controller_down_sampling_ceiling == 0:
+                batched_FOC(cp, cs, rp, rs, n, iAlfa, iBeta, theta_d, omega_r_elec, omega_syn, velocity_loop_ceiling)
+
+            """ Ideal inverter and Park transformation """
+            mo[n, MO_UDQ0] = cs[n, CS_CMD_UAB0] *  cosT + cs[n, CS_CMD_UAB1] * sinT
+            mo[n, MO_UDQ1] = cs[n, CS_CMD_UAB0] * -sinT + cs[n, CS_CMD_UAB1] * cosT
+
+            """ Watch @ MACHINE_TS """
+            if (step0 + ii) % watch_decimation == 0:
+                for k in range(number_of_watch_channels):
+                    out_data[n, k, watch_index] = batched_watch_signal(k, mp, mx, mo, cs, n)
+                watch_index += 1
+
+############################################# PYTHON INTERFACE
+class Batched_Simulation:
+    def __init__(self, N, CL_TS, VL_TS, MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=1):
+        self.N = N
+        self.CL_TS = CL_TS
+        self.VL_TS = VL_TS
+        self.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD = MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+        self.step = 0 # global machine step index (integer time base)
+
+        self.mp = np.zeros((N, NUMBER_OF_MACHINE_PARAMETERS))
+        self.mx = np.zeros((N, NUMBER_OF_MACHINE_STATES))
+        self.mo = np.zeros((N, NUMBER_OF_MACHINE_OUTPUTS))
+        self.cp = np.zeros((N, NUMBER_OF_CONTROLLER_PARAMETERS))
+        self.cs = np.zeros((N, NUMBER_OF_CONTROLLER_STATES))
+        self.rp = np.zeros((N, NUMBER_OF_REGULATORS, NUMBER_OF_REGULATOR_PARAMETERS))
+        self.rs = np.zeros((N, NUMBER_OF_REGULATORS, NUMBER_OF_REGULATOR_STATES))
+
+    @classmethod
+    def from_global_objects(cls, list_of_global_objects):
+        ''' Pack the (CTRL, ACM, reg_id, reg_iq, reg_speed, ...) tuples returned by Simulation_Benchmark.get_global_objects(). '''
+        CTRL, ACM = list_of_global_objects[0][0], list_of_global_objects[0][1]
+        batch = cls(len(list_of_global_objects), CTRL.CL_TS, CTRL.VL_TS, ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD)
+        for n, global_objects in enumerate(list_of_global_objects):
+            CTRL, ACM, reg_id, reg_iq, reg_speed = global_objects[:5]
+            if CTRL.CL_TS != batch.CL_TS or CTRL.VL_TS != batch.VL_TS or ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD != batch.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD:
+                raise Exception('All instances of a batch must share CL_TS, VL_TS and MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD.')
+            if CTRL.bool_use_FOC_or_SFOC == False or CTRL.index_separate_speed_estimation != 0 or ACM.bool_apply_load_model:
+                raise Exception('The batched engine implements FOC with encoder feedback and constant load only.')
+            if ACM.Rreq < 0:
+                raise Exception('ACM.Rreq is used to calculate slip so it must be zero for PMSM.')
+            batch.mp[n] = ACM.R, ACM.Ld, ACM.Lq, ACM.Rreq, ACM.npp, ACM.Js, ACM.TLoad
+            batch.mx[n] = ACM.x
+            batch.mo[n] = ACM.KA, ACM.omega_slip, ACM.Tem, ACM.udq[0], ACM.udq[1]
+            batch.cp[n] = (CTRL.npp, CTRL.Ld, CTRL.Lq, CTRL.KE, CTRL.Rreq,
+                           CTRL.bool_apply_decoupling_voltages_to_current_regulation, CTRL.bool_apply_speed_closed_loop_control, CTRL.bool_zero_id_control, CTRL.IN)
+            batch.cs[n] = (CTRL.velocity_loop_counter, CTRL.theta_d, CTRL.omega_r_elec, CTRL.omega_syn, CTRL.omega_slip, CTRL.cosT, CTRL.sinT,
+                           CTRL.idq[0], CTRL.idq[1], CTRL.KA, CTRL.Tem, CTRL.cmd_rpm, CTRL.cmd_KA, CTRL.cmd_idq[0], CTRL.cmd_idq[1],
+                           CTRL.cmd_udq[0], CTRL.cmd_udq[1], CTRL.cmd_uab[0], CTRL.cmd_uab[1])
+            for r, reg in enumerate((reg_id, reg_iq, reg_speed)):
+                batch.rp[n, r] = reg.Kp, reg.Ki, reg.Kd, reg.tau, reg.OutLimit, reg.IntLimit, reg.T
+                batch.rs[n, r] = reg.integrator, reg.prevError, reg.differentiator, reg.prevMeasurement, reg.Out
+        return batch
+
+    @classmethod
+    def from_d(cls, d, N=1, CTRL_execute_codes=''):
+        ''' N identical instances configured by the user input dict d (see Simulation_Benchmark). '''
+        global_objects = acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False, CTRL_execute_codes=CTRL_execute_codes).get_global_objects()
+        return cls.from_global_objects([global_objects] * N)
+
+    def run(self, TIME, watch_decimation=1, out_data=None):
+        ''' Continue the simulation of all instances for TIME seconds.
+            Return the sample times and the recorded channels (see BATCH_WATCH_NAMES) with shape (N, channels, samples). '''
+        MACHINE_TS = self.CL_TS / self.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+        controller_down_sampling_ceiling = int(self.CL_TS / MACHINE_TS)
+        number_of_steps = acmsimpy.get_step_index(TIME, MACHINE_TS)
+        number_of_watch_samples = acmsimpy.get_number_of_watch_samples(self.step, number_of_steps, acmsimpy.WATCH_MODE_DECIMATE, watch_decimation)
+        if out_data is None:
+            out_data = np.zeros((self.N, len(BATCH_WATCH_NAMES), number_of_watch_samples))
+        batched_kernel(self.step, number_of_steps, MACHINE_TS, controller_down_sampling_ceiling, self.VL_TS / self.CL_TS, watch_decimation,
+                       self.mp, self.mx, self.mo, self.cp, self.cs, self.rp, self.rs, out_data)
+        first_recorded_step = (self.step + watch_decimation - 1) // watch_decimation * watch_decimation
+        machine_times = (first_recorded_step + np.arange(number_of_watch_samples) * watch_decimation) * MACHINE_TS
+        self.step += number_of_steps
+        return machine_times, out_data
+
+if __name__ == '__main__':
+    import time
+    from benchmark_ep8 import get_benchmark_dict, CTRL_execute_codes
+    d = get_benchmark_dict(MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=1)
+    d['CTRL.bool_use_FOC_or_SFOC'] = True
+    batch = Batched_Simulation.from_d(d, N=1000, CTRL_execute_codes=CTRL_execute_codes)
+    batch.rp[:, REG_SPEED, RP_KP] *= np.linspace(0.2, 2.0, batch.N) # speed KP sweep
+    batch.cs[:, CS_CMD_RPM] = 50
+    tic = time.perf_counter()
+    batch.run(TIME=1e-3) # JIT compile (or load from the disk cache)
+    print(f'JIT compile in {time.perf_counter()-tic:.1f} s ({"loaded from" if batched_kernel.stats.cache_hits else "saved to"} the disk cache)')
+    tic = time.perf_counter()
+    machine_times, watch_data = batch.run(TIME=0.5, watch_decimation=10)
+    print(f'{batch.N} instances x 0.5 s in {time.perf_counter()-tic:.3f} s, {watch_data.shape=}')
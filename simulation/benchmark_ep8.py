@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+''' Throughput benchmark of tutorials_ep8_SFOC_Dynamic.py
+    Run it from the simulation folder: python benchmark_ep8.py
+'''
+import io, time, contextlib
+import numpy as np
+from numba import njit
+import tutorials_ep8_SFOC_Dynamic as acmsimpy
+
+def get_benchmark_dict(MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=500):
+    # the same motor and controller as in the __main__ of tutorials_ep8_SFOC_Dynamic.py,
+    # SVPWM is simulated when MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD >= 20
+    return {
+        # Timing
+        'CL_TS': 1e-4,
+        'VL_EXE_PER_CL_EXE': 1,
+        'MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD': MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD,
+        'TIME_SLICE': 0.01,
+        'NUMBER_OF_SLICES': 5,
+        # Motor data
+        'init_Js': 0.044,
+        'init_npp': 22,
+        'init_IN': 1.3*6/1.414,
+        'init_R': 0.035,
+        'init_Ld': 1*0.036*1e-3,
+        'init_Lq': 1*0.036*1e-3,
+        'init_KE': 0.0125,
+        'init_KA': 0.0125,
+        'init_Rreq': 0.0,
+        'DC_BUS_VOLTAGE': 48,
+        'user_system_input_code': '''if ii < 1: CTRL.cmd_idq[0] = 0.0; CTRL.cmd_rpm = 50''',
+        # Controller config
+        'CTRL.bool_apply_speed_closed_loop_control': True,
+        'CTRL.bool_apply_decoupling_voltages_to_current_regulation': False,
+        'CTRL.bool_apply_sweeping_frequency_excitation': False,
+        'CTRL.bool_overwrite_speed_commands': True,
+        'CTRL.bool_zero_id_control': True,
+        'CTRL.bool_use_FOC_or_SFOC': False,
+        'FOC_delta': 10,
+        'FOC_desired_VLBW_HZ': 20,
+        'FOC_CL_KI_factor_when__bool_apply_decoupling_voltages_to_current_regulation__is_False': 10,
+        'CL_SERIES_KP': None,
+        'CL_SERIES_KI': None,
+        'VL_SERIES_KP': None,
+        'VL_SERIES_KI': None,
+        'VL_LIMIT_OVERLOAD_FACTOR': 3.0,
+        'disp.Kp': 0.0,
+        'disp.Ki': 0.0,
+        'disp.Kd': 0.0,
+        'disp.tau': 0.0,
+        'disp.OutLimit': 0.0,
+        'disp.IntLimit': 0.0,
+    }
+
+CTRL_execute_codes = '''
+CTRL.kPFL = 0
+CTRL.kPCL = 300
+reg_speed.Kp = 0.5
+reg_speed.Ki = 20
+CTRL.cmd_psi_Ms = 0.0125
+'''
+
+@njit(nogil=True)
+def run_RK4_MACHINE(ACM, hs, number_of_steps):
+    for ii in range(number_of_steps):
+        acmsimpy.RK4_MACHINE(ii*hs, ACM, hs)
+
+def benchmark_RK4_MACHINE(d, number_of_steps=1000000, number_of_repeats=3):
+    ''' machine steps per second of the integrator alone (the best of number_of_repeats runs, as other load only slows a run down) '''
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = \
+        acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False, CTRL_execute_codes=CTRL_execute_codes).get_global_objects()
+    ACM.udq[1] = 1.0
+    hs = CTRL.CL_TS / ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+    run_RK4_MACHINE(ACM, hs, 10) # JIT compile
+    elapsed = []
+    for _ in range(number_of_repeats):
+        tic = time.perf_counter()
+        run_RK4_MACHINE(ACM, hs, number_of_steps)
+        elapsed.append(time.perf_counter() - tic)
+    return number_of_steps / min(elapsed)
+
+@njit(nogil=True)
+def run_machine_integrator(ACM, hs, number_of_steps, bool_hold_uab):
+    # open-loop, with ACM.uab (or ACM.udq) held by the inverter
+    for ii in range(number_of_steps):
+        if ACM.integrator == acmsimpy.INTEGRATOR_DOPRI5:
+            acmsimpy.DOPRI5_MACHINE(ii*hs, ACM, hs, bool_hold_uab=bool_hold_uab)
+        elif ACM.integrator == acmsimpy.INTEGRATOR_ROS2:
+            acmsimpy.ROS2_MACHINE(ii*hs, ACM, hs, bool_hold_uab=bool_hold_uab)
+        elif ACM.integrator == acmsimpy.INTEGRATOR_ZOH:
+            acmsimpy.ZOH_MACHINE(ii*hs, ACM, hs)
+        else:
+            acmsimpy.RK4_MACHINE(ii*hs, ACM, hs, bool_hold_uab=bool_hold_uab)
+
+def benchmark_machine_integrators(d, TIME=0.2, list_of_hs=(1e-4, 1e-3, 1e-2), uab=(20.0, 10.0)):
+    ''' accuracy and run time of the machine integrators for a constant alpha-beta voltage (a constant dq voltage for zoh, which holds udq),
+        the error is the largest deviation of [omega_r_mech, KA, iD, iQ] from RK4 at a step size of 1e-7 s '''
+    def get_ACM(integrator):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ACM = acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False, CTRL_execute_codes=CTRL_execute_codes).get_global_objects()[1]
+        ACM.uab[0], ACM.uab[1] = uab
+        ACM.udq[0], ACM.udq[1] = uab # at theta_d = 0
+        ACM.integrator = acmsimpy._INTEGRATORS[integrator]
+        return ACM
+    x_reference = dict()
+    for bool_hold_uab in (True, False):
+        for integrator in acmsimpy._INTEGRATORS:
+            run_machine_integrator(get_ACM(integrator), 1e-4, 10, bool_hold_uab) # JIT compile
+        ACM = get_ACM('rk4')
+        run_machine_integrator(ACM, 1e-7, int(round(TIME/1e-7)), bool_hold_uab)
+        x_reference[bool_hold_uab] = ACM.x[1:].copy()
+
+    report = []
+    for hs in list_of_hs:
+        for integrator in acmsimpy._INTEGRATORS:
+            bool_hold_uab = integrator != 'zoh'
+            ACM = get_ACM(integrator)
+            tic = time.perf_counter()
+            run_machine_integrator(ACM, hs, int(round(TIME/hs)), bool_hold_uab)
+            toc = time.perf_counter()
+            error = np.max(np.abs(ACM.x[1:] - x_reference[bool_hold_uab]))
+            number_of_steps = ACM.number_of_accepted_steps + ACM.number_of_rejected_steps if integrator == 'dopri5' else int(round(TIME/hs))
+            report.append((hs, integrator, number_of_steps, error, toc - tic))
+    return report
+
+def benchmark_ACMSimPyIncremental(d, number_of_repeats=3):
+    ''' machine steps per second of the main loop (controller, SVPWM and a single recorded channel included), the best of number_of_repeats runs '''
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = \
+        acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False, CTRL_execute_codes=CTRL_execute_codes).get_global_objects()
+    CTRL.cmd_rpm = 50
+    watch_channels = np.array([1], dtype=np.int64) # ACM.omega_r_mech
+    def run_slice(ii):
+        acmsimpy.ACMSimPyIncremental(t0=ii*d['TIME_SLICE'], TIME=d['TIME_SLICE'],
+            ACM=ACM, CTRL=CTRL, reg_id=reg_id, reg_iq=reg_iq, reg_speed=reg_speed,
+            watch_channels=watch_channels, svgen1=svgen1)
+    run_slice(0) # JIT compile
+    elapsed = []
+    for repeat in range(number_of_repeats):
+        tic = time.perf_counter()
+        for ii in range(1, d['NUMBER_OF_SLICES']+1):
+            run_slice(repeat*d['NUMBER_OF_SLICES'] + ii)
+        elapsed.append(time.perf_counter() - tic)
+    MACHINE_TS = CTRL.CL_TS / ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+    return d['NUMBER_OF_SLICES'] * acmsimpy.get_step_index(d['TIME_SLICE'], MACHINE_TS) / min(elapsed)
+
+if __name__ == '__main__':
+    d = get_benchmark_dict(MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=500)
+    print(f'RK4_MACHINE:         {benchmark_RK4_MACHINE(d):.3e} steps/s')
+    print(f'ACMSimPyIncremental: {benchmark_ACMSimPyIncremental(d):.3e} steps/s (SVPWM, {d["MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD"]} machine steps per control period)')
+
+    print('Machine integrators (0.2 s, step size = sync interval for dopri5):')
+    print(f'\t{"hs [s]":>8} {"integrator":>10} {"steps":>8} {"max error":>10} {"time [s]":>9}')
+    for hs, integrator, number_of_steps, error, elapsed in benchmark_machine_integrators(d):
+        print(f'\t{hs:8.0e} {integrator:>10} {number_of_steps:8d} {error:10.2e} {elapsed:9.4f}')
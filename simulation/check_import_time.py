@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+''' Import-time budget of the simulation modules that the batch workers (sweep.py) and the GUI import, and of the GUI itself
+
+    Run it from the simulation folder: python check_import_time.py
+    Each module is imported in a fresh interpreter with python -X importtime. The check fails if a module pulls in one of
+    HEAVY_MODULES (plotting, pandas and control are imported on first use instead) or takes longer than its budget.
+    The budgets leave some room above numba itself (about 0.4 s with a warm file cache), so run it on an idle machine.
+    The GUI modules are imported from the repository root (like main.py) and checked against GUI_HEAVY_MODULES: the
+    window needs matplotlib for its canvases, but the simulation (numba), pyplot and the console are imported on first use.
+'''
+import os, sys, subprocess
+
+HEAVY_MODULES = ['pylab', 'matplotlib', 'pandas', 'control']
+GUI_HEAVY_MODULES = ['numba', 'pylab', 'matplotlib.pyplot', 'pandas', 'control', 'qtconsole']
+
+IMPORT_TIME_BUDGET = { # [s]
+    'tutorials_ep8_SFOC_Dynamic': 0.8,
+    'batched_ep8':                0.8,
+    'benchmark_ep8':              0.8,
+    'sweep':                      0.8,
+    'shooting':                   0.8,
+    'tuner':                      0.3,
+}
+
+GUI_IMPORT_TIME_BUDGET = { # [s] (PySide6 and matplotlib included)
+    'gui.core.emy_functions':                         0.5,
+    'gui.uis.windows.main_window.setup_main_window':  1.5,
+    'main':                                           1.5,
+}
+
+SIMULATION_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_ROOT = os.path.dirname(SIMULATION_FOLDER)
+
+def get_import_times(module_name, cwd=SIMULATION_FOLDER):
+    ''' Import module_name in a fresh interpreter and return {module: cumulative import time [s]} of every module imported. '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f'Failed to import {module_name}:\n{result.stderr}')
+    import_times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if cumulative_us.strip().isdigit(): # (skip the header)
+            import_times[name.strip()] = int(cumulative_us) * 1e-6
+    return import_times
+
+def check_import_times(budget=IMPORT_TIME_BUDGET, heavy_modules=HEAVY_MODULES, cwd=SIMULATION_FOLDER):
+    ''' Return the import times of the modules in budget and the list of violations (empty if all are within budget). '''
+    import_times, violations = dict(), []
+    for module_name, seconds in budget.items():
+        times = get_import_times(module_name, cwd)
+        import_times[module_name] = times[module_name]
+        heavy = [heavy_name for heavy_name in heavy_modules if any(name == heavy_name or name.startswith(heavy_name + '.') for name in times)]
+        if heavy:
+            violations.append(f'{module_name} imports {", ".join(heavy)} at import time')
+        if times[module_name] > seconds:
+            violations.append(f'{module_name} takes {times[module_name]:.3f} s to import (budget {seconds:g} s)')
+    return import_times, violations
+
+if __name__ == '__main__':
+    import_times, violations = check_import_times()
+    gui_import_times, gui_violations = check_import_times(GUI_IMPORT_TIME_BUDGET, GUI_HEAVY_MODULES, REPOSITORY_ROOT)
+    import_times.update(gui_import_times)
+    violations += gui_violations
+    budget = dict(IMPORT_TIME_BUDGET, **GUI_IMPORT_TIME_BUDGET)
+    for module_name, seconds in import_times.items():
+        print(f'\t{module_name:>45}: {seconds:.3f} s (budget {budget[module_name]:g} s)')
+    for violation in violations:
+        print('FAIL:', violation)
+    sys.exit(1 if violations else 0)
@@ -234,7 +234,7 @@ class THE_CONSOLE:
 
         self.init_global_data()
 
-        self.acmsimpy_globals = self.CTRL, self.ACM, self.reg_id, self.reg_iq, self.reg_speed, self.reg_dispX, self.reg_dispY \
+        self.acmsimpy_globals = self.CTRL, self.ACM, self.reg_id, self.reg_iq, self.reg_speed, self.reg_dispX, self.reg_dispY, self.svgen1 \
             = acmsimpy.Simulation_Benchmark(self.d_user_input_motor_dict, tuner=tuner, bool_start_simulation=False).get_global_objects()
 
         print(f'\t{self.NUMBER_OF_SAMPLE_TO_SHOW=}')
@@ -253,7 +253,7 @@ class THE_CONSOLE:
                 # print(k, len(self.data_dict[k]))
 
 def run_simulation(CONSOLE):
-    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY = CONSOLE.acmsimpy_globals
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = CONSOLE.acmsimpy_globals
 
     # Run one slice of simulation
     machine_times, numba__waveforms_dict = acmsimpy.ACMSimPyWrapper(
@@ -264,6 +264,7 @@ def run_simulation(CONSOLE):
         reg_id=reg_id,
         reg_iq=reg_iq,
         reg_speed=reg_speed,
+        svgen1=svgen1,
     )
     CONSOLE.counter=CONSOLE.counter+1
 
@@ -282,6 +283,13 @@ def run_simulation(CONSOLE):
 
     return machine_times, numba__waveforms_dict
 
+def warm_up_simulation(CONSOLE):
+    ''' Compile the kernels by simulating one control period of new objects (the objects of CONSOLE are not advanced). '''
+    tic = time.perf_counter()
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = acmsimpy.Simulation_Benchmark(CONSOLE.d_user_input_motor_dict, tuner=tuner, bool_start_simulation=False).get_global_objects()
+    acmsimpy.ACMSimPyWrapper(CONSOLE.numba__scope_dict, t0=0.0, TIME=CONSOLE.CL_TS, ACM=ACM, CTRL=CTRL, reg_id=reg_id, reg_iq=reg_iq, reg_speed=reg_speed, svgen1=svgen1)
+    print(f'Numba JIT warm-up in {time.perf_counter()-tic:.1f} s')
+
 def update_plot(CONSOLE, n_CONSOLEs):
     for label_index, (ylabel, trace_names) in enumerate(CONSOLE.numba__scope_dict.items()):
         for trace_index, _ in enumerate(trace_names):
@@ -3317,7 +3325,7 @@ if __name__ == '__main__':
     dpg.setup_dearpygui()
     dpg.show_viewport()
 
-    # compile numba codes
+    # compile numba codes (on the thread below, which starts with warm_up_simulation() as soon as the window opens)
     print('Numba JIT compiling... (which typically lasts about 8 seconds)')
 
     if False:
@@ -3325,6 +3333,7 @@ if __name__ == '__main__':
         for thread in list_thread: thread.start()
     else:
         def _one_time_plot():
+            warm_up_simulation(list_CONSOLE[0])
             for CONSOLE in list_CONSOLE:
                 for _ in range(CONSOLE.NUMBER_OF_TIME_SLICE_TO_SHOW):
                     print(_, CONSOLE.counter)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+''' Periodic steady state by the shooting method on top of ACMSimPyIncremental (tutorials_ep8_SFOC_Dynamic.py)
+
+    The period map P integrates the drive over one period T (a multiple of the speed control period, so that the
+    PWM carrier and the controllers are in the same phase at both ends) from the state x, and Newton's method solves
+    P(x) - x = 0 by Broyden's method, so that each iteration simulates one period. The first step assumes P' = 0,
+    i.e., it is the plain x = P(x) of the brute force simulation, and the updates learn the slow modes from there on.
+    If the residual stops decreasing, the Jacobian of P is obtained by finite differences at the best x so far instead:
+    the nominal period and one perturbed period per state are simulated at once in a pool of threads (the kernels
+    release the GIL).
+
+    x holds the continuous states listed in state_names (the rotor angle is left out, as it keeps growing). The discrete
+    states (the inverter, the voltage commands held by the inverter, the time) are taken from the end of the nominal
+    period of the last iteration, so they are consistent with the orbit once x has converged.
+
+    The orbit must repeat after T, so choose a number of electrical periods that is (nearly) a multiple of the speed
+    control period. The period map should also be smooth in x, so use 'INVERTER_MODEL': 'average' (or 'event') rather
+    than the default 'tick' inverter, whose switching instants are quantized to the machine steps.
+
+    Example:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim = acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False); sim.start_simulation_slices(d, numba__scope_dict)
+        result = solve_periodic_steady_state(d, sim.get_snapshot(), numba__scope_dict=numba__scope_dict)
+        print(result.number_of_iterations, result.residual) # Newton iterations, max |P(x) - x| / max(1, |x|)
+        iQ = result.sim.gdd['ACM.iQ'] # one period of the orbit
+'''
+import io, contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tutorials_ep8_SFOC_Dynamic as acmsimpy
+
+def get_state_names(global_objects):
+    ''' The continuous states of the machine and of the regulators in use (see DSP()). '''
+    CTRL, ACM = global_objects[:2]
+    state_names = ['ACM.x[1]', 'ACM.x[3]', 'ACM.x[4]'] # omega_r_mech, iD, iQ
+    if ACM.Rreq > 0:
+        state_names += ['ACM.x[2]'] # KA of the induction machine
+    state_names += ['reg_speed.integrator', 'reg_speed.prevError']
+    if CTRL.bool_use_FOC_or_SFOC == True:
+        state_names += ['reg_id.integrator', 'reg_id.prevError', 'reg_iq.integrator', 'reg_iq.prevError']
+    else:
+        state_names += ['CTRL.Intergral_of_iT_error']
+    return state_names
+
+class Periodic_Steady_State:
+    ''' Result of solve_periodic_steady_state(). The orbit starts from snapshot (at time snapshot['time']). '''
+    def __init__(self, period, state_names, state, snapshot, residuals, number_of_periods):
+        self.period = period
+        self.state_names = state_names
+        self.state = state
+        self.snapshot = snapshot
+        self.residuals = residuals # per iteration
+        self.residual = residuals[-1]
+        self.number_of_iterations = len(residuals)
+        self.number_of_periods = number_of_periods # simulated in total (partly in parallel)
+        self.sim = None # with the waveforms of one period in sim.gdd, if numba__scope_dict was given
+
+def get_period(global_objects, number_of_electrical_periods=1):
+    ''' number_of_electrical_periods at the speed command (or at the present rotor speed without speed control),
+        rounded to a multiple of the speed control period. '''
+    CTRL, ACM = global_objects[:2]
+    if CTRL.bool_apply_speed_closed_loop_control == True:
+        omega_r_elec = abs(CTRL.cmd_rpm) / 60 * 2*np.pi * ACM.npp
+    else:
+        omega_r_elec = abs(ACM.x[1]) * ACM.npp
+    if omega_r_elec == 0.0:
+        raise Exception('The rotor is at standstill, give the period of the shooting method explicitly.')
+    return get_commensurate_period(CTRL, number_of_electrical_periods * 2*np.pi / omega_r_elec)
+
+def get_commensurate_period(CTRL, period):
+    VL_TS = CTRL.VL_TS
+    return max(1, int(round(period / VL_TS))) * VL_TS
+
+def get_period_map(global_objects, base, x, state_names, period):
+    ''' P(x): restore base, overwrite the states with x, simulate one period and return the states at its end. '''
+    t0 = acmsimpy.restore_snapshot(base, global_objects)
+    acmsimpy.set_fields(global_objects, dict(zip(state_names, x)))
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = global_objects
+    MACHINE_TS = CTRL.CL_TS / ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+    acmsimpy.ACMSimPyIncremental(t0=t0, TIME=period, ACM=ACM, CTRL=CTRL, reg_id=reg_id, reg_iq=reg_iq, reg_speed=reg_speed,
+                                 watch_channels=np.array([1], dtype=np.int64), watch_decimation=acmsimpy.get_step_index(period, MACHINE_TS), # (nothing is watched)
+                                 svgen1=svgen1)
+    return acmsimpy.get_fields(global_objects, state_names)
+
+def solve_periodic_steady_state(d, snapshot, period=None, number_of_electrical_periods=1, state_names=None, CTRL_execute_codes='', numba__scope_dict=None,
+                                max_iterations=20, tolerance=1e-6, relative_step=1e-6, max_workers=None, progress_callback=None):
+    ''' Iterate on the states of snapshot (see Simulation_Benchmark.get_snapshot()) until they repeat after one period [s]
+        (by default, number_of_electrical_periods at the speed of snapshot, see get_period()). The states are listed in state_names
+        (by default, see get_state_names()) like the fields of acmsimpy.set_fields(). The commands and the load stay at their
+        values in snapshot (the command timeline and user_system_input_code of d are not applied).
+        The iterations stop once the residual is below tolerance or stops decreasing even with the differenced Jacobian (e.g., if the
+        period is not commensurate with the orbit). progress_callback(iteration, residual) is called after each iteration. If numba__scope_dict is given, one period of
+        the orbit is simulated in the end and kept in the returned Periodic_Steady_State.sim. '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False)
+        global_objects = sim.clone_global_objects(snapshot)
+        state_names = get_state_names(global_objects) if state_names is None else list(state_names)
+        number_of_states = len(state_names)
+        list_of_global_objects = [global_objects] + [sim.clone_global_objects(snapshot) for _ in range(number_of_states)] # nominal, then one per state
+    if period is None:
+        period = get_period(list_of_global_objects[0], number_of_electrical_periods)
+    else:
+        period = get_commensurate_period(list_of_global_objects[0][0], period)
+
+    base = snapshot
+    x = acmsimpy.get_fields(list_of_global_objects[0], state_names)
+    get_period_map(list_of_global_objects[0], base, x, state_names, list_of_global_objects[0][0].CL_TS) # JIT compile
+    residuals = []
+    jacobian = -np.eye(number_of_states) # of F(x) = P(x) - x, with P' = 0 to begin with
+    x_previous = None
+    bool_finite_differences = bool_fresh_jacobian = False
+    number_of_stalls = number_of_periods = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for iteration in range(1, max_iterations+1):
+            if bool_finite_differences:
+                steps = relative_step * np.maximum(1.0, np.abs(x))
+                inputs = [x] + [x + steps[j] * np.eye(number_of_states)[j] for j in range(number_of_states)]
+                outputs = list(executor.map(lambda k: get_period_map(list_of_global_objects[k], base, inputs[k], state_names, period), range(1 + number_of_states)))
+            else:
+                outputs = [get_period_map(list_of_global_objects[0], base, x, state_names, period)]
+            number_of_periods += len(outputs)
+
+            residual = outputs[0] - x
+            residuals.append(np.max(np.abs(residual) / np.maximum(1.0, np.abs(x))))
+            base = acmsimpy.save_snapshot(list_of_global_objects[0], float(base['time']) + period) # the end of the nominal period
+            if progress_callback is not None:
+                progress_callback(iteration, residuals[-1])
+            if residuals[-1] < tolerance:
+                break
+            if residuals[-1] < min(residuals[:-1], default=np.inf):
+                x_best, number_of_stalls = x, 0
+            elif bool_fresh_jacobian:
+                break # not even the step with the differenced Jacobian decreases the residual
+            else:
+                number_of_stalls += 1
+                if number_of_stalls == 2: # the Broyden updates are going nowhere, difference the Jacobian at the best x instead
+                    x, x_previous, bool_finite_differences, number_of_stalls = x_best, None, True, 0
+                    continue
+
+            # quasi-Newton step on F(x) = P(x) - x
+            if bool_finite_differences:
+                jacobian = np.array([(outputs[1+j] - outputs[0]) / steps[j] for j in range(number_of_states)]).T - np.eye(number_of_states)
+                bool_finite_differences, bool_fresh_jacobian = False, True
+            else:
+                if x_previous is not None:
+                    dx, dF = x - x_previous, residual - residual_previous
+                    jacobian += np.outer(dF - jacobian @ dx, dx) / (dx @ dx) # Broyden's update
+                bool_fresh_jacobian = False
+            x_previous, residual_previous = x, residual
+            x = x - np.linalg.solve(jacobian, residual)
+
+    if residuals[-1] >= tolerance:
+        print(f'\tThe shooting method stopped at a residual of {residuals[-1]:g} after {len(residuals)} iterations (tolerance = {tolerance:g}).')
+    result = Periodic_Steady_State(period, state_names, outputs[0], base, residuals, number_of_periods)
+    if numba__scope_dict is not None:
+        d = dict(d, TIME_SLICE=period, NUMBER_OF_SLICES=1, COMMAND_TIMELINE=[], STEADY_STATE_TIME=0.0)
+        d.pop('user_system_input_code', None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result.sim = acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False)
+            result.sim.start_simulation_slices(d, numba__scope_dict, snapshot=base)
+    return result
+
+if __name__ == '__main__':
+    import time
+    from benchmark_ep8 import get_benchmark_dict, CTRL_execute_codes
+    from sweep import default_numba__scope_dict
+    d = get_benchmark_dict(MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=40)
+    # one electrical period at 600/11 rpm is 50 ms, i.e., 500 control periods (at 50 rpm, it is 545.45 control periods and the residual stalls at about 3e-3)
+    d.update({'init_Ld': 1e-3, 'init_Lq': 1e-3, 'CTRL.bool_use_FOC_or_SFOC': True, 'INVERTER_MODEL': 'average',
+              'user_system_input_code': 'if ii < 1: CTRL.cmd_idq[0] = 0.0; CTRL.cmd_rpm = 600/11',
+              'COMMAND_TIMELINE': [(0.0, 'ACM.TLoad', 2.0)], 'TIME_SLICE': 0.05, 'NUMBER_OF_SLICES': 1})
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False)
+        sim.start_simulation_slices(d, default_numba__scope_dict) # a short spin-up as the initial guess
+
+    snapshot = sim.get_snapshot()
+    tic = time.perf_counter()
+    result = solve_periodic_steady_state(d, snapshot, CTRL_execute_codes=CTRL_execute_codes, numba__scope_dict=default_numba__scope_dict,
+                                         progress_callback=lambda iteration, residual: print(f'\titeration {iteration}: residual = {residual:.2e}'))
+    print(f'Periodic steady state in {time.perf_counter()-tic:.1f} s, JIT compilation included ({result.number_of_periods} periods of {result.period*1e3:.1f} ms simulated)')
+    for name, value in zip(result.state_names, result.state):
+        print(f'\t{name:>20} = {value:g}')
+    print(f'\tspeed ripple = {np.ptp(result.sim.gdd["CTRL.omega_r_mech"]):g} rpm, iQ ripple = {np.ptp(result.sim.gdd["ACM.iQ"]):g} A')
+
+    # brute force: simulate period after period from the same spin-up until the states repeat as closely
+    tic = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        global_objects = sim.clone_global_objects(snapshot)
+    base = snapshot
+    x = acmsimpy.get_fields(global_objects, result.state_names)
+    for number_of_periods in range(1, 201):
+        x_next = get_period_map(global_objects, base, x, result.state_names, result.period)
+        base = acmsimpy.save_snapshot(global_objects, float(base['time']) + result.period)
+        residual, x = np.max(np.abs(x_next - x) / np.maximum(1.0, np.abs(x))), x_next
+        if residual < 1e-6:
+            break
+    print(f'Brute force in {time.perf_counter()-tic:.1f} s ({number_of_periods} periods simulated, residual = {residual:.2e})')
+    print(f'Simulated time: {result.number_of_periods*result.period*1e3:.0f} ms by shooting, {number_of_periods*result.period*1e3:.0f} ms by brute force')
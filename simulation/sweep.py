@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+''' Headless parameter sweep on top of Simulation_Benchmark (tutorials_ep8_SFOC_Dynamic.py)
+
+    Each task is the base user input dict d updated with one dict of overrides. The tasks are
+    fanned out to a pool of processes, and every worker writes its waveforms directly into one
+    shared-memory array of shape (number_of_tasks, number_of_traces, number_of_samples).
+
+    Example:
+        overrides = get_grid({'VL_SERIES_KP': [0.5, 1.0, 2.0], 'VL_SERIES_KI': [10, 20, 40]})
+        with run_sweep(d, overrides, max_workers=4, progress_callback=print) as result:
+            speed = result['CTRL.omega_r_mech'] # shape = (9, number_of_samples)
+            print(result.errors) # {task_index: traceback} for the tasks that failed
+
+    What-if branches start from one snapshot instead of t = 0, so the spin-up transient is simulated once:
+        sim = acmsimpy.Simulation_Benchmark(d, bool_start_simulation=False); sim.start_simulation_slices(d, numba__scope_dict)
+        with run_branches(d, sim.get_snapshot(), [{'ACM.TLoad': 2.0}, {'reg_speed.Kp': 0.8}, {'ACM.R': 0.07}]) as result:
+            speed = result['CTRL.omega_r_mech'] # from sim.end_time on
+'''
+import os, io, sys, itertools, threading, contextlib, traceback
+from collections import OrderedDict as OD
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import numpy as np
+import tutorials_ep8_SFOC_Dynamic as acmsimpy
+
+default_numba__scope_dict = OD([
+    # Y Labels                        Signal Name of Traces
+    (r'Speed [rpm]',                  ( 'CTRL.cmd_rpm', 'CTRL.omega_r_mech'                 ,) ),
+    (r'$q$-axis current [A]',         ( 'ACM.iQ', 'CTRL.cmd_idq[1]'                         ,) ),
+    (r'$d$-axis current [A]',         ( 'ACM.iD', 'CTRL.cmd_idq[0]'                         ,) ),
+])
+
+def get_grid(dict_of_lists):
+    ''' Cartesian product of the listed values, e.g., {'a': [1, 2], 'b': [3, 4]} -> [{'a': 1, 'b': 3}, {'a': 1, 'b': 4}, ...] '''
+    keys = list(dict_of_lists.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*dict_of_lists.values())]
+
+def get_trace_names(numba__scope_dict):
+    # the same order as the global_trace_names of Simulation_Benchmark.start_simulation_slices()
+    return [name for trace_names in numba__scope_dict.values() for name in trace_names]
+
+class Sweep_Result:
+    ''' Waveforms of a sweep in shared memory. Call close() (or use a with-statement) to release the memory. '''
+    def __init__(self, shm, shape, trace_names, overrides):
+        self.shm = shm
+        self.data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf) # (task, trace, sample), NaN after the end of a shorter task
+        self.trace_names = trace_names
+        self.overrides = overrides
+        self.machine_times = [None] * len(overrides)
+        self.lengths = np.zeros(len(overrides), dtype=np.int64)
+        self.errors = dict() # task index -> traceback string
+
+    def __getitem__(self, trace_name):
+        return self.data[:, self.trace_names.index(trace_name), :]
+
+    def close(self):
+        self.data = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *arg):
+        self.close()
+
+############################################# WORKER
+_workers = dict() # per run (keyed by the name of its shared memory): the result array and the snapshot of the tasks in this process
+
+class _Main_Thread_Stdout:
+    ''' Drop the prints of the worker threads, which redirect_stdout() cannot do per thread. '''
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        if threading.current_thread() is threading.main_thread():
+            return self.stdout.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stdout.flush()
+
+def _init_worker(shm_name, shape, base_d, numba__scope_dict, CTRL_execute_codes, snapshot=None):
+    ''' Attach to the shared result array and JIT compile once per worker, before the first task arrives. '''
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _workers[shm_name] = {'shm': shm, 'data': np.ndarray(shape, dtype=np.float64, buffer=shm.buf),
+                          'snapshot': snapshot} # sent once per worker rather than with every task
+    _warm_up(base_d, numba__scope_dict, CTRL_execute_codes)
+
+def _warm_up(base_d, numba__scope_dict, CTRL_execute_codes):
+    # a short run, the compiled kernels are reused by all tasks of this worker
+    # (jitclass arguments cannot be cached on disk by numba, so each process compiles once)
+    d = dict(base_d)
+    d['NUMBER_OF_SLICES'] = 1
+    d['TIME_SLICE'] = 10*d['CL_TS']
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False).start_simulation_slices(d, numba__scope_dict)
+    except Exception:
+        pass # a broken base configuration is reported by the tasks
+
+def _run_task(run_id, task_index, d, numba__scope_dict, CTRL_execute_codes, fields=None):
+    try:
+        worker = _workers[run_id]
+        # (in a worker thread, sys.stdout is a _Main_Thread_Stdout already)
+        with contextlib.redirect_stdout(io.StringIO()) if threading.current_thread() is threading.main_thread() else contextlib.nullcontext():
+            sim = acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False)
+            sim.start_simulation_slices(d, numba__scope_dict, snapshot=worker['snapshot'], fields=fields)
+        data = worker['data']
+        number_of_samples = min(len(sim.global_machine_times), data.shape[2])
+        for trace_index, name in enumerate(get_trace_names(numba__scope_dict)):
+            data[task_index, trace_index, :number_of_samples] = sim.gdd[name][:number_of_samples]
+        return task_index, sim.global_machine_times[:number_of_samples], None
+    except Exception:
+        return task_index, None, traceback.format_exc()
+
+############################################# API
+def run_sweep(base_d, overrides, numba__scope_dict=None, CTRL_execute_codes='', max_workers=None, progress_callback=None):
+    ''' Simulate base_d updated with each dict of overrides in a pool of max_workers processes.
+        progress_callback(number_of_done_tasks, number_of_tasks) is called in this process as tasks complete.
+        A task that raises does not stop the sweep; its traceback is stored in the returned Sweep_Result.errors. '''
+    list_of_d = [dict(base_d, **override) for override in overrides]
+    return _run_tasks(base_d, list_of_d, [None]*len(overrides), overrides, numba__scope_dict, CTRL_execute_codes, max_workers, progress_callback)
+
+def run_branches(base_d, snapshot, overrides, numba__scope_dict=None, CTRL_execute_codes='', max_workers=None, bool_use_threads=True, progress_callback=None):
+    ''' Branch one future per dict of overrides from snapshot (see Simulation_Benchmark.get_snapshot()), each simulating
+        NUMBER_OF_SLICES*TIME_SLICE of base_d from the snapshot time. An override of an object field (e.g., 'ACM.TLoad',
+        'reg_speed.Kp', 'ACM.R', 'CTRL.cmd_idq[0]') is written after the snapshot is restored, any other key updates the
+        user input dict (e.g., 'COMMAND_TIMELINE' for a later load step, or 'TIME_SLICE').
+        The branches run in threads (the kernels release the GIL) or, if not bool_use_threads, in processes. '''
+    list_of_d, list_of_fields = [], []
+    for override in overrides:
+        fields = {key: value for key, value in override.items() if key.split('.')[0] in acmsimpy.SNAPSHOT_OBJECT_NAMES}
+        list_of_d.append(dict(base_d, **{key: value for key, value in override.items() if key not in fields}))
+        list_of_fields.append(fields)
+    return _run_tasks(base_d, list_of_d, list_of_fields, overrides, numba__scope_dict, CTRL_execute_codes, max_workers, progress_callback,
+                      snapshot=snapshot, bool_use_threads=bool_use_threads)
+
+def _run_tasks(base_d, list_of_d, list_of_fields, overrides, numba__scope_dict, CTRL_execute_codes, max_workers, progress_callback, snapshot=None, bool_use_threads=False):
+    if numba__scope_dict is None:
+        numba__scope_dict = default_numba__scope_dict
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    trace_names = get_trace_names(numba__scope_dict)
+    acmsimpy.get_watch_channels(numba__scope_dict) # raise here rather than in every worker
+
+    # the result array is sized by the longest task
+    start_time = float(snapshot['time']) if snapshot is not None else 0.0
+    number_of_samples = max([acmsimpy.get_number_of_watch_samples_of_slices(d, start_time) for d in list_of_d], default=0)
+    shape = (len(list_of_d), len(trace_names), number_of_samples)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))*8))
+    result = Sweep_Result(shm, shape, trace_names, overrides)
+    run_id = shm.name
+    try:
+        result.data[:] = np.nan
+
+        if bool_use_threads:
+            _workers[run_id] = {'data': result.data, 'snapshot': snapshot}
+            with contextlib.redirect_stdout(io.StringIO()):
+                _warm_up(base_d, numba__scope_dict, CTRL_execute_codes)
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            stdout = _Main_Thread_Stdout(sys.stdout)
+        else:
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                           initargs=(shm.name, shape, base_d, numba__scope_dict, CTRL_execute_codes, snapshot))
+            stdout = sys.stdout
+
+        number_of_done_tasks = 0
+        with executor, contextlib.redirect_stdout(stdout):
+            # bounded number of tasks in flight, so that a large sweep does not queue all its inputs at once
+            pending = dict()
+            tasks = iter(enumerate(zip(list_of_d, list_of_fields)))
+            while True:
+                for task_index, (d, fields) in itertools.islice(tasks, 2*max_workers - len(pending)):
+                    pending[executor.submit(_run_task, run_id, task_index, d, numba__scope_dict, CTRL_execute_codes, fields)] = task_index
+                if len(pending) == 0:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_index = pending.pop(future)
+                    try:
+                        _, machine_times, error = future.result()
+                    except Exception: # e.g., the worker process died
+                        machine_times, error = None, traceback.format_exc()
+                    if error is None:
+                        result.machine_times[task_index] = machine_times
+                        result.lengths[task_index] = len(machine_times)
+                    else:
+                        result.errors[task_index] = error
+                    number_of_done_tasks += 1
+                    if progress_callback is not None:
+                        progress_callback(number_of_done_tasks, len(list_of_d))
+    except BaseException: # e.g., progress_callback raised or Ctrl-C: the result is not returned, so release its shared memory here
+        result.close()
+        raise
+    finally:
+        _workers.pop(run_id, None) # the process workers drop theirs with the pool
+    return result
+
+if __name__ == '__main__':
+    import time
+    from benchmark_ep8 import get_benchmark_dict
+    CTRL_execute_codes = 'CTRL.kPFL = 0\nCTRL.kPCL = 300\nCTRL.cmd_psi_Ms = 0.0125' # the speed regulator gains are swept
+    d = get_benchmark_dict(MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=1)
+    d.update({'CL_SERIES_KP': 0.2, 'CL_SERIES_KI': 900.0, 'VL_SERIES_KP': 5.0, 'VL_SERIES_KI': 20.0, 'TIME_SLICE': 0.1, 'NUMBER_OF_SLICES': 2})
+    overrides = get_grid({'VL_SERIES_KP': [0.05, 0.1, 0.2], 'VL_SERIES_KI': [10.0, 20.0]}) + [{'user_system_input_code': 'CTRL.no_such_field = 0'}] # the last one fails
+    tic = time.perf_counter()
+    with run_sweep(d, overrides, CTRL_execute_codes=CTRL_execute_codes, progress_callback=lambda done, total: print(f'\t{done}/{total}')) as result:
+        print(f'{len(overrides)} tasks in {time.perf_counter()-tic:.1f} s, {result.data.shape=}, failed tasks: {list(result.errors.keys())}')
+        print('speed at 10 ms [rpm]:', result['CTRL.omega_r_mech'][:, 100])
+
+    # what-if branches from the state at 0.2 s: a load step, a gain change and a doubled stator resistance (a fault)
+    d.update({'VL_SERIES_KP': 0.1, 'VL_SERIES_KI': 20.0})
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = acmsimpy.Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes, bool_start_simulation=False)
+        sim.start_simulation_slices(d, default_numba__scope_dict)
+    overrides = [{}, {'ACM.TLoad': 2.0}, {'reg_speed.Kp': 0.2}, {'ACM.R': 2*d['init_R']}]
+    tic = time.perf_counter()
+    with run_branches(d, sim.get_snapshot(), overrides, CTRL_execute_codes=CTRL_execute_codes) as result:
+        print(f'{len(overrides)} branches from {sim.end_time} s in {time.perf_counter()-tic:.1f} s, failed branches: {list(result.errors.keys())}')
+        print('speed at the end [rpm]:', result['CTRL.omega_r_mech'][:, -1])
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
-from pylab import np, plt, mpl
-import control
+import numpy as np # control (which imports matplotlib) is imported when a regulator is first designed
 
 def get_coeffs_dc_motor_current_regulator(R, L, Bandwidth_Hz):
     Kp = Bandwidth_Hz * 2 * np.pi * L
@@ -33,6 +32,7 @@ def 上位机速度PI系数转换CODE(上位机速度KP, 上位机速度KI, VL_T
 
 # current reference to current measurement
 def c2c_design(R, L, CLBW_Hz=1000, CL_TS=1/20e3):
+    import control
     currentKp, currentKi = get_coeffs_dc_motor_current_regulator(R, L, CLBW_Hz)
     currentKiCode = currentKi * currentKp * CL_TS
     if True:
@@ -67,6 +67,7 @@ def c2c_design(R, L, CLBW_Hz=1000, CL_TS=1/20e3):
 
 # current reference to velocity measaurement (this is not velocity open loop, because speed PI is not considered)
 def c2v_design(R, L, n_pp, J_s, KA, B=0, CLBW_Hz=1000, CL_TS=1/20e3, fignum=5):
+    import control
 
     currentKp, currentKi = get_coeffs_dc_motor_current_regulator(R, L, CLBW_Hz)
     currentKiCode = currentKi * currentKp * CL_TS
@@ -108,6 +109,7 @@ def c2v_design(R, L, n_pp, J_s, KA, B=0, CLBW_Hz=1000, CL_TS=1/20e3, fignum=5):
 
 # velocity reference to velocity measaurement
 def iterate_for_desired_bandwidth( delta, desired_VLBW_Hz, motor_dict, CLBW_Hz_initial=1000, CLBW_Hz_stepSize=100):
+    import control
 
     R          = motor_dict['Rs']
     L          = motor_dict['Ls']
@@ -1,9 +1,9 @@
 # %%
 ############################################# PACKAGES
 from numba.experimental import jitclass
-from numba import njit, int32, float64
-from pylab import np, plt, mpl
-plt.style.use('ggplot')
+from numba import njit, int32, int64, float64
+import numpy as np # matplotlib is imported by the plotting code only, so that batch workers start quickly
+import ast, re, time, threading
 
 ############################################# CLASS DEFINITION 
 @jitclass(
@@ -99,6 +99,13 @@ plt.style.use('ggplot')
             ('ell4', float64),
             #
             ('one_over_six', float64),
+            # RK4 workspace (incrementals at 4 stages, state x for stage 2/3/4, state derivative)
+            ('k1', float64[:]),
+            ('k2', float64[:]),
+            ('k3', float64[:]),
+            ('k4', float64[:]),
+            ('xk', float64[:]),
+            ('fx', float64[:]),
     ])
 class The_Motor_Controller:
     def __init__(self, CL_TS, VL_TS,
@@ -219,6 +226,21 @@ class The_Motor_Controller:
 
         self.one_over_six = 1.0 / 6.0
 
+        # RK4 workspace
+        self.k1 = np.zeros(self.NS, dtype=np.float64)
+        self.k2 = np.zeros(self.NS, dtype=np.float64)
+        self.k3 = np.zeros(self.NS, dtype=np.float64)
+        self.k4 = np.zeros(self.NS, dtype=np.float64)
+        self.xk = np.zeros(self.NS, dtype=np.float64)
+        self.fx = np.zeros(self.NS, dtype=np.float64)
+
+# machine integrators (how ACMSimPyIncremental advances ACM.x between two visited machine steps)
+INTEGRATOR_RK4    = 0 # one fixed step of RK4_MACHINE
+INTEGRATOR_DOPRI5 = 1 # as many error-controlled steps of DOPRI5_MACHINE as ACM.rtol and ACM.atol require
+INTEGRATOR_ROS2   = 2 # one step of the L-stable Rosenbrock method ROS2_MACHINE (for stiff machines and long steps)
+INTEGRATOR_ZOH    = 3 # one exact zero-order-hold step of ZOH_MACHINE for the currents of a PMSM
+_INTEGRATORS = {'rk4': INTEGRATOR_RK4, 'dopri5': INTEGRATOR_DOPRI5, 'ros2': INTEGRATOR_ROS2, 'zoh': INTEGRATOR_ZOH}
+
 @jitclass(
     spec=[
         # name plate data
@@ -261,7 +283,36 @@ class The_Motor_Controller:
         ('sinT', float64),
         # simulation settings
         ('MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD', int32),
-        ('bool_apply_load_model', int32)
+        ('bool_apply_load_model', int32),
+        # RK4 workspace (incrementals at 4 stages, state x for stage 2/3/4, state derivative)
+        ('k1', float64[:]),
+        ('k2', float64[:]),
+        ('k3', float64[:]),
+        ('k4', float64[:]),
+        ('xk', float64[:]),
+        ('fx', float64[:]),
+        # adaptive step integrator (tolerances, proposed step size and step statistics, stage derivatives and 5th order solution)
+        ('integrator', int32),
+        ('rtol', float64),
+        ('atol', float64),
+        ('h_adaptive', float64),
+        ('number_of_accepted_steps', int64),
+        ('number_of_rejected_steps', int64),
+        ('stages', float64[:,:]),
+        ('x5', float64[:]),
+        # Rosenbrock integrator workspace (Jacobian, overwritten by the LU factors of I - gamma*h*J, and the row pivots)
+        ('jacobian', float64[:,:]),
+        ('pivots', int64[:]),
+        # zero-order-hold integrator (cached exp(A*hs) and its integral, and the speed, step size and parameters they were computed for)
+        ('zoh_tolerance', float64),
+        ('zoh_Phi', float64[:,:]),
+        ('zoh_Gamma', float64[:,:]),
+        ('zoh_omega', float64),
+        ('zoh_hs', float64),
+        ('zoh_R', float64),
+        ('zoh_Ld', float64),
+        ('zoh_Lq', float64),
+        ('number_of_zoh_updates', int64),
     ])
 class The_AC_Machine:
     def __init__(self, CTRL, MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=1):
@@ -308,6 +359,35 @@ class The_AC_Machine:
         self.sinT = 0.0
         self.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD = MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
         self.bool_apply_load_model = False
+        # RK4 workspace
+        self.k1 = np.zeros(self.NS, dtype=np.float64)
+        self.k2 = np.zeros(self.NS, dtype=np.float64)
+        self.k3 = np.zeros(self.NS, dtype=np.float64)
+        self.k4 = np.zeros(self.NS, dtype=np.float64)
+        self.xk = np.zeros(self.NS, dtype=np.float64)
+        self.fx = np.zeros(self.NS, dtype=np.float64)
+        # adaptive step integrator
+        self.integrator = INTEGRATOR_RK4
+        self.rtol = 1e-6
+        self.atol = 1e-6
+        self.h_adaptive = 0.0 # 0 means the first step tries the whole interval
+        self.number_of_accepted_steps = 0
+        self.number_of_rejected_steps = 0
+        self.stages = np.zeros((7, self.NS), dtype=np.float64)
+        self.x5 = np.zeros(self.NS, dtype=np.float64)
+        # Rosenbrock integrator workspace
+        self.jacobian = np.zeros((self.NS, self.NS), dtype=np.float64)
+        self.pivots = np.zeros(self.NS, dtype=np.int64)
+        # zero-order-hold integrator
+        self.zoh_tolerance = 1e-3 # [rad/s] drift of the electrical speed before exp(A*hs) is recomputed
+        self.zoh_Phi = np.zeros((2, 2), dtype=np.float64)
+        self.zoh_Gamma = np.zeros((2, 2), dtype=np.float64)
+        self.zoh_omega = 0.0
+        self.zoh_hs = 0.0 # 0 means not computed yet
+        self.zoh_R = 0.0
+        self.zoh_Ld = 0.0
+        self.zoh_Lq = 0.0
+        self.number_of_zoh_updates = 0
 
 @jitclass(
     spec=[
@@ -383,6 +463,12 @@ class The_PID_Regulator:
         self.setpoint = 0.0
         self.measurement = 0.0;
 
+# inverter models (how the gate signals of SVgen_Object are turned into the terminal voltages)
+INVERTER_MODEL_TICK  = 0 # tick the carrier counter once per machine step (gate_signal_generator)
+INVERTER_MODEL_EVENT = 1 # compute the switching instants analytically and integrate the machine across each constant-voltage interval (gate_signal_generator_event_driven)
+INVERTER_MODEL_AVERAGE = 2 # apply the per-period average of the terminal voltages (average_inverter), one machine step per control period
+_INVERTER_MODELS = {'tick': INVERTER_MODEL_TICK, 'event': INVERTER_MODEL_EVENT, 'average': INVERTER_MODEL_AVERAGE}
+
 @jitclass(
     spec=[
         ('Ualfa', float64),
@@ -416,9 +502,16 @@ class The_PID_Regulator:
         ('line_to_line_voltage_AC', float64),
         ('line_to_line_voltage_BC', float64),
         ('line_to_line_voltage_AB', float64),
+        # PWM timing and dc bus (long-lived, so the carrier state is continuous across simulation slices)
+        ('CPU_TICK_PER_SAMPLING_PERIOD', int64),
+        ('DEAD_TIME_AS_COUNT', int64),
+        ('DEAD_TIME_PER_SAMPLING_PERIOD', float64),
+        ('Vdc', float64),
+        ('one_over_Vdc', float64),
+        ('inverter_model', int64),
     ])
 class SVgen_Object:
-    def __init__(self, CPU_TICK_PER_SAMPLING_PERIOD):
+    def __init__(self, CPU_TICK_PER_SAMPLING_PERIOD, Vdc=48.0, inverter_model=INVERTER_MODEL_TICK):
         self.Ualfa = 0.0
         self.Ubeta = 0.0
         self.Unot = 0.0
@@ -447,10 +540,81 @@ class SVgen_Object:
         self.line_to_line_voltage_BC = 0.0
         self.line_to_line_voltage_AB = 0.0
 
+        self.CPU_TICK_PER_SAMPLING_PERIOD = CPU_TICK_PER_SAMPLING_PERIOD
+        self.DEAD_TIME_PER_SAMPLING_PERIOD = 200*0.5e-4 # dead time as a fraction of the sampling period
+        self.DEAD_TIME_AS_COUNT = int(self.DEAD_TIME_PER_SAMPLING_PERIOD*CPU_TICK_PER_SAMPLING_PERIOD) # 200 count for 0--5000--0 counting sequence
+        self.Vdc = Vdc # Vdc is assumed measured and known
+        self.one_over_Vdc = 1/Vdc
+        self.inverter_model = inverter_model
+
+@jitclass(
+    spec=[
+        # events sorted by time (see get_command_timeline())
+        ('times', float64[:]),
+        ('targets', int64[:]),
+        ('values', float64[:]),
+        ('ramps', float64[:]), # ramp duration [s], 0 for a step
+        # progress (long-lived, so that the timeline continues across simulation slices)
+        ('pointer', int64), # next event to apply
+        ('start_values', float64[:]),
+        ('bool_ramping', int64[:]),
+        ('number_of_ramps_in_progress', int64),
+    ])
+class The_Command_Timeline:
+    def __init__(self, times, targets, values, ramps):
+        self.times = times
+        self.targets = targets
+        self.values = values
+        self.ramps = ramps
+        self.pointer = 0
+        self.start_values = np.zeros(len(times), dtype=np.float64)
+        self.bool_ramping = np.zeros(len(times), dtype=np.int64)
+        self.number_of_ramps_in_progress = 0
+
+@jitclass(
+    spec=[
+        # settings (see get_steady_state_detector())
+        ('settle_time', float64), # [s], the detector is disabled if settle_time <= 0
+        ('window', float64), # [s], the signals are averaged over blocks of this duration (e.g., a ripple period) before the band test
+        ('tolerance', float64[:]), # peak-to-peak band of [speed (rpm), iD, iQ, Tem]
+        ('bool_stop', int64), # stop ACMSimPyIncremental once the steady state is detected
+        # present block
+        ('block_start_time', float64),
+        ('block_sum', float64[:]),
+        ('block_count', int64),
+        # band of the block means since window_start_time, restarted when a signal leaves it
+        ('window_start_time', float64),
+        ('minimum', float64[:]),
+        ('maximum', float64[:]),
+        ('sum', float64[:]),
+        ('count', int64),
+        # result
+        ('bool_steady', int64),
+        ('steady_time', float64), # time of detection [s]
+        ('values', float64[:]), # mean of [speed (rpm), iD, iQ, Tem] over the settled window
+    ])
+class The_Steady_State_Detector:
+    def __init__(self, settle_time, window, tolerance, bool_stop):
+        self.settle_time = settle_time
+        self.window = window
+        self.tolerance = tolerance
+        self.bool_stop = bool_stop
+        self.block_start_time = 0.0
+        self.block_sum = np.zeros(4, dtype=np.float64)
+        self.block_count = 0
+        self.window_start_time = 0.0
+        self.minimum = np.zeros(4, dtype=np.float64)
+        self.maximum = np.zeros(4, dtype=np.float64)
+        self.sum = np.zeros(4, dtype=np.float64)
+        self.count = 0
+        self.bool_steady = False
+        self.steady_time = 0.0
+        self.values = np.zeros(4, dtype=np.float64)
+
 ############################################# OBSERVERS SECTION
 @njit(nogil=True)
-def DYNAMICS_SpeedObserver(x, CTRL):
-    fx = np.zeros(6)
+def DYNAMICS_SpeedObserver(x, CTRL, fx):
+    # fx is the derivative buffer to write into (see RK4_ObserverSolver_CJH_Style)
 
     # [rad]
     # output_error = np.sin(CTRL.theta_d - x[0])
@@ -465,43 +629,42 @@ def DYNAMICS_SpeedObserver(x, CTRL):
     fx[1] = CTRL.ell2*output_error + (CTRL.Tem + x[2]) * CTRL.npp/CTRL.Js # elec. angular rotor speed
     fx[2] = CTRL.ell3*output_error + x[3]
     fx[3] = CTRL.ell4*output_error + 0.0
-    return fx
 
 @njit(nogil=True)
 def RK4_ObserverSolver_CJH_Style(THE_DYNAMICS, x, hs, CTRL):
     NS = CTRL.NS # THIS SHOULD BE A CONSTANT THROUGHOUT THE CODES!!!
-    k1, k2, k3, k4 = np.zeros(NS), np.zeros(NS), np.zeros(NS), np.zeros(NS) # incrementals at 4 stages
-    xk, fx = np.zeros(NS), np.zeros(NS) # state x for stage 2/3/4, state derivative
+    k1, k2, k3, k4 = CTRL.k1, CTRL.k2, CTRL.k3, CTRL.k4 # incrementals at 4 stages (workspace owned by CTRL, no allocation)
+    xk, fx = CTRL.xk, CTRL.fx # state x for stage 2/3/4, state derivative
 
     CTRL.uab[0] = CTRL.cmd_uab[0]
     CTRL.uab[1] = CTRL.cmd_uab[1]
     CTRL.iab[0] = CTRL.iab_prev[0]
     CTRL.iab[1] = CTRL.iab_prev[1]
-    fx = THE_DYNAMICS(x, CTRL)
+    THE_DYNAMICS(x, CTRL, fx)
     for i in range(0, NS):
         k1[i] = fx[i] * hs
         xk[i] = x[i] + k1[i]*0.5
 
     CTRL.iab[0] = 0.5*(CTRL.iab_prev[0]+CTRL.iab_curr[0])
     CTRL.iab[1] = 0.5*(CTRL.iab_prev[1]+CTRL.iab_curr[1])
-    fx = THE_DYNAMICS(xk, CTRL)
+    THE_DYNAMICS(xk, CTRL, fx)
     for i in range(0, NS):
         k2[i] = fx[i] * hs
         xk[i] = x[i] + k2[i]*0.5
 
-    fx = THE_DYNAMICS(xk, CTRL)
+    THE_DYNAMICS(xk, CTRL, fx)
     for i in range(0, NS):
         k3[i] = fx[i] * hs
         xk[i] = x[i] + k3[i]
 
     CTRL.iab[0] = CTRL.iab_curr[0]
     CTRL.iab[1] = CTRL.iab_curr[1]
-    fx = THE_DYNAMICS(xk, CTRL)
+    THE_DYNAMICS(xk, CTRL, fx)
     for i in range(0, NS):
         k4[i] = fx[i] * hs
         x[i] = x[i] + (k1[i] + 2*(k2[i] + k3[i]) + k4[i]) * CTRL.one_over_six
 
-@njit(nogil=True)
+@njit(nogil=True, cache=True) # (no jitclass arguments, so it can be cached on disk)
 def angle_diff(a,b):
     # ''' a and b must be within [0, 2*np.pi]'''
     _, a = divmod(a, 2*np.pi)
@@ -518,8 +681,9 @@ def angle_diff(a,b):
 
 ############################################# MACHINE SIMULATION SECTION
 @njit(nogil=True)
-def DYNAMICS_MACHINE(t, x, ACM, CLARKE_TRANS_TORQUE_GAIN=1.5):
-    fx = np.zeros(ACM.NS) # s x = f(x)
+def DYNAMICS_MACHINE(t, x, ACM, fx, CLARKE_TRANS_TORQUE_GAIN=1.5, bool_hold_uab=False):
+    # s x = f(x) is written into the derivative buffer fx (see RK4_MACHINE)
+    # bool_hold_uab: the inverter holds ACM.uab (not ACM.udq) during the step, so udq follows the rotor position x[0]
 
     # theta_d_mech = x[0]
     # omega_r_mech = x[1]
@@ -534,6 +698,12 @@ def DYNAMICS_MACHINE(t, x, ACM, CLARKE_TRANS_TORQUE_GAIN=1.5):
         ACM.omega_slip = ACM.Rreq * iQ / KA
     ACM.omega_syn  = x[1]*ACM.npp + ACM.omega_slip
 
+    if bool_hold_uab:
+        cosT = np.cos(x[0]*ACM.npp)
+        sinT = np.sin(x[0]*ACM.npp)
+        ACM.udq[0] = ACM.uab[0] *  cosT + ACM.uab[1] * sinT
+        ACM.udq[1] = ACM.uab[0] * -sinT + ACM.uab[1] * cosT
+
     # 电磁子系统 (KA, iD, iQ as x[2], x[3], x[4])
     if ACM.Rreq > 0:
         # s KA
@@ -559,53 +729,309 @@ def DYNAMICS_MACHINE(t, x, ACM, CLARKE_TRANS_TORQUE_GAIN=1.5):
     fx[0] = x[1] + ACM.omega_slip / ACM.npp # mech. angular rotor position (accumulated)
     fx[1] = (ACM.Tem - ACM.TLoad) / ACM.Js  # mech. angular rotor speed
 
-    return fx
-
 @njit(nogil=True)
-def RK4_MACHINE(t, ACM, hs): # 四阶龙格库塔法
+def RK4_MACHINE(t, ACM, hs, bool_hold_uab=False): # 四阶龙格库塔法
     NS = ACM.NS
-    k1, k2, k3, k4 = np.zeros(NS), np.zeros(NS), np.zeros(NS), np.zeros(NS) # incrementals at 4 stages
-    xk, fx = np.zeros(NS), np.zeros(NS) # state x for stage 2/3/4, state derivative
+    k1, k2, k3, k4 = ACM.k1, ACM.k2, ACM.k3, ACM.k4 # incrementals at 4 stages (workspace owned by ACM, no allocation)
+    xk, fx = ACM.xk, ACM.fx # state x for stage 2/3/4, state derivative
 
     if False:
         """ this is about twice slower than loop through the element one by one """ 
-        fx = DYNAMICS_MACHINE(t, ACM.x, ACM) # @t
-        k1 = fx * hs
-        xk = ACM.x + k1*0.5
+        DYNAMICS_MACHINE(t, ACM.x, ACM, fx) # @t
+        k1[:] = fx * hs
+        xk[:] = ACM.x + k1*0.5
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs/2
-        k2 = fx * hs
-        xk = ACM.x + k2*0.5
+        DYNAMICS_MACHINE(t, xk, ACM, fx)  # @t+hs/2
+        k2[:] = fx * hs
+        xk[:] = ACM.x + k2*0.5
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs/2
-        k3 = fx * hs
-        xk = ACM.x + k3
+        DYNAMICS_MACHINE(t, xk, ACM, fx)  # @t+hs/2
+        k3[:] = fx * hs
+        xk[:] = ACM.x + k3
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs
-        k4 = fx * hs
-        ACM.x = ACM.x + (k1 + 2*(k2 + k3) + k4)/6.0
+        DYNAMICS_MACHINE(t, xk, ACM, fx)  # @t+hs
+        k4[:] = fx * hs
+        ACM.x[:] = ACM.x + (k1 + 2*(k2 + k3) + k4)/6.0
     else:
-        fx = DYNAMICS_MACHINE(t, ACM.x, ACM) # @t
+        DYNAMICS_MACHINE(t, ACM.x, ACM, fx, bool_hold_uab=bool_hold_uab) # @t
         for i in range(NS):
             k1[i] = fx[i] * hs
             xk[i] = ACM.x[i] + k1[i]*0.5
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs/2
+        DYNAMICS_MACHINE(t, xk, ACM, fx, bool_hold_uab=bool_hold_uab)  # @t+hs/2
         for i in range(NS):
             k2[i] = fx[i] * hs
             xk[i] = ACM.x[i] + k2[i]*0.5
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs/2
+        DYNAMICS_MACHINE(t, xk, ACM, fx, bool_hold_uab=bool_hold_uab)  # @t+hs/2
         for i in range(NS):
             k3[i] = fx[i] * hs
             xk[i] = ACM.x[i] + k3[i]
 
-        fx = DYNAMICS_MACHINE(t, xk, ACM)  # @t+hs
+        DYNAMICS_MACHINE(t, xk, ACM, fx, bool_hold_uab=bool_hold_uab)  # @t+hs
         for i in range(NS):
             k4[i] = fx[i] * hs
             # ACM.x_dot[i] = (k1[i] + 2*(k2[i] + k3[i]) + k4[i])/6.0 / hs # derivatives
             ACM.x[i] = ACM.x[i] + (k1[i] + 2*(k2[i] + k3[i]) + k4[i])/6.0
 
+@njit(nogil=True)
+def DOPRI5_MACHINE(t, ACM, H, bool_hold_uab=False): # Dormand-Prince 5(4)
+    # Integrate from t to t+H with as many steps as ACM.rtol and ACM.atol require.
+    # The last step is shortened to land on t+H exactly, which is the next controller interrupt, PWM edge or watch sample,
+    # and the step size proposed by the error control is kept in ACM.h_adaptive for the next call.
+    NS = ACM.NS
+    K, x, xk, x5, fx = ACM.stages, ACM.x, ACM.xk, ACM.x5, ACM.fx
+
+    DYNAMICS_MACHINE(t, x, ACM, fx, bool_hold_uab=bool_hold_uab)
+    for i in range(NS):
+        K[0,i] = fx[i]
+
+    h = ACM.h_adaptive if ACM.h_adaptive > 0 else H
+    tau = 0.0
+    while tau < H:
+        bool_clipped = tau + 1.01*h >= H # avoid leaving a sliver for the next step
+        hs = H - tau if bool_clipped else h
+
+        for i in range(NS):
+            xk[i] = x[i] + hs*(0.2*K[0,i])
+        DYNAMICS_MACHINE(t+tau+0.2*hs, xk, ACM, fx, bool_hold_uab=bool_hold_uab)
+        for i in range(NS):
+            K[1,i] = fx[i]
+            xk[i] = x[i] + hs*(3/40*K[0,i] + 9/40*K[1,i])
+        DYNAMICS_MACHINE(t+tau+0.3*hs, xk, ACM, fx, bool_hold_uab=bool_hold_uab)
+        for i in range(NS):
+            K[2,i] = fx[i]
+            xk[i] = x[i] + hs*(44/45*K[0,i] - 56/15*K[1,i] + 32/9*K[2,i])
+        DYNAMICS_MACHINE(t+tau+0.8*hs, xk, ACM, fx, bool_hold_uab=bool_hold_uab)
+        for i in range(NS):
+            K[3,i] = fx[i]
+            xk[i] = x[i] + hs*(19372/6561*K[0,i] - 25360/2187*K[1,i] + 64448/6561*K[2,i] - 212/729*K[3,i])
+        DYNAMICS_MACHINE(t+tau+8/9*hs, xk, ACM, fx, bool_hold_uab=bool_hold_uab)
+        for i in range(NS):
+            K[4,i] = fx[i]
+            xk[i] = x[i] + hs*(9017/3168*K[0,i] - 355/33*K[1,i] + 46732/5247*K[2,i] + 49/176*K[3,i] - 5103/18656*K[4,i])
+        DYNAMICS_MACHINE(t+tau+hs, xk, ACM, fx, bool_hold_uab=bool_hold_uab)
+        for i in range(NS):
+            K[5,i] = fx[i]
+            x5[i] = x[i] + hs*(35/384*K[0,i] + 500/1113*K[2,i] + 125/192*K[3,i] - 2187/6784*K[4,i] + 11/84*K[5,i])
+        DYNAMICS_MACHINE(t+tau+hs, x5, ACM, fx, bool_hold_uab=bool_hold_uab) # first stage of the next step (FSAL)
+
+        # error estimate (difference between the 5th and the embedded 4th order solutions)
+        error_norm = 0.0
+        for i in range(NS):
+            K[6,i] = fx[i]
+            error = hs*(71/57600*K[0,i] - 71/16695*K[2,i] + 71/1920*K[3,i] - 17253/339200*K[4,i] + 22/525*K[5,i] - 1/40*K[6,i])
+            scale = ACM.atol + ACM.rtol*max(np.abs(x[i]), np.abs(x5[i]))
+            error_norm += (error/scale)**2
+        error_norm = np.sqrt(error_norm/NS)
+
+        if error_norm <= 1.0:
+            for i in range(NS):
+                x[i] = x5[i]
+                K[0,i] = K[6,i]
+            tau += hs
+            ACM.number_of_accepted_steps += 1
+            factor = min(5.0, 0.9*error_norm**-0.2) if error_norm > 0 else 5.0
+            h = max(h, hs*factor) if bool_clipped else hs*factor # a step clipped at t+H says little about the step size
+        else:
+            ACM.number_of_rejected_steps += 1
+            h = hs*max(0.2, 0.9*error_norm**-0.2)
+    ACM.h_adaptive = h # (the outputs of DYNAMICS_MACHINE, e.g., ACM.Tem, are left from the FSAL stage at t+H)
+
+@njit(nogil=True)
+def JACOBIAN_MACHINE(x, ACM, J, CLARKE_TRANS_TORQUE_GAIN=1.5, bool_hold_uab=False):
+    # J = df/dx of DYNAMICS_MACHINE at x (ACM.KA in the iQ equation is the output of the last step, hence a constant here)
+    npp   = ACM.npp
+    KA    = x[2]
+    iD    = x[3]
+    iQ    = x[4]
+    if KA==0.0 or ACM.Rreq <= 0:
+        omega_slip, dslip_dKA, dslip_diQ = 0.0, 0.0, 0.0
+    else:
+        omega_slip = ACM.Rreq * iQ / KA
+        dslip_dKA  = -omega_slip / KA
+        dslip_diQ  = ACM.Rreq / KA
+    omega_syn = x[1]*npp + omega_slip
+
+    # dudq/dtheta_d_mech (udq rotates with the rotor if the inverter holds uab)
+    dud_dx0, duq_dx0 = 0.0, 0.0
+    if bool_hold_uab:
+        cosT = np.cos(x[0]*npp)
+        sinT = np.sin(x[0]*npp)
+        dud_dx0 = npp * (ACM.uab[0] * -sinT + ACM.uab[1] * cosT)
+        duq_dx0 = npp * (ACM.uab[0] * -cosT - ACM.uab[1] * sinT)
+
+    # 电磁子系统 (KA, iD, iQ as x[2], x[3], x[4])
+    if ACM.Rreq > 0:
+        J[2,0], J[2,1], J[2,2], J[2,3], J[2,4] = 0.0, 0.0, -ACM.Rreq / (ACM.Ld - ACM.Lq), ACM.Rreq, 0.0
+        J[3,0] = (dud_dx0                                 - J[2,0]) / ACM.Lq
+        J[3,1] = (npp*ACM.Lq*iQ                           - J[2,1]) / ACM.Lq
+        J[3,2] = (dslip_dKA*ACM.Lq*iQ                     - J[2,2]) / ACM.Lq
+        J[3,3] = (-ACM.R                                  - J[2,3]) / ACM.Lq
+        J[3,4] = (omega_syn*ACM.Lq + dslip_diQ*ACM.Lq*iQ  - J[2,4]) / ACM.Lq
+    else:
+        J[3,0] = dud_dx0                                  / ACM.Ld
+        J[3,1] = npp*ACM.Lq*iQ                            / ACM.Ld
+        J[3,2] = dslip_dKA*ACM.Lq*iQ                      / ACM.Ld
+        J[3,3] = -ACM.R                                   / ACM.Ld
+        J[3,4] = (omega_syn*ACM.Lq + dslip_diQ*ACM.Lq*iQ) / ACM.Ld
+        for j in range(5):
+            J[2,j] = (ACM.Ld - ACM.Lq) * J[3,j]
+    J[4,0] = duq_dx0                                                    / ACM.Lq
+    J[4,1] = -npp      * (ACM.Lq*iD + ACM.KA)                           / ACM.Lq
+    J[4,2] = -dslip_dKA* (ACM.Lq*iD + ACM.KA)                           / ACM.Lq
+    J[4,3] = -omega_syn
+    J[4,4] = (-ACM.R - dslip_diQ * (ACM.Lq*iD + ACM.KA))                / ACM.Lq
+
+    # 机械子系统 (theta_d_mech, omega_mech as x[0], x[1])
+    J[0,0], J[0,1], J[0,2], J[0,3], J[0,4] = 0.0, 1.0, dslip_dKA / npp, 0.0, dslip_diQ / npp
+    J[1,0], J[1,1], J[1,2], J[1,3], J[1,4] = 0.0, 0.0, CLARKE_TRANS_TORQUE_GAIN * npp * iQ / ACM.Js, 0.0, CLARKE_TRANS_TORQUE_GAIN * npp * KA / ACM.Js
+
+@njit(nogil=True, cache=True)
+def lu_factor_in_place(A, pivots):
+    # Gaussian elimination with partial pivoting, A is overwritten by L (unit diagonal, below) and U (on and above the diagonal)
+    n = A.shape[0]
+    for k in range(n):
+        p = k
+        for i in range(k+1, n):
+            if np.abs(A[i,k]) > np.abs(A[p,k]):
+                p = i
+        pivots[k] = p
+        if p != k:
+            for j in range(n):
+                A[k,j], A[p,j] = A[p,j], A[k,j]
+        if A[k,k] == 0.0:
+            raise Exception('Singular iteration matrix in ROS2_MACHINE.')
+        for i in range(k+1, n):
+            A[i,k] /= A[k,k]
+            for j in range(k+1, n):
+                A[i,j] -= A[i,k] * A[k,j]
+
+@njit(nogil=True, cache=True)
+def lu_solve_in_place(A, pivots, b):
+    # solve A x = b with the factors from lu_factor_in_place, b is overwritten by x
+    n = A.shape[0]
+    for k in range(n):
+        p = pivots[k]
+        if p != k:
+            b[k], b[p] = b[p], b[k]
+    for i in range(1, n):
+        for j in range(i):
+            b[i] -= A[i,j] * b[j]
+    for i in range(n-1, -1, -1):
+        for j in range(i+1, n):
+            b[i] -= A[i,j] * b[j]
+        b[i] /= A[i,i]
+
+@njit(nogil=True)
+def ROS2_MACHINE(t, ACM, hs, bool_hold_uab=False): # 2nd order L-stable Rosenbrock method (Verwer et al., 1999)
+    # (I - gamma*hs*J) k1 = f(x)
+    # (I - gamma*hs*J) k2 = f(x + hs*k1) - 2*k1
+    # x <- x + hs*(1.5*k1 + 0.5*k2)
+    NS = ACM.NS
+    gamma = 1.7071067811865475 # 1 + 1/sqrt(2)
+    A, pivots = ACM.jacobian, ACM.pivots
+    k1, k2 = ACM.stages[0], ACM.stages[1]
+    xk, fx = ACM.xk, ACM.fx
+
+    JACOBIAN_MACHINE(ACM.x, ACM, A, bool_hold_uab=bool_hold_uab)
+    for i in range(NS):
+        for j in range(NS):
+            A[i,j] = -gamma*hs*A[i,j]
+        A[i,i] += 1.0
+    lu_factor_in_place(A, pivots)
+
+    DYNAMICS_MACHINE(t, ACM.x, ACM, fx, bool_hold_uab=bool_hold_uab) # @t
+    for i in range(NS):
+        k1[i] = fx[i]
+    lu_solve_in_place(A, pivots, k1)
+    for i in range(NS):
+        xk[i] = ACM.x[i] + hs*k1[i]
+
+    DYNAMICS_MACHINE(t, xk, ACM, fx, bool_hold_uab=bool_hold_uab) # @t+hs
+    for i in range(NS):
+        k2[i] = fx[i] - 2*k1[i]
+    lu_solve_in_place(A, pivots, k2)
+    for i in range(NS):
+        ACM.x[i] = ACM.x[i] + hs*(1.5*k1[i] + 0.5*k2[i])
+
+@njit(nogil=True)
+def update_zoh_matrices(ACM, omega, hs):
+    # For the PMSM with speed omega held, s [iD, iQ] = A [iD, iQ] + b with A = [[-R/Ld, omega*Lq/Ld], [-omega, -R/Lq]].
+    # Phi = exp(A*hs) = exp(s*hs) * (cosh(delta*hs) I + sinh(delta*hs)/delta (A - s I)), where s = trace(A)/2 and delta^2 = det(s I - A),
+    # and Gamma = int_0^hs exp(A*tau) dtau = A^-1 (Phi - I), or its Taylor series if A*hs is small.
+    a, b, c, d = -ACM.R/ACM.Ld, omega*ACM.Lq/ACM.Ld, -omega, -ACM.R/ACM.Lq
+    s = 0.5*(a + d)
+    delta2 = (0.5*(a - d))**2 + b*c
+    if delta2 > 0:
+        delta = np.sqrt(delta2)
+        ch, sh = np.cosh(delta*hs), np.sinh(delta*hs)/delta
+    elif delta2 < 0:
+        delta = np.sqrt(-delta2)
+        ch, sh = np.cos(delta*hs), np.sin(delta*hs)/delta
+    else:
+        ch, sh = 1.0, hs
+    e = np.exp(s*hs)
+    Phi, Gamma = ACM.zoh_Phi, ACM.zoh_Gamma
+    Phi[0,0] = e*(ch + sh*(a - s))
+    Phi[0,1] = e*(sh*b)
+    Phi[1,0] = e*(sh*c)
+    Phi[1,1] = e*(ch + sh*(d - s))
+
+    norm = max(np.abs(a) + np.abs(b), np.abs(c) + np.abs(d)) * hs
+    if norm < 1e-2: # A^-1 (Phi - I) would lose digits, hs*(I + A*hs/2 + (A*hs)^2/6 + (A*hs)^3/24) is exact to about 1e-12
+        a2, b2, c2, d2 = a*a + b*c, a*b + b*d, c*a + d*c, c*b + d*d # A^2
+        a3, b3, c3, d3 = a2*a + b2*c, a2*b + b2*d, c2*a + d2*c, c2*b + d2*d # A^3
+        Gamma[0,0] = hs*(1 + a*hs/2 + a2*hs**2/6 + a3*hs**3/24)
+        Gamma[0,1] = hs*(    b*hs/2 + b2*hs**2/6 + b3*hs**3/24)
+        Gamma[1,0] = hs*(    c*hs/2 + c2*hs**2/6 + c3*hs**3/24)
+        Gamma[1,1] = hs*(1 + d*hs/2 + d2*hs**2/6 + d3*hs**3/24)
+    else:
+        det = a*d - b*c # > 0 for R > 0
+        Gamma[0,0] = ( d*(Phi[0,0]-1) - b*Phi[1,0]    ) / det
+        Gamma[0,1] = ( d*Phi[0,1]     - b*(Phi[1,1]-1)) / det
+        Gamma[1,0] = (-c*(Phi[0,0]-1) + a*Phi[1,0]    ) / det
+        Gamma[1,1] = (-c*Phi[0,1]     + a*(Phi[1,1]-1)) / det
+
+    ACM.zoh_omega = omega
+    ACM.zoh_hs = hs
+    ACM.zoh_R = ACM.R
+    ACM.zoh_Ld = ACM.Ld
+    ACM.zoh_Lq = ACM.Lq
+    ACM.number_of_zoh_updates += 1
+
+@njit(nogil=True)
+def ZOH_MACHINE(t, ACM, hs, CLARKE_TRANS_TORQUE_GAIN=1.5):
+    # Exact step of the PMSM currents for ACM.udq and the speed held over the step (no step size limit from the electrical time constants),
+    # followed by a trapezoidal step of the mechanical states. The held speed is predicted at the middle of the step,
+    # and exp(A*hs) is reused until it drifts by ACM.zoh_tolerance [rad/s] from the speed it was computed for.
+    if ACM.Rreq != 0:
+        raise Exception('ZOH_MACHINE is for PMSM only (ACM.Rreq must be zero).')
+    x = ACM.x
+    Tem_prev = CLARKE_TRANS_TORQUE_GAIN * ACM.npp * x[2] * x[4]
+    omega = (x[1] + 0.5*hs * (Tem_prev - ACM.TLoad) / ACM.Js) * ACM.npp
+    if hs != ACM.zoh_hs or ACM.R != ACM.zoh_R or ACM.Ld != ACM.zoh_Ld or ACM.Lq != ACM.zoh_Lq or np.abs(omega - ACM.zoh_omega) > ACM.zoh_tolerance:
+        update_zoh_matrices(ACM, omega, hs)
+    Phi, Gamma = ACM.zoh_Phi, ACM.zoh_Gamma
+
+    # 电磁子系统 (KA, iD, iQ as x[2], x[3], x[4])
+    b0 = ACM.udq[0] / ACM.Ld
+    b1 = (ACM.udq[1] - omega*ACM.KA) / ACM.Lq
+    iD = Phi[0,0]*x[3] + Phi[0,1]*x[4] + Gamma[0,0]*b0 + Gamma[0,1]*b1
+    iQ = Phi[1,0]*x[3] + Phi[1,1]*x[4] + Gamma[1,0]*b0 + Gamma[1,1]*b1
+    KA = x[2] + (ACM.Ld - ACM.Lq) * (iD - x[3])
+
+    # 机械子系统 (theta_d_mech, omega_mech as x[0], x[1])
+    ACM.Tem  = CLARKE_TRANS_TORQUE_GAIN * ACM.npp * KA * iQ
+    omega_r_mech = x[1] + hs * (0.5*(Tem_prev + ACM.Tem) - ACM.TLoad) / ACM.Js
+    x[0] = x[0] + hs * 0.5*(x[1] + omega_r_mech)
+    x[1] = omega_r_mech
+    x[2] = KA
+    x[3] = iD
+    x[4] = iQ
+    ACM.omega_slip = 0.0
+    ACM.omega_syn = omega_r_mech * ACM.npp
+
 ############################################# BASIC FOC SECTION
 @njit(nogil=True)
 def incremental_pi(reg):
@@ -1069,7 +1495,355 @@ def gate_signal_generator(ii, v, CPU_TICK_PER_SAMPLING_PERIOD, DEAD_TIME_AS_COUN
             else:
                 pass # False
 
+@njit(nogil=True, cache=True)
+def get_leg_gate_signals(p, N, CMPA, DEAD_TIME_AS_COUNT):
+    # Gate signals (upper, lower) of one leg at tick p of the carrier period, the same as what gate_signal_generator gives after ticking p+1 times:
+    # the counter reads 1, 2, ..., N/2 when counting up and N/2-1, ..., 0 when counting down,
+    # and the turn-on of the upper (lower) switch is delayed by DEAD_TIME_AS_COUNT (DEAD_TIME_AS_COUNT-1) ticks.
+    half = N//2
+    if p < half:
+        upper = p >= CMPA-1 and p >= max(CMPA-1, 0) + DEAD_TIME_AS_COUNT
+        lower = p < CMPA-1
+    else:
+        upper = p < N-CMPA
+        lower = p >= N-CMPA and p >= max(N-CMPA, half) + DEAD_TIME_AS_COUNT - 1
+    return upper, lower
+
+@njit(nogil=True, cache=True)
+def get_leg_next_gate_event(p, N, CMPA, DEAD_TIME_AS_COUNT):
+    # The first tick after p at which the gate signals of one leg can change (N, i.e., the next carrier period, if there is none left).
+    half = N//2
+    next_p = N
+    if p < CMPA-1                                               < next_p: next_p = CMPA-1                                     # lower off
+    if p < max(CMPA-1, 0) + DEAD_TIME_AS_COUNT                  < next_p: next_p = max(CMPA-1, 0) + DEAD_TIME_AS_COUNT        # upper on
+    if p < half                                                 < next_p: next_p = half                                       # carrier peak
+    if p < N-CMPA                                               < next_p: next_p = N-CMPA                                     # upper off
+    if p < max(N-CMPA, half) + DEAD_TIME_AS_COUNT - 1           < next_p: next_p = max(N-CMPA, half) + DEAD_TIME_AS_COUNT - 1 # lower on
+    return next_p
+
+@njit(nogil=True)
+def gate_signal_generator_event_driven(p, v, CPU_TICK_PER_SAMPLING_PERIOD, DEAD_TIME_AS_COUNT):
+    # Event-driven counterpart of gate_signal_generator: S1 -- S6 at tick p of the carrier period (p=0 is the valley interrupt)
+    # are computed from the compare values directly, and the number of ticks for which they stay constant is returned.
+    N = CPU_TICK_PER_SAMPLING_PERIOD
+    CMPA1 = int(np.ceil(v.EPwm1Regs_CMPA_bit_CMPA)) # the counter is an integer
+    CMPA2 = int(np.ceil(v.EPwm2Regs_CMPA_bit_CMPA))
+    CMPA3 = int(np.ceil(v.EPwm3Regs_CMPA_bit_CMPA))
+
+    v.bool_counting_down = p >= N//2
+    v.carrier_counter = N-1-p if v.bool_counting_down else p+1
+
+    # 理想门极信号
+    v.phase_U_gate_signal = v.carrier_counter >= CMPA1
+    v.phase_V_gate_signal = v.carrier_counter >= CMPA2
+    v.phase_W_gate_signal = v.carrier_counter >= CMPA3
+
+    # 实际门极信号（含死区）
+    v.S1, v.S4 = get_leg_gate_signals(p, N, CMPA1, DEAD_TIME_AS_COUNT)
+    v.S2, v.S5 = get_leg_gate_signals(p, N, CMPA2, DEAD_TIME_AS_COUNT)
+    v.S3, v.S6 = get_leg_gate_signals(p, N, CMPA3, DEAD_TIME_AS_COUNT)
+
+    next_p = min(get_leg_next_gate_event(p, N, CMPA1, DEAD_TIME_AS_COUNT),
+                 get_leg_next_gate_event(p, N, CMPA2, DEAD_TIME_AS_COUNT),
+                 get_leg_next_gate_event(p, N, CMPA3, DEAD_TIME_AS_COUNT))
+    return next_p - p
+
+@njit(nogil=True)
+def average_inverter(v, ia, ib, ic):
+    # Average terminal voltages over one sampling period for the duty ratios from SVGEN_DQ (v.Ta, v.Tb, v.Tc after the flip back in ACMSimPyIncremental).
+    # The upper switch is on for 1-T of the period (counter >= CMPA), and the switch that turns on is delayed by the dead time at each of the two edges,
+    # during which the phase current decides the terminal voltage (Vdc if the current flows into the inverter, else 0).
+    # The duty ratios are clamped by SYSTEM_MAX_PWM_DUTY_LIMATATION and SYSTEM_MIN_PWM_DUTY_LIMATATION in SVGEN_DQ, and the result lies within [0, Vdc].
+    delta = v.DEAD_TIME_PER_SAMPLING_PERIOD
+    v.voltage_potential_at_terminal[0] = average_leg_voltage(v.Ta, delta, ia, v.Vdc)
+    v.voltage_potential_at_terminal[1] = average_leg_voltage(v.Tb, delta, ib, v.Vdc)
+    v.voltage_potential_at_terminal[2] = average_leg_voltage(v.Tc, delta, ic, v.Vdc)
+
+@njit(nogil=True, cache=True)
+def average_leg_voltage(T, delta, i, Vdc):
+    upper = max(1-T - delta, 0.0) # on-time of the upper switch
+    lower = max(T - delta, 0.0)   # on-time of the lower switch
+    dead = 1 - upper - lower
+    return Vdc * (upper + (dead if i < 0 else 0.0))
+
+
+
+############################################# Commands (stimulus and live writes applied by the main loop at control rate)
+# fields that can be commanded, e.g., (1.0, 'CTRL.cmd_rpm', 200, 0.5) ramps the speed command to 200 rpm in 0.5 s from t = 1 s
+_COMMAND_TARGETS = {
+    'CTRL.cmd_rpm':             0,
+    'CTRL.cmd_idq[0]':          1,
+    'CTRL.cmd_idq[1]':          2,
+    'CTRL.cmd_psi_Ms':          3,
+    'CTRL.CMD_SPEED_SINE_RPM':  4,
+    'CTRL.CMD_SPEED_SINE_HZ':   5,
+    'ACM.TLoad':                6,
+    'ACM.Js':                   7,
+    'reg_speed.Kp':             8,
+    'reg_speed.Ki':             9,
+    'reg_speed.OutLimit':      10,
+    'reg_id.Kp':               11,
+    'reg_id.Ki':               12,
+    'reg_iq.Kp':               13,
+    'reg_iq.Ki':               14,
+}
+
+@njit(nogil=True)
+def get_command(target, ACM, CTRL, reg_id, reg_iq, reg_speed):
+    if   target ==  0: return CTRL.cmd_rpm
+    elif target ==  1: return CTRL.cmd_idq[0]
+    elif target ==  2: return CTRL.cmd_idq[1]
+    elif target ==  3: return CTRL.cmd_psi_Ms
+    elif target ==  4: return CTRL.CMD_SPEED_SINE_RPM
+    elif target ==  5: return CTRL.CMD_SPEED_SINE_HZ
+    elif target ==  6: return ACM.TLoad
+    elif target ==  7: return ACM.Js
+    elif target ==  8: return reg_speed.Kp
+    elif target ==  9: return reg_speed.Ki
+    elif target == 10: return reg_speed.OutLimit
+    elif target == 11: return reg_id.Kp
+    elif target == 12: return reg_id.Ki
+    elif target == 13: return reg_iq.Kp
+    elif target == 14: return reg_iq.Ki
+    return 0.0
 
+@njit(nogil=True)
+def set_command(target, value, ACM, CTRL, reg_id, reg_iq, reg_speed):
+    if   target ==  0: CTRL.cmd_rpm = value
+    elif target ==  1: CTRL.cmd_idq[0] = value
+    elif target ==  2: CTRL.cmd_idq[1] = value
+    elif target ==  3: CTRL.cmd_psi_Ms = value
+    elif target ==  4: CTRL.CMD_SPEED_SINE_RPM = value
+    elif target ==  5: CTRL.CMD_SPEED_SINE_HZ = value
+    elif target ==  6: ACM.TLoad = value
+    elif target ==  7: ACM.Js = value
+    elif target ==  8: reg_speed.Kp = value
+    elif target ==  9: reg_speed.Ki = value
+    elif target == 10: reg_speed.OutLimit = value
+    elif target == 11: reg_id.Kp = value
+    elif target == 12: reg_id.Ki = value
+    elif target == 13: reg_iq.Kp = value
+    elif target == 14: reg_iq.Ki = value
+
+@njit(nogil=True)
+def apply_command_timeline(timeline, step, MACHINE_TS, ACM, CTRL, reg_id, reg_iq, reg_speed):
+    # apply the events due at machine step index step, then advance the ramps in progress
+    while timeline.pointer < len(timeline.times) and get_step_index(timeline.times[timeline.pointer], MACHINE_TS) <= step:
+        k = timeline.pointer
+        for j in range(k): # a new event to a target ends the ramp in progress of that target
+            if timeline.bool_ramping[j] and timeline.targets[j] == timeline.targets[k]:
+                timeline.bool_ramping[j] = 0
+                timeline.number_of_ramps_in_progress -= 1
+        if timeline.ramps[k] > 0:
+            timeline.start_values[k] = get_command(timeline.targets[k], ACM, CTRL, reg_id, reg_iq, reg_speed)
+            timeline.bool_ramping[k] = 1
+            timeline.number_of_ramps_in_progress += 1
+        else:
+            set_command(timeline.targets[k], timeline.values[k], ACM, CTRL, reg_id, reg_iq, reg_speed)
+        timeline.pointer += 1
+    if timeline.number_of_ramps_in_progress > 0:
+        t = step * MACHINE_TS
+        for k in range(timeline.pointer):
+            if timeline.bool_ramping[k]:
+                ratio = (t - timeline.times[k]) / timeline.ramps[k]
+                if ratio >= 1.0:
+                    ratio = 1.0
+                    timeline.bool_ramping[k] = 0
+                    timeline.number_of_ramps_in_progress -= 1
+                set_command(timeline.targets[k], timeline.start_values[k] + (timeline.values[k] - timeline.start_values[k]) * ratio, ACM, CTRL, reg_id, reg_iq, reg_speed)
+
+# mailbox: a float64 array written by another thread while ACMSimPyIncremental runs (see Command_Mailbox). The writes go into a ring
+# of [target, value] pairs; each side only advances its own counter, so a write is applied exactly once even if it arrives while
+# the previous ones are being applied.
+MAILBOX_NUMBER_OF_WRITES         = 0 # written so far (advanced by the writer after the pairs are in place)
+MAILBOX_NUMBER_OF_APPLIED_WRITES = 1 # applied so far (advanced by ACMSimPyIncremental)
+MAILBOX_WRITES                   = 2 # the ring of MAILBOX_CAPACITY [target, value] pairs from here on
+MAILBOX_CAPACITY                 = 16
+
+@njit(nogil=True)
+def poll_mailbox(mailbox, ACM, CTRL, reg_id, reg_iq, reg_speed):
+    number_of_writes = int(mailbox[MAILBOX_NUMBER_OF_WRITES])
+    number_of_applied_writes = int(mailbox[MAILBOX_NUMBER_OF_APPLIED_WRITES])
+    for k in range(number_of_applied_writes, number_of_writes): # (nothing new most of the time)
+        index = MAILBOX_WRITES + 2*(k % MAILBOX_CAPACITY)
+        set_command(int(mailbox[index]), mailbox[index+1], ACM, CTRL, reg_id, reg_iq, reg_speed)
+    mailbox[MAILBOX_NUMBER_OF_APPLIED_WRITES] = number_of_writes
+
+############################################# Steady-state detector (band test at control rate)
+STEADY_STATE_SIGNAL_NAMES = ('speed [rpm]', 'iD [A]', 'iQ [A]', 'Tem [Nm]')
+
+@njit(nogil=True)
+def update_steady_state_detector(detector, t, ACM, CL_TS):
+    # The signals are averaged over blocks of detector.window (every sample is a block if the window is 0). The band restarts whenever
+    # the peak-to-peak value of the block means of a signal exceeds its tolerance, so the steady state is detected once all signals stay
+    # within their bands for settle_time.
+    for k in range(4):
+        if   k == 0: value = ACM.omega_r_mech / (2*np.pi) * 60
+        elif k == 1: value = ACM.iD
+        elif k == 2: value = ACM.iQ
+        else:        value = ACM.Tem
+        detector.block_sum[k] += value
+    detector.block_count += 1
+    if detector.block_count == 1:
+        detector.block_start_time = t
+    if detector.block_count * CL_TS < detector.window - 0.5*CL_TS:
+        return
+
+    bool_restart = detector.count == 0
+    for k in range(4):
+        mean = detector.block_sum[k] / detector.block_count
+        detector.block_sum[k] = 0.0
+        if not bool_restart:
+            if mean < detector.minimum[k]: detector.minimum[k] = mean
+            if mean > detector.maximum[k]: detector.maximum[k] = mean
+            if detector.maximum[k] - detector.minimum[k] > detector.tolerance[k]:
+                bool_restart = True
+        detector.values[k] = mean # the latest block, used if the band restarts
+    detector.block_count = 0
+    if bool_restart:
+        detector.window_start_time = detector.block_start_time
+        detector.count = 1
+        for k in range(4):
+            detector.minimum[k] = detector.maximum[k] = detector.sum[k] = detector.values[k]
+        return
+    detector.count += 1
+    for k in range(4):
+        detector.sum[k] += detector.values[k]
+    if t + CL_TS - detector.window_start_time >= detector.settle_time:
+        detector.bool_steady = True
+        detector.steady_time = t
+        for k in range(4):
+            detector.values[k] = detector.sum[k] / detector.count
+
+############################################# Watch (signals that can be recorded by the main loop)
+NUMBER_OF_WATCH_CHANNELS = 51 # = len(_Unit_Watch_Mapping)
+
+# recording modes (the machine is always integrated at MACHINE_TS, only the stored output shrinks)
+WATCH_MODE_DECIMATE       = 0 # keep every watch_decimation-th sample (watch_decimation=1 keeps all samples)
+WATCH_MODE_CONTROL_PERIOD = 1 # keep one sample per control period (right after the controller executes)
+WATCH_MODE_ENVELOPE       = 2 # keep mean, min and max of every bucket of watch_decimation samples
+_WATCH_MODES = {'decimate': WATCH_MODE_DECIMATE, 'control_period': WATCH_MODE_CONTROL_PERIOD, 'envelope': WATCH_MODE_ENVELOPE}
+
+@njit(nogil=True)
+def watch_signal(index, ACM, CTRL, svgen1, reg_speed):
+    # the index follows the order of _Unit_Watch_Mapping
+    if   index ==  0: return divmod(ACM.theta_d, 2*np.pi)[1]
+    elif index ==  1: return ACM.omega_r_mech / (2*np.pi) * 60 # omega_r_mech
+    elif index ==  2: return ACM.KA
+    elif index ==  3: return ACM.iD
+    elif index ==  4: return ACM.iQ
+    elif index ==  5: return ACM.Tem
+    elif index ==  6: return CTRL.iab[0]
+    elif index ==  7: return CTRL.iab[1]
+    elif index ==  8: return CTRL.idq[0]
+    elif index ==  9: return CTRL.idq[1]
+    elif index == 10: return divmod(CTRL.theta_d, 2*np.pi)[1]
+    elif index == 11: return CTRL.omega_r_elec / (2*np.pi*ACM.npp) * 60
+    elif index == 12: return CTRL.cmd_rpm
+    elif index == 13: return CTRL.cmd_idq[0]
+    elif index == 14: return CTRL.cmd_idq[1]
+    elif index == 15: return CTRL.xS[0] # theta_d
+    elif index == 16: return CTRL.xS[1] / (2*np.pi*ACM.npp) * 60 # omega_r_elec
+    elif index == 17: return CTRL.xS[2] # TL
+    elif index == 18: return CTRL.xS[3] # pT
+    elif index == 19: return CTRL.KA
+    elif index == 20: return CTRL.KE
+    elif index == 21: return CTRL.xT[0] # stator flux[0]
+    elif index == 22: return CTRL.xT[1] # stator flux[1]
+    elif index == 23: return CTRL.xT[2] # I term
+    elif index == 24: return CTRL.xT[3] # I term
+    elif index == 25: return 0.0 # CTRL.active_flux[0] # active flux[0]
+    elif index == 26: return 0.0 # CTRL.active_flux[1] # active flux[1]
+    elif index == 27: return CTRL.Tem
+    elif index == 28: return CTRL.cmd_uab[0] # -svgen1.line_to_line_voltage_AC # ACM.uab[0] # CTRL.cmd_uab[0]
+    elif index == 29: return CTRL.cmd_uab[1] # svgen1.line_to_line_voltage_BC # svgen1.carrier_counter # CTRL.cmd_uab[1]
+    elif index == 30: return 30+svgen1.voltage_potential_at_terminal[0] # -svgen1.line_to_line_voltage_AC # ACM.uab[0]
+    elif index == 31: return svgen1.voltage_potential_at_terminal[1] # svgen1.line_to_line_voltage_BC # ACM.uab[1]
+    elif index == 32: return -30+svgen1.voltage_potential_at_terminal[2] # svgen1.line_to_line_voltage_AB # svgen1.line_to_line_voltage_BC
+    elif index == 33: return 0.0 # svgen1.voltage_potential_at_terminal[0] # svgen1.deadtime_counter[0] # svgen1.voltage_potential_at_terminal[0]
+    elif index == 34: return ACM.uab[0] # svgen1.deadtime_counter[1] # svgen1.voltage_potential_at_terminal[1]
+    elif index == 35: return ACM.uab[1] # svgen1.deadtime_counter[2] # svgen1.voltage_potential_at_terminal[2]
+    elif index == 36: return ACM.udq[0]
+    elif index == 37: return ACM.udq[1]
+    elif index == 38: return CTRL.cmd_udq[0]
+    elif index == 39: return CTRL.cmd_udq[1]
+    elif index == 40: return reg_speed.OutLimit
+    elif index == 41: return ACM.TLoad
+    elif index == 42: return CTRL.omega_syn
+    elif index == 43: return CTRL.cmd_uMT[0]
+    elif index == 44: return CTRL.cmd_uMT[1]
+    elif index == 45: return CTRL.cmd_iMT[1]
+    elif index == 46: return CTRL.iMT[1]
+    elif index == 47: return CTRL.cmd_psi_Ms
+    elif index == 48: return CTRL.psi_stator_MT_fb[0]
+    elif index == 49: return CTRL.omega_slip
+    elif index == 50: return CTRL.iMT[0]
+    return 0.0
+
+# derived channels: expressions of numba__scope_dict evaluated while recording, so that only the result is stored
+# (postfix programs of [opcode, argument] pairs, see Scope_Expression_Compiler.compile_program())
+DERIVED_END      =  0
+DERIVED_SIGNAL   =  1 # push watch_signal(argument)
+DERIVED_CONSTANT =  2 # push derived_constants[argument]
+DERIVED_ADD      =  3
+DERIVED_SUB      =  4
+DERIVED_MUL      =  5
+DERIVED_DIV      =  6
+DERIVED_POW      =  7
+DERIVED_ARCTAN2  =  8
+DERIVED_HYPOT    =  9
+DERIVED_NEG      = 10 # unary operations from here on
+DERIVED_ABS      = 11
+DERIVED_SQRT     = 12
+DERIVED_SIN      = 13
+DERIVED_COS      = 14
+
+@njit(nogil=True, error_model='numpy') # x/0 gives inf or nan as in numpy
+def derived_signal(program, constants, stack, ACM, CTRL, svgen1, reg_speed):
+    top = -1
+    for j in range(0, len(program), 2):
+        opcode = program[j]
+        if opcode == DERIVED_END:
+            break
+        elif opcode == DERIVED_SIGNAL:
+            top += 1
+            stack[top] = watch_signal(program[j+1], ACM, CTRL, svgen1, reg_speed)
+        elif opcode == DERIVED_CONSTANT:
+            top += 1
+            stack[top] = constants[program[j+1]]
+        elif opcode < DERIVED_NEG:
+            b = stack[top]
+            top -= 1
+            a = stack[top]
+            if   opcode == DERIVED_ADD:     stack[top] = a + b
+            elif opcode == DERIVED_SUB:     stack[top] = a - b
+            elif opcode == DERIVED_MUL:     stack[top] = a * b
+            elif opcode == DERIVED_DIV:     stack[top] = a / b
+            elif opcode == DERIVED_POW:     stack[top] = a ** b
+            elif opcode == DERIVED_ARCTAN2: stack[top] = np.arctan2(a, b)
+            elif opcode == DERIVED_HYPOT:   stack[top] = np.hypot(a, b)
+        else:
+            a = stack[top]
+            if   opcode == DERIVED_NEG:  stack[top] = -a
+            elif opcode == DERIVED_ABS:  stack[top] = np.abs(a)
+            elif opcode == DERIVED_SQRT: stack[top] = np.sqrt(a)
+            elif opcode == DERIVED_SIN:  stack[top] = np.sin(a)
+            elif opcode == DERIVED_COS:  stack[top] = np.cos(a)
+    return stack[0]
+
+@njit(nogil=True)
+def accumulate_envelope(watch_data, number_of_watch_channels, k, watch_index, watch_count, value):
+    # rows k, number_of_watch_channels+k and 2*number_of_watch_channels+k hold the [sum, min, max] of the present bucket
+    if watch_count == 0:
+        watch_data[k][watch_index] = value
+        watch_data[number_of_watch_channels+k][watch_index] = value
+        watch_data[2*number_of_watch_channels+k][watch_index] = value
+    else:
+        watch_data[k][watch_index] += value # sum for now, divided when the bucket is closed
+        if value < watch_data[number_of_watch_channels+k][watch_index]:
+            watch_data[number_of_watch_channels+k][watch_index] = value
+        if value > watch_data[2*number_of_watch_channels+k][watch_index]:
+            watch_data[2*number_of_watch_channels+k][watch_index] = value
 
 ############################################# Wrapper level 1 (Main simulation | Incremental Edition)
 """ MAIN for Real-time simulation """
@@ -1089,39 +1863,117 @@ def vehicel_load_model(t, ACM):
     ACM.TLoad=FLoad*EVR          ##### 单侧转矩负载
     ACM.Js = EVJ = EVM*EVR*EVR*0.25  ##### 单轮等效转动惯量
 
+@njit(nogil=True, cache=True)
+def get_number_of_watch_samples(step0, number_of_steps, watch_mode=WATCH_MODE_DECIMATE, watch_decimation=1):
+    """ Number of samples recorded for machine steps step0, step0+1, ..., step0+number_of_steps-1.
+        The decimation phase follows the global step index so that consecutive slices join seamlessly. """
+    if number_of_steps <= 0:
+        return 0
+    if watch_mode == WATCH_MODE_ENVELOPE:
+        # one bucket per aligned group of watch_decimation steps (the buckets at the slice edges can be partial)
+        return (step0 + number_of_steps - 1) // watch_decimation - step0 // watch_decimation + 1
+    else:
+        # one sample per step whose global index is a multiple of watch_decimation
+        return (step0 + number_of_steps + watch_decimation - 1) // watch_decimation - (step0 + watch_decimation - 1) // watch_decimation
+
+@njit(nogil=True, cache=True)
+def get_step_index(t, MACHINE_TS):
+    """ Integer time base: the machine step index at time t. """
+    return int(np.round(t / MACHINE_TS))
+
 @njit(nogil=True)
-def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None, reg_speed=None):
+def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None, reg_speed=None, watch_channels=None, watch_mode=WATCH_MODE_DECIMATE, watch_decimation=1,
+                        out_times=None, out_data=None, out_offset=0, svgen1=None, derived_programs=None, derived_constants=None, timeline=None, mailbox=None,
+                        detector=None):
+    # If detector is given, it is updated at every controller execution (see get_steady_state_detector()). If it detects the steady state
+    # and its bool_stop is set, the slice ends at that step and only the samples recorded so far are returned.
+    # If timeline is given, its events are applied at the first controller execution at or after their time (see get_command_timeline()).
+    # If mailbox is given, it is polled at every controller execution for writes from another thread (see Command_Mailbox).
+    # If derived_programs is given, each of its programs is recorded as one more row after the watch_channels (see get_derived_channels()).
+    # If out_times and out_data are given, the samples are written to out_times[out_offset:] and out_data[:, out_offset:]
+    # and views of the written part are returned (no allocation), otherwise new arrays are returned.
+    # With svgen1.inverter_model == INVERTER_MODEL_EVENT or INVERTER_MODEL_AVERAGE, only the machine steps at which the inverter output, the controller or the watch
+    # can change are visited, and the machine is integrated across the skipped steps in one go (the number of recorded samples is the same).
+    # The machine sees ACM.uab held over each such interval (see bool_hold_uab of DYNAMICS_MACHINE), and during dead time
+    # the phase current polarity that decides the terminal voltage is only checked at the visited steps.
 
     # RK4 simulation and controller execution relative freuqencies
     MACHINE_TS = CTRL.CL_TS / ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
     controller_down_sampling_ceiling = int(CTRL.CL_TS / MACHINE_TS)
 
-    # SVPWM
-    CPU_TICK_PER_SAMPLING_PERIOD = ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
-    DEAD_TIME_AS_COUNT = int(200*0.5e-4*CPU_TICK_PER_SAMPLING_PERIOD) # 200 count for 0--5000--0 counting sequence
+    # SVPWM (svgen1 is owned by the simulation session so that the carrier state is kept across slices, see Simulation_Benchmark.get_global_objects())
+    if svgen1 is None:
+        raise Exception('Pass the svgen1 of the simulation session to ACMSimPyIncremental (a new SVgen_Object per slice would reset the PWM carrier).')
+    if svgen1.Vdc != CTRL.DC_BUS_VOLTAGE: # the dc bus voltage can be changed from the console
+        svgen1.Vdc = CTRL.DC_BUS_VOLTAGE
+        svgen1.one_over_Vdc = 1/svgen1.Vdc
+    CPU_TICK_PER_SAMPLING_PERIOD = svgen1.CPU_TICK_PER_SAMPLING_PERIOD
+    DEAD_TIME_AS_COUNT = svgen1.DEAD_TIME_AS_COUNT
+    bool_event_driven = svgen1.inverter_model != INVERTER_MODEL_TICK
     # print(t0, 's', 'DEAD_TIME_AS_COUNT =', DEAD_TIME_AS_COUNT, )
-    Vdc = CTRL.DC_BUS_VOLTAGE # Vdc is assumed measured and known
-    one_over_Vdc = 1/Vdc
-    svgen1 = SVgen_Object(CPU_TICK_PER_SAMPLING_PERIOD)
+    Vdc = svgen1.Vdc
+    one_over_Vdc = svgen1.one_over_Vdc
     # print('Vdc, CPU_TICK_PER_SAMPLING_PERIOD, controller_down_sampling_ceiling', Vdc, CPU_TICK_PER_SAMPLING_PERIOD, controller_down_sampling_ceiling)
 
-    # watch variabels
-    machine_times = np.arange(t0, t0+TIME, MACHINE_TS)
-    watch_data    = np.zeros( (100, len(machine_times)) ) # new
+    # stimulus (pass the timeline owned by the simulation session to continue it across slices)
+    if timeline is None:
+        timeline = The_Command_Timeline(np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+    if mailbox is None:
+        mailbox = np.zeros(MAILBOX_WRITES)
+    if detector is None:
+        detector = The_Steady_State_Detector(0.0, 0.0, np.zeros(4), False)
+    bool_stop = False
+
+    # watch variabels (only the channels listed in watch_channels are recorded, see get_watch_channels())
+    if watch_channels is None:
+        watch_channels = np.arange(NUMBER_OF_WATCH_CHANNELS)
+    if derived_programs is None:
+        derived_programs = np.zeros((0, 2), dtype=np.int64)
+    if derived_constants is None:
+        derived_constants = np.zeros(0)
+    stack = np.zeros(max(1, derived_programs.shape[1]//2)) # for derived_signal()
+    if watch_mode == WATCH_MODE_CONTROL_PERIOD:
+        watch_decimation = controller_down_sampling_ceiling
+    # machine_times = np.arange(t0, t0+TIME, MACHINE_TS) # old (float drift makes the length vary from slice to slice)
+    step0 = get_step_index(t0, MACHINE_TS) # new (time is counted by an integer step index)
+    number_of_steps = get_step_index(TIME, MACHINE_TS)
+    number_of_watch_samples = get_number_of_watch_samples(step0, number_of_steps, watch_mode, watch_decimation)
+    number_of_plain_channels = len(watch_channels) # the rows of watch_data are the watch_channels followed by the derived channels
+    number_of_derived_channels = len(derived_programs)
+    number_of_watch_channels = number_of_plain_channels + number_of_derived_channels
+    number_of_watch_rows = 3*number_of_watch_channels if watch_mode == WATCH_MODE_ENVELOPE else number_of_watch_channels # envelope rows: [mean, min, max] blocks
+    if out_times is None:
+        out_times = np.zeros(out_offset + number_of_watch_samples)
+    if out_data is None:
+        out_data = np.zeros( (number_of_watch_rows, out_offset + number_of_watch_samples) )
+    if out_data.shape[0] < number_of_watch_rows or out_data.shape[1] < out_offset + number_of_watch_samples or len(out_times) < out_offset + number_of_watch_samples:
+        raise Exception('The output buffers are too small.')
+    watch_times = out_times[out_offset:out_offset+number_of_watch_samples]
+    watch_data = out_data[:number_of_watch_rows, out_offset:out_offset+number_of_watch_samples]
     # control_times = np.arange(t0, t0+TIME, CTRL.CL_TS)
     # watch_data = np.zeros( (40, len(control_times)) ) # old
 
     # Main loop
-    jj = controller_down_sampling_ceiling # run controller at step 1
     watch_index = 0
-    for ii in range(len(machine_times)):
+    watch_count = 0 # number of samples in the present bucket
+    ii_prev = -1 # last visited step (every step is visited unless bool_event_driven)
+    ticks_to_next_gate_event = controller_down_sampling_ceiling
+    ii = 0
+    while ii < number_of_steps:
 
-        t = machine_times[ii]
+        t = (step0 + ii) * MACHINE_TS
 
         """ Machine Simulation @ MACHINE_TS """
         # Numerical Integration (ode4) with 5 states
         if ACM.bool_apply_load_model: vehicel_load_model(t, ACM)
-        RK4_MACHINE(t, ACM, hs=MACHINE_TS)
+        if ACM.integrator == INTEGRATOR_DOPRI5:
+            DOPRI5_MACHINE(t, ACM, (ii - ii_prev)*MACHINE_TS, bool_hold_uab=bool_event_driven)
+        elif ACM.integrator == INTEGRATOR_ROS2:
+            ROS2_MACHINE(t, ACM, (ii - ii_prev)*MACHINE_TS, bool_hold_uab=bool_event_driven)
+        elif ACM.integrator == INTEGRATOR_ZOH and not bool_event_driven: # (the event-driven inverter models hold uab rather than udq, so RK4 is used there)
+            ZOH_MACHINE(t, ACM, (ii - ii_prev)*MACHINE_TS)
+        else:
+            RK4_MACHINE(t, ACM, hs=(ii - ii_prev)*MACHINE_TS, bool_hold_uab=bool_event_driven)
 
         """ Machine Simulation Output @ MACHINE_TS """
         # Generate output variables for easy access
@@ -1140,9 +1992,8 @@ def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None,
         ACM.iAlfa = ACM.iD * ACM.cosT + ACM.iQ *-ACM.sinT # as motor controller input
         ACM.iBeta = ACM.iD * ACM.sinT + ACM.iQ * ACM.cosT # as motor controller input
 
-        jj += 1
-        if jj >= controller_down_sampling_ceiling:
-            jj = 0
+        # the controller phase follows the global step index (run controller at step 1)
+        if (step0 + ii) % controller_down_sampling_ceiling == 0:
 
             """ Console @ CL_TS """
             if CTRL.bool_overwrite_speed_commands == False:
@@ -1170,6 +2021,13 @@ def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None,
                 #     CTRL.cmd_rpm = CTRL.CMD_SPEED_SINE_RPM * np.sin(2*np.pi*CTRL.CMD_SPEED_SINE_HZ*t)
                 pass
 
+            if timeline.pointer < len(timeline.times) or timeline.number_of_ramps_in_progress > 0:
+                apply_command_timeline(timeline, step0 + ii, MACHINE_TS, ACM, CTRL, reg_id, reg_iq, reg_speed)
+            poll_mailbox(mailbox, ACM, CTRL, reg_id, reg_iq, reg_speed)
+            if detector.settle_time > 0 and not detector.bool_steady:
+                update_steady_state_detector(detector, t, ACM, CTRL.CL_TS)
+                bool_stop = detector.bool_steady == 1 and detector.bool_stop == 1
+
             if CTRL.bool_apply_sweeping_frequency_excitation == True:
 
                 if CTRL.timebase > CTRL.CMD_SPEED_SINE_END_TIME:
@@ -1217,7 +2075,26 @@ def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None,
             svgen1.bool_interupt_event = True
 
         """ Voltage Source Inverter (in alpha-beta frame) """
-        if CPU_TICK_PER_SAMPLING_PERIOD >= 20: # implementing SVPWM
+        if svgen1.inverter_model == INVERTER_MODEL_AVERAGE: # averaged SVPWM (no switching ripple)
+
+            # Amplitude invariant Clarke transformation
+            ACM.ia = ACM.iAlfa
+            ACM.ib = ACM.iAlfa*-0.5 + ACM.iBeta*0.8660254
+            ACM.ic = ACM.iAlfa*-0.5 + ACM.iBeta*-0.8660254
+
+            # 平均端电势
+            average_inverter(svgen1, ACM.ia, ACM.ib, ACM.ic)
+
+            # 线电压 AC 和 BC
+            svgen1.line_to_line_voltage_AC = svgen1.voltage_potential_at_terminal[0] - svgen1.voltage_potential_at_terminal[2]
+            svgen1.line_to_line_voltage_BC = svgen1.voltage_potential_at_terminal[1] - svgen1.voltage_potential_at_terminal[2]
+            svgen1.line_to_line_voltage_AB = svgen1.voltage_potential_at_terminal[0] - svgen1.voltage_potential_at_terminal[1]
+
+            # 线电压 做 Amplitude invariant Clarke transformation 获得 alpha-beta 电压
+            ACM.uab[0] = svgen1.line_to_line_voltage_AC*0.6666667 - (svgen1.line_to_line_voltage_BC + 0)*0.3333333
+            ACM.uab[1] = 0.577350269 * (svgen1.line_to_line_voltage_BC - 0)
+
+        elif CPU_TICK_PER_SAMPLING_PERIOD >= 20: # implementing SVPWM
 
             # Amplitude invariant Clarke transformation
             ACM.ia = ACM.iAlfa
@@ -1225,7 +2102,10 @@ def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None,
             ACM.ic = ACM.iAlfa*-0.5 + ACM.iBeta*-0.8660254
 
             # Get S1 -- S6
-            gate_signal_generator(ii, svgen1, CPU_TICK_PER_SAMPLING_PERIOD=CPU_TICK_PER_SAMPLING_PERIOD, DEAD_TIME_AS_COUNT=DEAD_TIME_AS_COUNT)
+            if bool_event_driven:
+                ticks_to_next_gate_event = gate_signal_generator_event_driven((step0 + ii) % controller_down_sampling_ceiling, svgen1, CPU_TICK_PER_SAMPLING_PERIOD, DEAD_TIME_AS_COUNT)
+            else:
+                gate_signal_generator(step0 + ii, svgen1, CPU_TICK_PER_SAMPLING_PERIOD=CPU_TICK_PER_SAMPLING_PERIOD, DEAD_TIME_AS_COUNT=DEAD_TIME_AS_COUNT)
 
             # 端电势
             # inverter connects motor terminals to dc bus capacitor depending on gate signals and phase current (during dead zone)
@@ -1269,182 +2149,456 @@ def ACMSimPyIncremental(t0, TIME, ACM=None, CTRL=None, reg_id=None, reg_iq=None,
         ACM.udq[1] = ACM.uab[0] * -ACM.sinT + ACM.uab[1] * ACM.cosT
 
         """ Watch @ MACHINE_TS """
-        watch_data[ 0][watch_index] = divmod(ACM.theta_d, 2*np.pi)[1]
-        watch_data[ 1][watch_index] = ACM.omega_r_mech / (2*np.pi) * 60 # omega_r_mech
-        watch_data[ 2][watch_index] = ACM.KA
-        watch_data[ 3][watch_index] = ACM.iD
-        watch_data[ 4][watch_index] = ACM.iQ
-        watch_data[ 5][watch_index] = ACM.Tem
-        watch_data[ 6][watch_index] =   CTRL.iab[0]
-        watch_data[ 7][watch_index] =   CTRL.iab[1]
-        watch_data[ 8][watch_index] = CTRL.idq[0]
-        watch_data[ 9][watch_index] = CTRL.idq[1]
-        watch_data[10][watch_index] = divmod(CTRL.theta_d, 2*np.pi)[1]
-        watch_data[11][watch_index] = CTRL.omega_r_elec / (2*np.pi*ACM.npp) * 60
-        watch_data[12][watch_index] = CTRL.cmd_rpm
-        watch_data[13][watch_index] = CTRL.cmd_idq[0]
-        watch_data[14][watch_index] = CTRL.cmd_idq[1]
-        watch_data[15][watch_index] = CTRL.xS[0] # theta_d
-        watch_data[16][watch_index] = CTRL.xS[1] / (2*np.pi*ACM.npp) * 60 # omega_r_elec
-        watch_data[17][watch_index] = CTRL.xS[2] # TL
-        watch_data[18][watch_index] = CTRL.xS[3] # pT
-        watch_data[19][watch_index] = CTRL.KA
-        watch_data[20][watch_index] = CTRL.KE
-        watch_data[21][watch_index] = CTRL.xT[0] # stator flux[0]
-        watch_data[22][watch_index] = CTRL.xT[1] # stator flux[1]
-        watch_data[23][watch_index] = CTRL.xT[2] # I term
-        watch_data[24][watch_index] = CTRL.xT[3] # I term
-        watch_data[25][watch_index] = 0.0 # CTRL.active_flux[0] # active flux[0]
-        watch_data[26][watch_index] = 0.0 # CTRL.active_flux[1] # active flux[1]
-        watch_data[27][watch_index] = CTRL.Tem
-
-        watch_data[28][watch_index] = CTRL.cmd_uab[0] # -svgen1.line_to_line_voltage_AC # ACM.uab[0] # CTRL.cmd_uab[0]
-        watch_data[29][watch_index] = CTRL.cmd_uab[1] # svgen1.line_to_line_voltage_BC # svgen1.carrier_counter # CTRL.cmd_uab[1]
-
-        watch_data[30][watch_index] = 30+svgen1.voltage_potential_at_terminal[0] # -svgen1.line_to_line_voltage_AC # ACM.uab[0]
-        watch_data[31][watch_index] = svgen1.voltage_potential_at_terminal[1] # svgen1.line_to_line_voltage_BC # ACM.uab[1]
-        watch_data[32][watch_index] = -30+svgen1.voltage_potential_at_terminal[2] # svgen1.line_to_line_voltage_AB # svgen1.line_to_line_voltage_BC
-        watch_data[33][watch_index] = 0.0 # svgen1.voltage_potential_at_terminal[0] # svgen1.deadtime_counter[0] # svgen1.voltage_potential_at_terminal[0]
-        watch_data[34][watch_index] = ACM.uab[0] # svgen1.deadtime_counter[1] # svgen1.voltage_potential_at_terminal[1]
-        watch_data[35][watch_index] = ACM.uab[1] # svgen1.deadtime_counter[2] # svgen1.voltage_potential_at_terminal[2]
-
-        watch_data[36][watch_index] = ACM.udq[0]
-        watch_data[37][watch_index] = ACM.udq[1]
-        watch_data[38][watch_index] = CTRL.cmd_udq[0]
-        watch_data[39][watch_index] = CTRL.cmd_udq[1]
-
-        watch_data[40][watch_index] = reg_speed.OutLimit
-
-        watch_data[41][watch_index] = ACM.TLoad
-
-        watch_data[42][watch_index] = CTRL.omega_syn
-        watch_data[43][watch_index] = CTRL.cmd_uMT[0]
-        watch_data[44][watch_index] = CTRL.cmd_uMT[1]
-
-        watch_data[45][watch_index] = CTRL.cmd_iMT[1]
-        watch_data[46][watch_index] = CTRL.iMT[1]
-
-        watch_data[47][watch_index] = CTRL.cmd_psi_Ms
-        watch_data[48][watch_index] = CTRL.psi_stator_MT_fb[0]
-        watch_data[49][watch_index] = CTRL.omega_slip
-
-        watch_data[50][watch_index] = CTRL.iMT[0]
-
-        watch_index += 1
-
-    # return machine_times, watch_data # old
-    return machine_times, watch_data # new
+        if watch_mode == WATCH_MODE_ENVELOPE:
+            if watch_count == 0:
+                watch_times[watch_index] = t
+            for k in range(number_of_plain_channels):
+                accumulate_envelope(watch_data, number_of_watch_channels, k, watch_index, watch_count,
+                                    watch_signal(watch_channels[k], ACM, CTRL, svgen1, reg_speed))
+            if number_of_derived_channels > 0:
+                for k in range(number_of_derived_channels):
+                    accumulate_envelope(watch_data, number_of_watch_channels, number_of_plain_channels+k, watch_index, watch_count,
+                                        derived_signal(derived_programs[k], derived_constants, stack, ACM, CTRL, svgen1, reg_speed))
+            watch_count += 1
+            if (step0 + ii + 1) % watch_decimation == 0 or ii == number_of_steps-1:
+                for k in range(number_of_watch_channels):
+                    watch_data[k][watch_index] /= watch_count
+                watch_count = 0
+                watch_index += 1
+        elif (step0 + ii) % watch_decimation == 0:
+            watch_times[watch_index] = t
+            for k in range(number_of_plain_channels):
+                watch_data[k][watch_index] = watch_signal(watch_channels[k], ACM, CTRL, svgen1, reg_speed)
+            if number_of_derived_channels > 0:
+                for k in range(number_of_derived_channels):
+                    watch_data[number_of_plain_channels+k][watch_index] = derived_signal(derived_programs[k], derived_constants, stack, ACM, CTRL, svgen1, reg_speed)
+            watch_index += 1
+
+        if bool_stop:
+            if watch_count > 0: # close the present bucket of WATCH_MODE_ENVELOPE
+                for k in range(number_of_watch_channels):
+                    watch_data[k][watch_index] /= watch_count
+                watch_index += 1
+            break
+
+        """ Next step to visit """
+        ii_prev = ii
+        if bool_event_driven and watch_mode != WATCH_MODE_ENVELOPE: # the envelope needs every step
+            ii_next = ii + ticks_to_next_gate_event # inverter
+            ii_next = min(ii_next, ii + controller_down_sampling_ceiling - (step0 + ii) % controller_down_sampling_ceiling) # controller
+            ii_next = min(ii_next, ii + watch_decimation - (step0 + ii) % watch_decimation) # watch
+            if ii < number_of_steps-1:
+                ii_next = min(ii_next, number_of_steps-1) # the last step of the slice, so that the next slice starts from an integrated state
+            ii = ii_next
+        else:
+            ii += 1
+
+    return watch_times[:watch_index], watch_data[:, :watch_index] # (watch_index < number_of_watch_samples only if stopped by the detector)
 
 
 
 ############################################# Wrapper level 2 (Collect waveforms data based off user specified names)
-# TODO: need to make this globally shared between the simulation and the GUI.
-_Unit_Watch_Mapping = [
-    '[rad]=ACM.theta_d',
-    '[rad/s]=ACM.omega_r_mech',
-    '[Wb]=ACM.KA',
-    '[A]=ACM.iD',
-    '[A]=ACM.iQ',
-    '[Nm]=ACM.Tem',
-    '[A]=CTRL.iab[0]',
-    '[A]=CTRL.iab[1]',
-    '[A]=CTRL.idq[0]',
-    '[A]=CTRL.idq[1]',
-    '[rad]=CTRL.theta_d',
-    '[rpm]=CTRL.omega_r_mech',
-    '[rpm]=CTRL.cmd_rpm',
-    '[A]=CTRL.cmd_idq[0]',
-    '[A]=CTRL.cmd_idq[1]',
-    '[rad]=CTRL.xS[0]',  # theta_d
-    '[rpm]=CTRL.xS[1]',  # omega_r_elec
-    '[Nm]=CTRL.xS[2]',   # -TL
-    '[Nm/s]=CTRL.xS[3]', # DL
-    '[Wb]=CTRL.KA',
-    '[Wb]=CTRL.KE',
-    '[Wb]=CTRL.xT[0]', # stator flux[0]
-    '[Wb]=CTRL.xT[1]', # stator flux[1]
-    '[V]=CTRL.xT[2]', # I term
-    '[V]=CTRL.xT[3]', # I term
-    '[Wb]=CTRL.active_flux[0]', # active flux[0]
-    '[Wb]=CTRL.active_flux[1]', # active flux[1]
-    '[Nm]=CTRL.Tem',
-    '[V]=CTRL.cmd_uab[0]',
-    '[V]=CTRL.cmd_uab[1]',
-    '[1]=svgen1.S1',
-    '[1]=svgen1.S2',
-    '[1]=svgen1.S3',
-    '[1]=svgen1.S4',
-    '[1]=svgen1.S5',
-    '[1]=svgen1.S6',
-    '[V]=ACM.udq[0]',
-    '[V]=ACM.udq[1]',
-    '[V]=CTRL.cmd_udq[0]',
-    '[V]=CTRL.cmd_udq[1]',
-    '[A]=reg_speed.OutLimit',
-    '[Nm]=ACM.TLoad',
-    '[rad/s]=CTRL.omega_syn',
-    '[V]=CTRL.cmd_uMT[0]',
-    '[V]=CTRL.cmd_uMT[1]',
-    '[A]=CTRL.cmd_iMT[1]',
-    '[A]=CTRL.iMT[1]',
-    '[Wb]=CTRL.cmd_psi_Ms',
-    '[Wb]=CTRL.psi_stator_MT_fb[0]',
-    '[rad/s]=CTRL.omega_slip',
-    '[A]=CTRL.iMT[0]',
-]
+try:
+    from .watch_mapping import _Unit_Watch_Mapping # imported as simulation.tutorials_ep8_SFOC_Dynamic (by the GUI)
+except ImportError:
+    from watch_mapping import _Unit_Watch_Mapping
 Watch_Mapping = [el[el.find('=')+1:] for el in _Unit_Watch_Mapping] # remove units before "="
 
-def ACMSimPyWrapper(numba__scope_dict, *arg, **kwarg):
+# functions allowed in the expressions of numba__scope_dict, e.g., 'sqrt(CTRL.iab[0]**2 + CTRL.iab[1]**2)'
+_SCOPE_FUNCTIONS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'sin': np.sin,
+    'cos': np.cos,
+    'arctan2': np.arctan2,
+    'hypot': np.hypot,
+}
+_DERIVED_FUNCTIONS = {'abs': DERIVED_ABS, 'sqrt': DERIVED_SQRT, 'sin': DERIVED_SIN, 'cos': DERIVED_COS, 'arctan2': DERIVED_ARCTAN2, 'hypot': DERIVED_HYPOT}
+_DERIVED_OPERATORS = {ast.Add: DERIVED_ADD, ast.Sub: DERIVED_SUB, ast.Mult: DERIVED_MUL, ast.Div: DERIVED_DIV, ast.Pow: DERIVED_POW, ast.USub: DERIVED_NEG}
+
+class Scope_Expression_Compiler(ast.NodeTransformer):
+    """ Replace each signal of an expression (e.g., CTRL.xS[1]) by a row of the recorded data, and reject anything but simple math. """
+    _ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.UAdd, ast.USub)
+
+    def __init__(self, key, expression, watch_names):
+        self.key = key
+        self.expression = expression
+        self.watch_names = watch_names # shared by all expressions of a numba__scope_dict, new signals are appended
+
+    def get_error(self, message):
+        return Exception(f'{message} in "{self.expression}" of numba__scope_dict (key: {self.key}).')
+
+    def visit_signal(self, node):
+        name = ast.unparse(node) # the same spelling as in Watch_Mapping, regardless of the white spaces of the user input
+        if name not in Watch_Mapping:
+            raise self.get_error(f'Unknown signal "{name}"' + ' (see _Unit_Watch_Mapping for available signals)')
+        if name not in self.watch_names:
+            self.watch_names.append(name)
+        row = ast.Subscript(value=ast.Name(id='_rows', ctx=ast.Load()), slice=ast.Constant(value=self.watch_names.index(name)), ctx=ast.Load())
+        return ast.copy_location(row, node)
+    visit_Attribute = visit_signal
+    visit_Subscript = visit_signal
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _SCOPE_FUNCTIONS or node.keywords:
+            raise self.get_error(f'Unsupported function call "{ast.unparse(node)}"' + f' (available: {", ".join(_SCOPE_FUNCTIONS)})')
+        if len(node.args) != (2 if node.func.id in ('arctan2', 'hypot') else 1):
+            raise self.get_error(f'Wrong number of arguments to "{node.func.id}"')
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def generic_visit(self, node):
+        if not isinstance(node, self._ALLOWED_NODES) \
+            or isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise self.get_error(f'Unsupported syntax "{ast.unparse(node) if isinstance(node, ast.expr) else type(node).__name__}"')
+        return super().generic_visit(node)
+
+    def parse(self):
+        try:
+            tree = ast.parse(self.expression.strip(), mode='eval')
+        except SyntaxError as err:
+            raise self.get_error(f'Invalid syntax ({err.msg})') from None
+        return self.visit(tree).body
+
+    def compile(self):
+        """ Return a vectorized function of the recorded rows, e.g., 'CTRL.cmd_rpm - CTRL.omega_r_mech' -> lambda _rows: _rows[0] - _rows[1] """
+        function = ast.Expression(body=ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='_rows')], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=self.parse()))
+        ast.fix_missing_locations(function)
+        return eval(compile(function, f'<numba__scope_dict: {self.expression}>', 'eval'), {'__builtins__': {}, **_SCOPE_FUNCTIONS})
+
+    def compile_program(self, constants):
+        """ Return the postfix program for derived_signal(), e.g., 'CTRL.cmd_rpm - CTRL.omega_r_mech' -> [(DERIVED_SIGNAL, 12), (DERIVED_SIGNAL, 11), (DERIVED_SUB, 0)].
+            The constants are appended to the given list. """
+        program = []
+        def emit(node):
+            if isinstance(node, ast.Subscript): # _rows[k]
+                program.append((DERIVED_SIGNAL, Watch_Mapping.index(self.watch_names[node.slice.value])))
+            elif isinstance(node, ast.Constant):
+                constants.append(float(node.value))
+                program.append((DERIVED_CONSTANT, len(constants)-1))
+            elif isinstance(node, ast.BinOp):
+                emit(node.left)
+                emit(node.right)
+                program.append((_DERIVED_OPERATORS[type(node.op)], 0))
+            elif isinstance(node, ast.UnaryOp):
+                emit(node.operand)
+                if isinstance(node.op, ast.USub):
+                    program.append((DERIVED_NEG, 0))
+            elif isinstance(node, ast.Call):
+                for arg in node.args:
+                    emit(arg)
+                program.append((_DERIVED_FUNCTIONS[node.func.id], 0))
+        emit(self.parse())
+        return program
+
+class Compiled_Scope_Dict:
+    """ The expressions of numba__scope_dict parsed once: the rows to record and one vectorized function of the recorded rows per trace.
+        With bool_derived_channels, an expression that is not a single signal is recorded as a derived channel (evaluated by ACMSimPyIncremental),
+        so that only its result is stored; otherwise its signals are recorded and the expression is evaluated over the rows afterwards. """
+    def __init__(self, numba__scope_dict, bool_derived_channels=True):
+        self.watch_names = [] # signals recorded as watch_channels
+        derived_names = []
+        programs = []
+        constants = []
+        rows = dict() # key -> list of (bool_derived, index) of the traces
+        self.functions = dict() # key -> list of functions of the recorded rows
+        for key, expressions in numba__scope_dict.items():
+            if isinstance(expressions, str):
+                raise Exception('Invalid numba__scope_dict, make sure it is a dict of tuples of strings.')
+            if not bool_derived_channels:
+                self.functions[key] = [Scope_Expression_Compiler(key, expression, self.watch_names).compile() for expression in expressions]
+                continue
+            rows[key] = []
+            for expression in expressions:
+                program = Scope_Expression_Compiler(key, expression, []).compile_program(constants)
+                if len(program) == 1 and program[0][0] == DERIVED_SIGNAL:
+                    name = Watch_Mapping[program[0][1]]
+                    if name not in self.watch_names:
+                        self.watch_names.append(name)
+                    rows[key].append((False, self.watch_names.index(name)))
+                else:
+                    derived_names.append(expression)
+                    programs.append(program)
+                    rows[key].append((True, len(programs)-1))
+        self.watch_channels = np.array([Watch_Mapping.index(name) for name in self.watch_names], dtype=np.int64)
+
+        # derived channels as [opcode, argument, opcode, argument, ...] per row, padded with DERIVED_END
+        self.derived_programs = np.zeros((len(programs), 2*max([len(program) for program in programs], default=1)), dtype=np.int64)
+        for k, program in enumerate(programs):
+            self.derived_programs[k, :2*len(program)] = np.array(program, dtype=np.int64).ravel()
+        self.derived_constants = np.array(constants, dtype=np.float64)
+        if bool_derived_channels:
+            N = len(self.watch_names)
+            for key, list_of_rows in rows.items():
+                self.functions[key] = [get_row_function(N+index if bool_derived else index) for bool_derived, index in list_of_rows]
+        self.row_names = self.watch_names + derived_names # the rows of watch_data
+
+    def evaluate(self, key, rows):
+        waveforms = []
+        for function in self.functions[key]:
+            waveform = function(rows)
+            if np.ndim(waveform) == 0: # an expression without signals, e.g., '0'
+                waveform = np.full(rows.shape[1], float(waveform))
+            waveforms.append(waveform)
+        return waveforms
+
+def get_row_function(index):
+    return lambda _rows: _rows[index]
+
+_compiled_scope_dicts = dict()
+def compile_scope_dict(numba__scope_dict, bool_derived_channels=True):
+    """ Parse and validate numba__scope_dict (raises for an unknown signal or unsupported syntax), cached by its content. """
+    cache_key = (bool_derived_channels,) + tuple((key, tuple(expressions) if not isinstance(expressions, str) else expressions) for key, expressions in numba__scope_dict.items())
+    if cache_key not in _compiled_scope_dicts:
+        _compiled_scope_dicts[cache_key] = Compiled_Scope_Dict(numba__scope_dict, bool_derived_channels)
+    return _compiled_scope_dicts[cache_key]
+
+def get_watch_channels(numba__scope_dict, bool_derived_channels=True):
+    """ Collect the signals referred by numba__scope_dict, so that only those rows are recorded by ACMSimPyIncremental.
+        Return the watch_channels and the names of all recorded rows (the derived channels, if any, come last). """
+    compiled = compile_scope_dict(numba__scope_dict, bool_derived_channels)
+    return compiled.watch_channels, compiled.row_names
+
+def get_derived_channels(numba__scope_dict, bool_derived_channels=True):
+    """ The derived_programs and derived_constants of ACMSimPyIncremental for numba__scope_dict (no rows if not bool_derived_channels). """
+    compiled = compile_scope_dict(numba__scope_dict, bool_derived_channels)
+    return compiled.derived_programs, compiled.derived_constants
+
+def get_watch_settings(d):
+    """ Read the (optional) recording mode from the user input dict, e.g., 'WATCH_MODE': 'envelope', 'WATCH_DECIMATION': 50. """
+    watch_mode = _WATCH_MODES[d.get('WATCH_MODE', 'decimate')]
+    watch_decimation = int(d.get('WATCH_DECIMATION', 1))
+    if watch_mode == WATCH_MODE_CONTROL_PERIOD:
+        watch_decimation = d['MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD']
+    if watch_decimation < 1:
+        raise Exception('WATCH_DECIMATION must be a positive integer.')
+    return watch_mode, watch_decimation
+
+def get_inverter_model(d):
+    """ Read the (optional) inverter model from the user input dict, e.g., 'INVERTER_MODEL': 'event'. """
+    return _INVERTER_MODELS[d.get('INVERTER_MODEL', 'tick')]
+
+def get_machine_integrator(d):
+    """ Read the (optional) machine integrator from the user input dict, e.g., 'MACHINE_INTEGRATOR': 'dopri5', 'MACHINE_RTOL': 1e-6, 'MACHINE_ATOL': 1e-6,
+        or 'MACHINE_INTEGRATOR': 'zoh', 'MACHINE_ZOH_TOLERANCE': 1e-3. """
+    return _INTEGRATORS[d.get('MACHINE_INTEGRATOR', 'rk4')], d.get('MACHINE_RTOL', 1e-6), d.get('MACHINE_ATOL', 1e-6), d.get('MACHINE_ZOH_TOLERANCE', 1e-3)
+
+def get_command_timeline(d):
+    """ Compile the (optional) stimulus of the user input dict into a The_Command_Timeline, e.g.,
+        'COMMAND_TIMELINE': [(0.0, 'CTRL.cmd_rpm', 50), (0.2, 'ACM.TLoad', 5), (1.0, 'CTRL.cmd_rpm', -50, 0.1)],
+        where each event is (time [s], target, value) or (time [s], target, value, ramp duration [s]). See _COMMAND_TARGETS for the targets. """
+    events = []
+    for event in d.get('COMMAND_TIMELINE', []):
+        if len(event) not in (3, 4):
+            raise Exception(f'Invalid event {event} in COMMAND_TIMELINE, make sure it is (time, target, value) or (time, target, value, ramp duration).')
+        if event[1] not in _COMMAND_TARGETS:
+            raise Exception(f'Unknown target "{event[1]}" in COMMAND_TIMELINE. Available targets: {", ".join(_COMMAND_TARGETS)}.')
+        ramp = event[3] if len(event) == 4 else 0.0
+        if ramp < 0:
+            raise Exception(f'Negative ramp duration in COMMAND_TIMELINE event {event}.')
+        events.append((float(event[0]), _COMMAND_TARGETS[event[1]], float(event[2]), float(ramp)))
+    events.sort(key=lambda event: event[0]) # stable, so the events at the same time are applied in the given order
+    return The_Command_Timeline(np.array([event[0] for event in events], dtype=np.float64),
+                                np.array([event[1] for event in events], dtype=np.int64),
+                                np.array([event[2] for event in events], dtype=np.float64),
+                                np.array([event[3] for event in events], dtype=np.float64))
+
+class Command_Mailbox:
+    """ Live writes into a running ACMSimPyIncremental (pass mailbox.array as its mailbox argument), e.g., from the console while the GUI simulates:
+            mailbox.write('CTRL.cmd_rpm', 500)
+            mailbox.write_dict({'reg_speed.Kp': 0.8, 'ACM.TLoad': 2.0})
+        The writes are applied at the next controller execution, so the slices can be long without delaying the commands.
+        Each write is applied once, in order, and the writes of one write_dict() are applied at the same controller execution. """
+    def __init__(self):
+        self.array = np.zeros(MAILBOX_WRITES + 2*MAILBOX_CAPACITY)
+        self.lock = threading.Lock() # between writers, ACMSimPyIncremental only reads (and counts the applied writes)
+
+    def write(self, target, value):
+        self.write_dict({target: value})
+
+    def write_dict(self, writes):
+        for target in writes:
+            if target not in _COMMAND_TARGETS:
+                raise Exception(f'Unknown target "{target}" for Command_Mailbox. Available targets: {", ".join(_COMMAND_TARGETS)}.')
+        with self.lock:
+            array = self.array
+            number_of_writes = int(array[MAILBOX_NUMBER_OF_WRITES])
+            if number_of_writes - int(array[MAILBOX_NUMBER_OF_APPLIED_WRITES]) + len(writes) > MAILBOX_CAPACITY:
+                raise Exception(f'Command_Mailbox is full ({MAILBOX_CAPACITY} writes not applied yet), is the simulation running?')
+            for target, value in writes.items():
+                index = MAILBOX_WRITES + 2*(number_of_writes % MAILBOX_CAPACITY)
+                array[index]   = _COMMAND_TARGETS[target]
+                array[index+1] = value
+                number_of_writes += 1
+            array[MAILBOX_NUMBER_OF_WRITES] = number_of_writes # publish the batch
+
+    def is_applied(self):
+        return self.array[MAILBOX_NUMBER_OF_WRITES] == self.array[MAILBOX_NUMBER_OF_APPLIED_WRITES]
+
+def get_steady_state_detector(d):
+    """ Read the (optional) steady-state detector from the user input dict, e.g., 'STEADY_STATE_TIME': 0.05 (disabled without it),
+        'STEADY_STATE_TOLERANCE': (1.0, 0.05, 0.05, 0.01) as the peak-to-peak bands of (speed [rpm], iD [A], iQ [A], Tem [Nm]),
+        'STEADY_STATE_WINDOW': 0.01 to test the means over blocks of 10 ms rather than every control period (for the PWM ripple),
+        'STEADY_STATE_STOP': True (stop the simulation once the steady state is detected, otherwise it is only reported). """
+    tolerance = np.array(d.get('STEADY_STATE_TOLERANCE', (1.0, 0.05, 0.05, 0.01)), dtype=np.float64)
+    if tolerance.shape != (len(STEADY_STATE_SIGNAL_NAMES),):
+        raise Exception(f'STEADY_STATE_TOLERANCE must have {len(STEADY_STATE_SIGNAL_NAMES)} values for {STEADY_STATE_SIGNAL_NAMES}.')
+    return The_Steady_State_Detector(float(d.get('STEADY_STATE_TIME', 0.0)), float(d.get('STEADY_STATE_WINDOW', 0.0)), tolerance, bool(d.get('STEADY_STATE_STOP', True)))
+
+def get_steady_state_report(detector, start_time=0.0):
+    """ The detected steady state, or None: the time of detection, the time it took to settle from start_time, and the mean values over the settled window. """
+    if not detector.bool_steady:
+        return None
+    return {'time': detector.steady_time,
+            'settling_time': detector.window_start_time - start_time,
+            'values': dict(zip(STEADY_STATE_SIGNAL_NAMES, detector.values.tolist()))}
+
+def get_number_of_watch_samples_of_slices(d, start_time=0.0):
+    """ Number of samples recorded by Simulation_Benchmark.start_simulation_slices() for the user input dict d (from start_time, see its snapshot). """
+    watch_mode, watch_decimation = get_watch_settings(d)
+    MACHINE_TS = d['CL_TS'] / d['MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD']
+    if watch_mode == WATCH_MODE_CONTROL_PERIOD:
+        watch_decimation = int(d['CL_TS'] / MACHINE_TS) # same as in ACMSimPyIncremental
+    number_of_steps = get_step_index(d['TIME_SLICE'], MACHINE_TS)
+    number_of_watch_samples = 0
+    for ii in range(d['NUMBER_OF_SLICES']):
+        number_of_watch_samples += get_number_of_watch_samples(get_step_index(start_time + ii*d['TIME_SLICE'], MACHINE_TS), number_of_steps, watch_mode, watch_decimation)
+    return number_of_watch_samples
+
+def get_waveforms_dict(numba__scope_dict, watch_names, watch_data, numba__envelope_dict=None, bool_derived_channels=True):
+    """ Evaluate the expressions of numba__scope_dict over the recorded rows of watch_data (whose rows are watch_names, see get_watch_channels()).
+        If numba__envelope_dict is given, watch_data is assumed to be recorded with WATCH_MODE_ENVELOPE. """
+    compiled = compile_scope_dict(numba__scope_dict, bool_derived_channels)
+    N = len(watch_names)
+    rows = watch_data[:N] # for WATCH_MODE_ENVELOPE, this is the mean of each bucket
 
-    # Do Numerical Integrations (that do not care about numba__scope_dict at all and return watch_data whatsoever)
-    machine_times, watch_data = ACMSimPyIncremental(*arg, **kwarg)
+    # Post-processing
+    numba__waveforms_dict = dict()
+    for key in numba__scope_dict.keys():
+        # key = r'Error Speed [rpm]',
+        # expressions = ('CTRL.cmd_rpm-ACM.omega_r_mech', 'CTRL.idq[1]'),
+        numba__waveforms_dict[key] = compiled.evaluate(key, rows)
+        if numba__envelope_dict is not None:
+            # exact for a single signal and a derived channel; otherwise this is the expression of the extremes of each signal
+            numba__envelope_dict[key] = list(zip(compiled.evaluate(key, watch_data[N:2*N]), compiled.evaluate(key, watch_data[2*N:3*N])))
+    return numba__waveforms_dict
+
+def ACMSimPyWrapper(numba__scope_dict, *arg, numba__envelope_dict=None, **kwarg):
+
+    # Do Numerical Integrations (only the signals and derived channels needed by numba__scope_dict are recorded into watch_data)
+    watch_channels, watch_names = get_watch_channels(numba__scope_dict)
+    derived_programs, derived_constants = get_derived_channels(numba__scope_dict)
+    machine_times, watch_data = ACMSimPyIncremental(*arg, watch_channels=watch_channels, derived_programs=derived_programs, derived_constants=derived_constants, **kwarg)
     # print(f'{len(watch_data[0])=}。 end_time', machine_times[-1])
-    watch_data_as_dict = dict(zip(Watch_Mapping, watch_data))
-    # print(watch_data_as_dict.keys())
 
     # Post-processing
-    numba__waveforms_dict = dict()
-    if True:
-        # option 1 (with exec)
-        for key, expressions in numba__scope_dict.items():
-            # key = r'Error Speed [rpm]',
-            # expressions = ('CTRL.cmd_rpm-ACM.omega_r_mech', 'CTRL.idq[1]'),
-            waveforms = []
-            for expression in expressions:
-                # expression = 'CTRL.cmd_rpm-ACM.omega_r_mech'
-                translated_expression = ''
-                for word in expression.split():
-                    if 'CTRL' in word or 'ACM' in word or 'reg_' in word or 'svgen1' in word: # 这里逻辑有点怪，每增加一个新的结构体（比如svgen1）都要在修改这一行？
-                        translated_expression += f'watch_data_as_dict["{word}"]'
-                    else:
-                        translated_expression += word
-                # print('DEBUG', translated_expression)
-                waveforms.append(eval(translated_expression))
-            numba__waveforms_dict[key] = waveforms
-        # for key, val in numba__waveforms_dict.items():
-        #     print(key, len(val), len(val[0]))
-        # quit()
-    else:
-        # option 2 (without using exec)
-        for key, values in numba__scope_dict.items():
-            # key = '$\alpha\beta$ current [A]'
-            # values = ('CTRL.iab', 'CTRL.idq[1]'),
-            waveforms = []
-            for val in values:
-                # val = 'CTRL.iab'
-                for index, mapping in enumerate(Watch_Mapping):
-                    # 'CTRL.iab' in '[A]=CTRL.iab[0]'
-                    # 'CTRL.iab' in '[A]=CTRL.iab[1]'
-                    if val in mapping:
-                        waveforms.append(watch_data[index])
-                        # print('\t', key, val, 'in', mapping)
-                        if len(val) == 1:
-                            raise Exception('Invalid numba__scope_dict, make sure it is a dict of tuples of strings.')
-
-            numba__waveforms_dict[key] = waveforms
-    # quit()
+    if kwarg.get('watch_mode', WATCH_MODE_DECIMATE) != WATCH_MODE_ENVELOPE:
+        numba__envelope_dict = None
+    numba__waveforms_dict = get_waveforms_dict(numba__scope_dict, watch_names, watch_data, numba__envelope_dict)
     return machine_times, numba__waveforms_dict
 
+def get_jit_cache_stats():
+    """ Numbers of (signatures loaded from, signatures compiled and saved to) the on-disk cache by the kernels of this module with cache=True.
+        The kernels with jitclass arguments cannot be cached, as numba keys them by a jitclass type that is new in every process. """
+    hits = misses = 0
+    for obj in list(globals().values()):
+        stats = getattr(obj, 'stats', None)
+        if getattr(stats, 'cache_path', None) is not None:
+            hits += sum(stats.cache_hits.values())
+            misses += sum(stats.cache_misses.values())
+    return hits, misses
+
+def warm_up(d, numba__scope_dict, tuner=None, CTRL_execute_codes=''):
+    """ Compile ACMSimPyIncremental for the arguments that the frontends pass to ACMSimPyWrapper() (fresh objects of d, a timeline and a mailbox)
+        by simulating one control period, e.g., on a background thread as soon as the window opens. Return a log line with the elapsed time. """
+    tic = time.perf_counter()
+    d = dict(d) # (the tuner writes the gains into d)
+    CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = Simulation_Benchmark(d, tuner=tuner, bool_start_simulation=False, CTRL_execute_codes=CTRL_execute_codes).get_global_objects()
+    watch_mode, watch_decimation = get_watch_settings(d)
+    ACMSimPyWrapper(numba__scope_dict, t0=0.0, TIME=CTRL.CL_TS, ACM=ACM, CTRL=CTRL, reg_id=reg_id, reg_iq=reg_iq, reg_speed=reg_speed, svgen1=svgen1,
+                    timeline=get_command_timeline(d), mailbox=Command_Mailbox().array, watch_mode=watch_mode, watch_decimation=watch_decimation)
+    hits, misses = get_jit_cache_stats()
+    return f'JIT warm-up in {time.perf_counter()-tic:.1f} s ({hits} kernels loaded from the disk cache, {misses} compiled)'
+
+
+
+############################################# Checkpoint (snapshots of the jitclass objects)
+SNAPSHOT_OBJECT_NAMES = ('CTRL', 'ACM', 'reg_id', 'reg_iq', 'reg_speed', 'reg_dispX', 'reg_dispY', 'svgen1') # the order of Simulation_Benchmark.get_global_objects()
+
+def get_state(obj):
+    """ Pack every spec field of a jitclass object into a structured array of shape () (the array fields are copied). """
+    names = list(obj._numba_type_.struct.keys())
+    values = [np.asarray(getattr(obj, name)) for name in names]
+    state = np.zeros((), dtype=np.dtype([(name, value.dtype, value.shape) for name, value in zip(names, values)]))
+    for name, value in zip(names, values):
+        state[name] = value
+    return state
+
+def set_state(obj, state):
+    """ Write a structured array from get_state() back into a jitclass object of the same class. """
+    for name in obj._numba_type_.struct.keys():
+        if name not in state.dtype.names:
+            raise Exception(f'Field "{name}" of {type(obj).__name__} is not in the snapshot.')
+        value = state[name]
+        member = getattr(obj, name)
+        if isinstance(member, np.ndarray):
+            if member.shape == value.shape:
+                member[...] = value # in place
+            else:
+                setattr(obj, name, np.array(value, dtype=member.dtype))
+        else:
+            setattr(obj, name, value.item())
+
+def save_snapshot(global_objects, time=0.0, timeline=None):
+    """ Snapshot of the simulation state at time [s]: a dict of structured arrays, one per object of get_global_objects() (and the timeline, if given). """
+    snapshot = {name: get_state(obj) for name, obj in zip(SNAPSHOT_OBJECT_NAMES, global_objects)}
+    if timeline is not None:
+        snapshot['timeline'] = get_state(timeline)
+    snapshot['time'] = np.array(time)
+    return snapshot
+
+def restore_snapshot(snapshot, global_objects, timeline=None):
+    """ Restore a snapshot into the objects of get_global_objects() (and the timeline, if given) and return its time [s]. """
+    for name, obj in zip(SNAPSHOT_OBJECT_NAMES, global_objects):
+        set_state(obj, snapshot[name])
+    if timeline is not None and 'timeline' in snapshot:
+        set_state(timeline, snapshot['timeline'])
+    return float(snapshot['time'])
+
+def parse_field(global_objects, name):
+    """ Resolve a field name such as 'ACM.TLoad' or 'CTRL.cmd_idq[0]' into (object, attribute, index or None). """
+    objects = dict(zip(SNAPSHOT_OBJECT_NAMES, global_objects))
+    match = re.fullmatch(r'(\w+)\.(\w+)(?:\[(\d+)\])?', name.replace(' ', ''))
+    if match is None or match[1] not in objects or match[2] not in objects[match[1]]._numba_type_.struct:
+        raise Exception(f'Unknown field "{name}", make sure it is like "ACM.TLoad" or "CTRL.cmd_idq[0]" of {", ".join(SNAPSHOT_OBJECT_NAMES)}.')
+    return objects[match[1]], match[2], None if match[3] is None else int(match[3])
+
+def set_fields(global_objects, fields):
+    """ Write fields such as {'ACM.TLoad': 5.0, 'reg_speed.Kp': 0.8, 'CTRL.cmd_idq[0]': 1.0} into the objects of get_global_objects(). """
+    for name, value in fields.items():
+        obj, attribute, index = parse_field(global_objects, name)
+        if index is None:
+            setattr(obj, attribute, value)
+        else:
+            getattr(obj, attribute)[index] = value
+
+def get_fields(global_objects, names):
+    """ Read fields such as ['ACM.x[3]', 'reg_iq.integrator'] from the objects of get_global_objects() into a float array. """
+    values = np.zeros(len(names))
+    for k, name in enumerate(names):
+        obj, attribute, index = parse_field(global_objects, name)
+        values[k] = getattr(obj, attribute) if index is None else getattr(obj, attribute)[index]
+    return values
+
+def write_snapshot(file, snapshot):
+    np.savez(file, **snapshot)
+
+def read_snapshot(file):
+    with np.load(file) as data:
+        return {name: data[name] for name in data.files}
+
 
 
 ############################################# Wrapper level 3 (User Interface)
@@ -1520,6 +2674,9 @@ class Simulation_Benchmark:
         CTRL.omega_syn = 50
 
         ACM       = The_AC_Machine(CTRL, MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD=d['MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD'])
+        ACM.integrator, ACM.rtol, ACM.atol, ACM.zoh_tolerance = get_machine_integrator(d)
+
+        svgen1    = SVgen_Object(CPU_TICK_PER_SAMPLING_PERIOD=d['MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD'], Vdc=d['DC_BUS_VOLTAGE'], inverter_model=get_inverter_model(d))
 
         reg_dispX = The_PID_Regulator(d['disp.Kp'], d['disp.Ki'], d['disp.Kd'], d['disp.tau'], d['disp.OutLimit'], d['disp.IntLimit'], d['CL_TS'])
         reg_dispY = The_PID_Regulator(d['disp.Kp'], d['disp.Ki'], d['disp.Kd'], d['disp.tau'], d['disp.OutLimit'], d['disp.IntLimit'], d['CL_TS'])
@@ -1557,12 +2714,23 @@ class Simulation_Benchmark:
         exec(self.CTRL_execute_codes)
         print(CTRL.cmd_psi_Ms)
 
-        return CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY
+        return CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1
 
-    def start_simulation_slices(self, d, numba__scope_dict):
+    def start_simulation_slices(self, d, numba__scope_dict, snapshot=None, fields=None, steady_state_callback=None):
+        # With STEADY_STATE_TIME in d (see get_steady_state_detector()), self.steady_state reports the detected steady state (or None),
+        # steady_state_callback(self.steady_state) is called at the end of the slice of detection, and with STEADY_STATE_STOP the simulation stops there.
+        # With a snapshot (see get_snapshot()), the slices continue from its state and time, e.g., to branch experiments from a warmed-up drive.
+        # Its command timeline continues too, unless d has its own COMMAND_TIMELINE (whose events before the snapshot time are applied at once).
+        # fields (see set_fields()) are written after the snapshot is restored, e.g., {'ACM.TLoad': 5.0}.
 
         global_objects = self.get_global_objects()
-        self.CTRL, self.ACM, self.reg_id, self.reg_iq, self.reg_speed, self.reg_dispX, self.reg_dispY = CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY = global_objects
+        self.CTRL, self.ACM, self.reg_id, self.reg_iq, self.reg_speed, self.reg_dispX, self.reg_dispY, self.svgen1 = CTRL, ACM, reg_id, reg_iq, reg_speed, reg_dispX, reg_dispY, svgen1 = global_objects
+        self.timeline = timeline = get_command_timeline(d)
+        start_time = 0.0
+        if snapshot is not None:
+            start_time = restore_snapshot(snapshot, global_objects, timeline if 'COMMAND_TIMELINE' not in d else None)
+        if fields is not None:
+            set_fields(global_objects, fields)
 
         global_trace_names = []
         max_number_of_traces = 0
@@ -1573,42 +2741,82 @@ class Simulation_Benchmark:
                 global_trace_names.append(name)
         print(f'\t{max_number_of_traces=}')
 
-        # init global data arrays for plotting
-        global_arrays = [None] * max_number_of_traces
-        global_machine_times = None
-
-        def save_to_global(_global, _local):
-            return _local if _global is None else np.append(_global, _local)
+        # init global data arrays for plotting (preallocated for all slices, each slice writes its samples at an offset)
+        watch_mode, watch_decimation = get_watch_settings(d)
+        watch_channels, watch_names = get_watch_channels(numba__scope_dict)
+        derived_programs, derived_constants = get_derived_channels(numba__scope_dict)
+        MACHINE_TS = CTRL.CL_TS / ACM.MACHINE_SIMULATIONs_PER_SAMPLING_PERIOD
+        if watch_mode == WATCH_MODE_CONTROL_PERIOD:
+            watch_decimation = int(CTRL.CL_TS / MACHINE_TS) # same as in ACMSimPyIncremental
+        number_of_watch_samples = get_number_of_watch_samples_of_slices(d, start_time)
+        number_of_watch_rows = 3*len(watch_names) if watch_mode == WATCH_MODE_ENVELOPE else len(watch_names)
+        global_machine_times = np.zeros(number_of_watch_samples)
+        global_watch_data = np.zeros((number_of_watch_rows, number_of_watch_samples))
+        offset = 0
+        self.detector = detector = get_steady_state_detector(d)
+        self.steady_state = None
 
         # simulate to generate NUMBER_OF_SLICES*TIME_SLICE sec of data
         for ii in range(d['NUMBER_OF_SLICES']):
 
-            exec(d['user_system_input_code']) # 和 CONSOLE.user_controller_commands 功能相同
+            exec(d.get('user_system_input_code', '')) # 和 CONSOLE.user_controller_commands 功能相同 (only at slice boundaries, see COMMAND_TIMELINE for sample-accurate commands)
             # if ii < 5:
             #     CTRL.cmd_rpm = 50
             # else:
             #     ACM.TLoad = 5
 
-            # perform animation step
-            machine_times, numba__waveforms_dict = \
-                ACMSimPyWrapper(numba__scope_dict,
-                            t0=ii*d['TIME_SLICE'], TIME=d['TIME_SLICE'], 
+            # perform animation step and write slice data into the global data arrays
+            machine_times, watch_data = \
+                ACMSimPyIncremental(t0=start_time + ii*d['TIME_SLICE'], TIME=d['TIME_SLICE'], 
                             ACM=ACM,
                             CTRL=CTRL,
                             reg_id=reg_id,
                             reg_iq=reg_iq,
-                            reg_speed=reg_speed)
-
-            # and save slice data to global data variables
-            global_machine_times = save_to_global(global_machine_times, machine_times)
-            global_index = 0
-            for ylabel in numba__scope_dict.keys():
-                for trace_index, local_trace_data in enumerate(numba__waveforms_dict[ylabel]):
-                    # trace data
-                    global_arrays[global_index] = save_to_global(global_arrays[global_index], local_trace_data)
-
-                    # next
-                    global_index += 1
+                            reg_speed=reg_speed,
+                            svgen1=svgen1,
+                            timeline=timeline,
+                            watch_channels=watch_channels,
+                            derived_programs=derived_programs,
+                            derived_constants=derived_constants,
+                            watch_mode=watch_mode,
+                            watch_decimation=watch_decimation,
+                            out_times=global_machine_times,
+                            out_data=global_watch_data,
+                            out_offset=offset,
+                            detector=detector)
+            offset += len(machine_times)
+
+            if detector.bool_steady and self.steady_state is None:
+                self.steady_state = get_steady_state_report(detector, start_time)
+                print(f'\tSteady state at {self.steady_state["time"]:g} s (settled in {self.steady_state["settling_time"]:g} s): {self.steady_state["values"]}')
+                if steady_state_callback is not None:
+                    steady_state_callback(self.steady_state)
+                if detector.bool_stop:
+                    break
+        if detector.bool_steady and detector.bool_stop:
+            self.end_time = detector.steady_time + MACHINE_TS # the next step to simulate, as for get_snapshot()
+            global_machine_times = global_machine_times[:offset]
+            global_watch_data = global_watch_data[:, :offset]
+        else:
+            self.end_time = start_time + d['NUMBER_OF_SLICES']*d['TIME_SLICE']
+
+        if ACM.integrator == INTEGRATOR_DOPRI5:
+            print(f'\t{ACM.number_of_accepted_steps=}, {ACM.number_of_rejected_steps=}')
+        elif ACM.integrator == INTEGRATOR_ZOH:
+            print(f'\t{ACM.number_of_zoh_updates=}')
+
+        # evaluate the scope expressions once for the whole run
+        numba__envelope_dict = dict() if watch_mode == WATCH_MODE_ENVELOPE else None
+        numba__waveforms_dict = get_waveforms_dict(numba__scope_dict, watch_names, global_watch_data, numba__envelope_dict)
+        global_arrays = []
+        global_min_arrays = []
+        global_max_arrays = []
+        for ylabel in numba__scope_dict.keys():
+            for trace_index, trace_data in enumerate(numba__waveforms_dict[ylabel]):
+                global_arrays.append(trace_data)
+                if numba__envelope_dict is not None:
+                    global_min_arrays.append(numba__envelope_dict[ylabel][trace_index][0])
+                    global_max_arrays.append(numba__envelope_dict[ylabel][trace_index][1])
 
         # map global data to global names
         gdd = global_data_dict = OD()
@@ -1620,6 +2828,22 @@ class Simulation_Benchmark:
         self.global_machine_times = global_machine_times
         self.gdd = gdd
 
+        # envelopes (only for WATCH_MODE_ENVELOPE)
+        self.gdd_min = OD(zip(global_trace_names, global_min_arrays)) if numba__envelope_dict is not None else None
+        self.gdd_max = OD(zip(global_trace_names, global_max_arrays)) if numba__envelope_dict is not None else None
+
+    def get_snapshot(self):
+        """ Snapshot of the state at the end of start_simulation_slices() (see save_snapshot() and write_snapshot()). """
+        return save_snapshot((self.CTRL, self.ACM, self.reg_id, self.reg_iq, self.reg_speed, self.reg_dispX, self.reg_dispY, self.svgen1), self.end_time, self.timeline)
+
+    def clone_global_objects(self, snapshot=None):
+        """ New objects of get_global_objects() in the state of snapshot (by default, the present state), e.g., to start an experiment from a warmed-up drive. """
+        if snapshot is None:
+            snapshot = self.get_snapshot()
+        global_objects = self.get_global_objects()
+        restore_snapshot(snapshot, global_objects)
+        return global_objects
+
 def lpf1_inverter(array):
     y_tminus1 = 0.0
     new_array = []
@@ -1630,6 +2854,8 @@ def lpf1_inverter(array):
     return new_array
 
 if __name__ == '__main__':
+    from pylab import plt, mpl
+    plt.style.use('ggplot')
     # User input:
     d = d_user_input_motor_dict = {
         # Timing
@@ -1660,7 +2886,8 @@ if __name__ == '__main__':
         # 'init_Js': 0.44*1e-4,
         ##########################
         'DC_BUS_VOLTAGE': 48,
-        'user_system_input_code': '''if ii < 1: CTRL.cmd_idq[0] = 0.0; CTRL.cmd_rpm = 50 \nelif ii <5: ACM.TLoad = 5 \nelif ii <100: CTRL.cmd_rpm = -50''',
+        # 'user_system_input_code': '''if ii < 1: CTRL.cmd_idq[0] = 0.0; CTRL.cmd_rpm = 50 \nelif ii <5: ACM.TLoad = 5 \nelif ii <100: CTRL.cmd_rpm = -50''',
+        'COMMAND_TIMELINE': [(0.0, 'CTRL.cmd_idq[0]', 0.0), (0.0, 'CTRL.cmd_rpm', 50), (0.2, 'ACM.TLoad', 5), (1.0, 'CTRL.cmd_rpm', -50)], # the same as the user_system_input_code above
         # Controller config
         'CTRL.bool_apply_speed_closed_loop_control': True,
         'CTRL.bool_apply_decoupling_voltages_to_current_regulation': False,
@@ -1770,15 +2997,15 @@ if __name__ == '__main__':
     # plt.show()
 
 #%%
-
-CTRL_execute_codes = '''
+if __name__ == '__main__':
+    CTRL_execute_codes = '''
 CTRL.kPFL = 20
 CTRL.kPCL = 600
 reg_speed.Kp = 0.7
 reg_speed.Ki = 20
 CTRL.cmd_psi_Ms = 0.9
 '''
-CTRL_execute_codes = '''
+    CTRL_execute_codes = '''
 CTRL.kPFL = 0
 CTRL.kPCL = 300
 reg_speed.Kp = 0.5
@@ -1786,7 +3013,7 @@ reg_speed.Ki = 20
 CTRL.cmd_psi_Ms = 0.0125
 '''
 
-sim1 = Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes); gdd, global_machine_times = sim1.gdd, sim1.global_machine_times; fig = 图1画图代码(); # fig.savefig(f'SliceFSPM-fig-{图}.pdf', dpi=400, bbox_inches='tight', pad_inches=0)
-plt.show()
+    sim1 = Simulation_Benchmark(d, CTRL_execute_codes=CTRL_execute_codes); gdd, global_machine_times = sim1.gdd, sim1.global_machine_times; fig = 图1画图代码(); # fig.savefig(f'SliceFSPM-fig-{图}.pdf', dpi=400, bbox_inches='tight', pad_inches=0)
+    plt.show()
 
 # %%
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+''' The signals that can be watched in tutorials_ep8_SFOC_Dynamic.py (see watch_signal() there), shared with the GUI
+
+    Kept apart from the simulation, so that the GUI can list them without importing numba.
+'''
+_Unit_Watch_Mapping = [
+    '[rad]=ACM.theta_d',
+    '[rad/s]=ACM.omega_r_mech',
+    '[Wb]=ACM.KA',
+    '[A]=ACM.iD',
+    '[A]=ACM.iQ',
+    '[Nm]=ACM.Tem',
+    '[A]=CTRL.iab[0]',
+    '[A]=CTRL.iab[1]',
+    '[A]=CTRL.idq[0]',
+    '[A]=CTRL.idq[1]',
+    '[rad]=CTRL.theta_d',
+    '[rpm]=CTRL.omega_r_mech',
+    '[rpm]=CTRL.cmd_rpm',
+    '[A]=CTRL.cmd_idq[0]',
+    '[A]=CTRL.cmd_idq[1]',
+    '[rad]=CTRL.xS[0]',  # theta_d
+    '[rpm]=CTRL.xS[1]',  # omega_r_elec
+    '[Nm]=CTRL.xS[2]',   # -TL
+    '[Nm/s]=CTRL.xS[3]', # DL
+    '[Wb]=CTRL.KA',
+    '[Wb]=CTRL.KE',
+    '[Wb]=CTRL.xT[0]', # stator flux[0]
+    '[Wb]=CTRL.xT[1]', # stator flux[1]
+    '[V]=CTRL.xT[2]', # I term
+    '[V]=CTRL.xT[3]', # I term
+    '[Wb]=CTRL.active_flux[0]', # active flux[0]
+    '[Wb]=CTRL.active_flux[1]', # active flux[1]
+    '[Nm]=CTRL.Tem',
+    '[V]=CTRL.cmd_uab[0]',
+    '[V]=CTRL.cmd_uab[1]',
+    '[1]=svgen1.S1',
+    '[1]=svgen1.S2',
+    '[1]=svgen1.S3',
+    '[1]=svgen1.S4',
+    '[1]=svgen1.S5',
+    '[1]=svgen1.S6',
+    '[V]=ACM.udq[0]',
+    '[V]=ACM.udq[1]',
+    '[V]=CTRL.cmd_udq[0]',
+    '[V]=CTRL.cmd_udq[1]',
+    '[A]=reg_speed.OutLimit',
+    '[Nm]=ACM.TLoad',
+    '[rad/s]=CTRL.omega_syn',
+    '[V]=CTRL.cmd_uMT[0]',
+    '[V]=CTRL.cmd_uMT[1]',
+    '[A]=CTRL.cmd_iMT[1]',
+    '[A]=CTRL.iMT[1]',
+    '[Wb]=CTRL.cmd_psi_Ms',
+    '[Wb]=CTRL.psi_stator_MT_fb[0]',
+    '[rad/s]=CTRL.omega_slip',
+    '[A]=CTRL.iMT[0]',
+]